@@ -0,0 +1,147 @@
+"""
+Registro del historial de acciones (``HistorialAccion``) por lotes.
+
+``registrar`` no escribe en el momento: deja la fila en ``transaction.on_commit``,
+así que si la transacción (o el savepoint) que la generó hace rollback, la
+entrada se descarta junto con el cambio que describía; fuera de una transacción
+se confirma de inmediato. Las filas confirmadas se acumulan en el lote activo
+(``lote()``; ``AuditoriaMiddleware`` abre uno por request) y se guardan con un
+solo ``bulk_create`` al cerrarlo, aunque la vista termine con error.
+
+Con ``HISTORIAL_MODO = "cola"`` el lote se entrega a un hilo escritor que
+agrupa lo pendiente y lo inserta fuera del request. Sin lote activo (comandos,
+jobs) cada fila confirmada se escribe sola.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import HistorialAccion
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+_lote = ContextVar("historial_lote", default=None)
+
+
+def registrar(calificacion, usuario, accion, detalle=""):
+    """Agrega una entrada de historial; no revienta el flujo si falla."""
+    try:
+        fila = HistorialAccion(
+            calificacion=calificacion if calificacion is not None and calificacion.pk else None,
+            usuario=usuario if getattr(usuario, "is_authenticated", False) else None,
+            accion=accion[:15],
+            detalle=detalle,
+        )
+        transaction.on_commit(partial(_confirmar, fila))
+    except Exception as exc:
+        logger.warning("No se pudo registrar historial: %s", exc)
+
+
+def _confirmar(fila):
+    filas = _lote.get()
+    if filas is None:
+        _escribir([fila])
+    else:
+        filas.append(fila)
+
+
+@contextmanager
+def lote():
+    """Agrupa las entradas confirmadas dentro del bloque en un solo ``bulk_create`` al salir."""
+    if _lote.get() is not None:
+        yield
+        return
+    token = _lote.set([])
+    try:
+        yield
+    finally:
+        filas = _lote.get()
+        _lote.reset(token)
+        if filas:
+            _escribir(filas)
+
+
+def _guardar(filas):
+    try:
+        HistorialAccion.objects.bulk_create(filas, batch_size=BATCH_SIZE)
+    except Exception:
+        logger.exception(
+            "No se pudo registrar historial (%s filas): %s",
+            len(filas),
+            [(f.calificacion_id, f.usuario_id, f.accion, f.detalle) for f in filas],
+        )
+
+
+class _Escritor:
+    """Hilo que consume lotes de una cola y los inserta juntando todo lo pendiente."""
+
+    def __init__(self):
+        self.cola = queue.Queue()
+        self.hilo = threading.Thread(target=self._ejecutar, name="historial", daemon=True)
+        self.hilo.start()
+        atexit.register(self.detener)
+
+    def _ejecutar(self):
+        activo = True
+        while activo:
+            filas = self.cola.get()
+            if filas is None:
+                break
+            while True:
+                try:
+                    mas = self.cola.get_nowait()
+                except queue.Empty:
+                    break
+                if mas is None:
+                    activo = False
+                    break
+                filas.extend(mas)
+            close_old_connections()
+            _guardar(filas)
+
+    def detener(self, timeout=10):
+        """Vacía la cola antes de terminar el proceso."""
+        self.cola.put(None)
+        self.hilo.join(timeout)
+
+
+_escritor = {"pid": None, "instancia": None}
+_escritor_lock = threading.Lock()
+
+
+def _cola():
+    # Un escritor por proceso (los workers hijos no heredan el hilo del padre)
+    with _escritor_lock:
+        if _escritor["pid"] != os.getpid():
+            _escritor.update(pid=os.getpid(), instancia=_Escritor())
+        return _escritor["instancia"].cola
+
+
+def _escribir(filas):
+    if getattr(settings, "HISTORIAL_MODO", "sincrono") == "cola":
+        _cola().put(filas)
+    else:
+        _guardar(filas)
+
+
+class AuditoriaMiddleware:
+    """Un lote de historial por request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with lote():
+            return self.get_response(request)
@@ -1,10 +1,13 @@
 from django.contrib.auth.backends import BaseBackend
+from .intentos_login import ip_cliente, limite_superado, limpiar, registrar_fallo
 from .models import Usuario
+from .passwords import simular_verificacion, verificar_password
 
 class SHA256Backend(BaseBackend):
     """
-    Backend placeholder que compara hash SHA-256 plano en password_hash.
-    Sustituye con lógica real/segura (ideal: Django auth).
+    Autentica contra ``Usuario.password_hash`` usando ``passwords.verificar_password``
+    (hashers de Django; los SHA-256 legados se actualizan al iniciar sesión).
+    Conserva el nombre original porque las sesiones guardan la ruta del backend.
     """
 
     def authenticate(self, request, username=None, password=None, **kwargs):
@@ -12,19 +15,20 @@ class SHA256Backend(BaseBackend):
         User = Usuario
         if username is None or password is None:
             return None
-        try:
-            user = User.objects.get(username=username)
-        except User.DoesNotExist:
+        ip = ip_cliente(request)
+        if limite_superado(username, ip):
+            return None
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            simular_verificacion(password)
+            registrar_fallo(username, ip)
             return None
 
         # Si el modelo no expone password_hash, no autenticamos y dejamos a ModelBackend.
-        expected = getattr(user, "password_hash", None)
-        if expected:
-            import hashlib
-
-            candidate = hashlib.sha256(password.encode("utf-8")).hexdigest()
-            if expected == candidate:
-                return user
+        if getattr(user, "password_hash", None) and verificar_password(user, password):
+            limpiar(user)
+            return user
+        registrar_fallo(username, ip, user)
         return None
 
     def get_user(self, user_id):
@@ -0,0 +1,404 @@
+"""
+Motor de carga masiva de calificaciones tributarias.
+
+Lee archivos CSV/XLSX en streaming, valida cada fila con las mismas reglas de
+``CalificacionTributaria.clean()`` y persiste en lotes (``bulk_create``) tanto las
+calificaciones válidas como el detalle por fila en ``ArchivoCargaDetalle``.
+La memoria usada depende del tamaño de lote, no del tamaño del archivo.
+"""
+
+import csv
+import logging
+import os
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import (
+    ArchivoCarga,
+    ArchivoCargaDetalle,
+    ArchivoFuente,
+    CalificacionTributaria,
+    Emisor,
+    Instrumento,
+)
+from .resumen import registrar_altas
+from .uploads import ruta_absoluta
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+ORIGEN_CARGA = "carga_masiva"
+
+# Alias aceptados en la cabecera del archivo -> campo interno
+COLUMNAS = {
+    "emisor": "emisor_id",
+    "emisor_id": "emisor_id",
+    "id_emisor": "emisor_id",
+    "rut_emisor": "emisor_rut",
+    "emisor_rut": "emisor_rut",
+    "rut": "emisor_rut",
+    "instrumento": "instrumento_id",
+    "instrumento_id": "instrumento_id",
+    "id_instrumento": "instrumento_id",
+    "codigo_instrumento": "instrumento_codigo",
+    "instrumento_codigo": "instrumento_codigo",
+    "codigo_interno": "instrumento_codigo",
+    "anio": "anio",
+    "año": "anio",
+    "monto": "monto",
+    "factor": "factor",
+    "rating": "rating",
+}
+
+
+class FilaInvalida(Exception):
+    """Error de validación de una fila puntual del archivo."""
+
+
+def _normalizar_cabecera(cabecera):
+    return [COLUMNAS.get((col or "").strip().lower(), (col or "").strip().lower()) for col in cabecera]
+
+
+def _iter_csv(path):
+    # newline="" según la documentación de csv; utf-8-sig tolera BOM de Excel
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        muestra = fh.read(4096)
+        fh.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t|")
+        except csv.Error:
+            dialecto = csv.excel
+        reader = csv.reader(fh, dialecto)
+        cabecera = _normalizar_cabecera(next(reader, []))
+        for fila in reader:
+            if not any((valor or "").strip() for valor in fila):
+                continue
+            yield dict(zip(cabecera, fila))
+
+
+def _iter_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as exc:
+        raise ValueError("Para procesar archivos XLSX se requiere instalar openpyxl.") from exc
+
+    # read_only recorre la hoja sin cargarla completa en memoria
+    libro = load_workbook(path, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        cabecera = _normalizar_cabecera([str(c) if c is not None else "" for c in next(filas, ())])
+        for fila in filas:
+            if not any(valor not in (None, "") for valor in fila):
+                continue
+            yield {col: ("" if valor is None else str(valor)) for col, valor in zip(cabecera, fila)}
+    finally:
+        libro.close()
+
+
+def iter_filas(path):
+    """Genera las filas del archivo como diccionarios con columnas normalizadas."""
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        return _iter_xlsx(path)
+    if extension in (".csv", ".txt", ""):
+        return _iter_csv(path)
+    raise ValueError(f"Formato de archivo no soportado: {extension}")
+
+
+def _iter_lotes(filas, tamano):
+    filas = iter(filas)
+    while True:
+        lote = list(islice(filas, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def _decimal(valor, campo, requerido=True):
+    valor = (valor or "").strip()
+    if not valor:
+        if requerido:
+            raise FilaInvalida(f"El campo {campo} es obligatorio.")
+        return None
+    # Soporta formato local (1.234,56) además del estándar (1234.56)
+    if "," in valor:
+        valor = valor.replace(".", "").replace(",", ".")
+    try:
+        return Decimal(valor)
+    except InvalidOperation:
+        raise FilaInvalida(f"El campo {campo} no es un número válido: {valor!r}.")
+
+
+def _entero(valor, campo):
+    valor = (valor or "").strip()
+    if not valor:
+        raise FilaInvalida(f"El campo {campo} es obligatorio.")
+    try:
+        return int(Decimal(valor))
+    except (InvalidOperation, ValueError):
+        raise FilaInvalida(f"El campo {campo} no es un entero válido: {valor!r}.")
+
+
+class _Catalogo:
+    """
+    Cache de emisores e instrumentos para resolver FKs sin una consulta por fila.
+    Se rellena por lote con una consulta por tabla.
+    """
+
+    def __init__(self):
+        self.emisores = {}
+        self.emisores_rut = {}
+        self.instrumentos = {}
+        self.instrumentos_codigo = {}
+
+    def precargar(self, lote):
+        ids_emisor = {f.get("emisor_id", "").strip() for f in lote} - {""} - set(map(str, self.emisores))
+        ruts = {f.get("emisor_rut", "").strip() for f in lote} - {""} - set(self.emisores_rut)
+        ids_instr = {f.get("instrumento_id", "").strip() for f in lote} - {""} - set(map(str, self.instrumentos))
+        codigos = {f.get("instrumento_codigo", "").strip() for f in lote} - {""}
+
+        ids_emisor = {int(i) for i in ids_emisor if i.isdigit()}
+        ids_instr = {int(i) for i in ids_instr if i.isdigit()}
+        if ids_emisor or ruts:
+            filtro = Q(id__in=ids_emisor) | Q(rut__in=ruts)
+            for emisor in Emisor.objects.filter(filtro).only("id", "rut", "nombre"):
+                self.emisores[emisor.id] = emisor
+                if emisor.rut:
+                    self.emisores_rut[emisor.rut] = emisor
+        if ids_instr or codigos:
+            filtro = Q(id__in=ids_instr) | Q(codigo_interno__in=codigos)
+            for instr in Instrumento.objects.filter(filtro).only("id", "emisor_id", "codigo_interno", "nombre"):
+                self.instrumentos[instr.id] = instr
+                if instr.codigo_interno:
+                    self.instrumentos_codigo[(instr.emisor_id, instr.codigo_interno)] = instr
+
+    def emisor(self, fila):
+        emisor_id = (fila.get("emisor_id") or "").strip()
+        rut = (fila.get("emisor_rut") or "").strip()
+        emisor = None
+        if emisor_id:
+            emisor = self.emisores.get(int(emisor_id)) if emisor_id.isdigit() else None
+        elif rut:
+            emisor = self.emisores_rut.get(rut)
+        else:
+            raise FilaInvalida("Debe indicar el emisor (id o RUT).")
+        if emisor is None:
+            raise FilaInvalida(f"Emisor no encontrado: {emisor_id or rut}.")
+        return emisor
+
+    def instrumento(self, fila, emisor):
+        instr_id = (fila.get("instrumento_id") or "").strip()
+        codigo = (fila.get("instrumento_codigo") or "").strip()
+        if instr_id:
+            instr = self.instrumentos.get(int(instr_id)) if instr_id.isdigit() else None
+        elif codigo:
+            instr = self.instrumentos_codigo.get((emisor.id, codigo))
+        else:
+            return None
+        if instr is None:
+            raise FilaInvalida(f"Instrumento no encontrado: {instr_id or codigo}.")
+        return instr
+
+
+def construir_calificacion(fila, catalogo, usuario=None, emisor_id=None):
+    """
+    Convierte una fila en ``CalificacionTributaria`` (sin guardar) aplicando
+    las reglas de ``CalificacionTributaria.clean()``. Con ``emisor_id`` solo se
+    aceptan filas de ese emisor.
+    """
+    emisor = catalogo.emisor(fila)
+    if emisor_id is not None and emisor.id != emisor_id:
+        raise FilaInvalida("El emisor de la fila no corresponde al emisor de la carga.")
+    calif = CalificacionTributaria(
+        emisor=emisor,
+        instrumento=catalogo.instrumento(fila, emisor),
+        anio=_entero(fila.get("anio"), "anio"),
+        monto=_decimal(fila.get("monto"), "monto"),
+        factor=_decimal(fila.get("factor"), "factor", requerido=False),
+        rating=(fila.get("rating") or "").strip()[:20] or None,
+        estado_registro="vigente",
+        estado_proceso="pendiente",
+        origen=ORIGEN_CARGA,
+        creado_por=usuario,
+        modificado_por=usuario,
+    )
+    try:
+        calif.clean()
+    except ValidationError as exc:
+        raise FilaInvalida(" ".join(exc.messages))
+    return calif
+
+
+def claves_existentes(califs):
+    """Claves (emisor, instrumento, anio) vigentes ya presentes en BD para el lote."""
+    con_instr = [c for c in califs if c.instrumento_id]
+    if not con_instr:
+        return set()
+    return set(
+        CalificacionTributaria.objects.filter(
+            estado_registro="vigente",
+            emisor_id__in={c.emisor_id for c in con_instr},
+            instrumento_id__in={c.instrumento_id for c in con_instr},
+            anio__in={c.anio for c in con_instr},
+        ).values_list("emisor_id", "instrumento_id", "anio")
+    )
+
+
+def _procesar_lote(carga, lote, inicio, catalogo, usuario, vistas):
+    """
+    Valida y persiste un lote. Devuelve (ok, errores).
+    ``vistas`` acumula las claves únicas ya cargadas en este mismo archivo.
+    """
+    catalogo.precargar(lote)
+    resultados = []  # (nro_fila, calificacion | None, mensaje)
+    for offset, fila in enumerate(lote):
+        nro = inicio + offset
+        try:
+            resultados.append((nro, construir_calificacion(fila, catalogo, usuario, carga.emisor_id), None))
+        except FilaInvalida as exc:
+            resultados.append((nro, None, str(exc)))
+
+    existentes = claves_existentes([c for _, c, _ in resultados if c is not None])
+    validas = []
+    for idx, (nro, calif, _msg) in enumerate(resultados):
+        if calif is None or not calif.instrumento_id:
+            if calif is not None:
+                validas.append(calif)
+            continue
+        clave = (calif.emisor_id, calif.instrumento_id, calif.anio)
+        if clave in existentes or clave in vistas:
+            resultados[idx] = (nro, None, "Ya existe una calificación vigente para emisor, instrumento y año.")
+            continue
+        vistas.add(clave)
+        validas.append(calif)
+
+    with transaction.atomic():
+        CalificacionTributaria.objects.bulk_create(validas, batch_size=len(lote))
+        registrar_altas(validas)
+        ArchivoCargaDetalle.objects.bulk_create(
+            [
+                ArchivoCargaDetalle(
+                    archivo_carga=carga,
+                    fila_numero=nro,
+                    estado="ok" if calif is not None else "error",
+                    mensaje_error=msg,
+                    calificacion_afectada=calif if calif is not None and calif.pk else None,
+                )
+                for nro, calif, msg in resultados
+            ],
+            batch_size=len(lote),
+        )
+    return len(validas), len(resultados) - len(validas)
+
+
+def procesar_carga(carga, path, usuario=None, chunk_size=CHUNK_SIZE, on_progreso=None):
+    """
+    Procesa el archivo ``path`` asociado a ``carga`` (``ArchivoCarga``).
+
+    Cada lote se confirma en su propia transacción, de modo que el progreso
+    (``total_filas``, ``filas_ok``, ``filas_error``) queda visible mientras avanza.
+    ``on_progreso(carga)`` se invoca tras cada lote si se indica.
+
+    Si ``carga.emisor`` está definido, las filas de otros emisores se registran como error.
+    Si la carga ya tiene filas registradas (un worker cayó a mitad de camino) se
+    continúa tras la última, sin volver a insertar los lotes confirmados.
+    """
+    usuario = usuario if getattr(usuario, "is_authenticated", False) else None
+    hechas = carga.detalles.aggregate(
+        ultima=Max("fila_numero"), total=Count("id"), ok=Count("id", filter=Q(estado="ok"))
+    )
+    carga.estado = "procesando"
+    carga.fecha_inicio = carga.fecha_inicio or timezone.now()
+    carga.fecha_latido = timezone.now()
+    carga.total_filas = hechas["total"]
+    carga.filas_ok = hechas["ok"]
+    carga.filas_error = hechas["total"] - hechas["ok"]
+    carga.save(update_fields=["estado", "fecha_inicio", "fecha_latido", "total_filas", "filas_ok", "filas_error"])
+
+    catalogo = _Catalogo()
+    vistas = set()
+    # La fila 1 es la cabecera; numeramos igual que una planilla
+    nro_fila = (hechas["ultima"] or 1) + 1
+    try:
+        filas = islice(iter_filas(path), nro_fila - 2, None)
+        for lote in _iter_lotes(filas, chunk_size):
+            ok, errores = _procesar_lote(carga, lote, nro_fila, catalogo, usuario, vistas)
+            nro_fila += len(lote)
+            carga.total_filas += len(lote)
+            carga.filas_ok += ok
+            carga.filas_error += errores
+            ArchivoCarga.objects.filter(pk=carga.pk).update(
+                total_filas=carga.total_filas,
+                filas_ok=carga.filas_ok,
+                filas_error=carga.filas_error,
+                fecha_latido=timezone.now(),
+            )
+            if on_progreso:
+                on_progreso(carga)
+    except Exception as exc:
+        logger.exception("Carga %s abortada en la fila %s", carga.pk, nro_fila)
+        carga.estado = "error"
+        carga.resumen = f"Carga abortada en la fila {nro_fila}: {exc}"
+    else:
+        carga.estado = "completada_con_errores" if carga.filas_error else "completada"
+        carga.resumen = (
+            f"{carga.total_filas} filas procesadas: {carga.filas_ok} cargadas, {carga.filas_error} con error."
+        )
+    carga.fecha_fin = timezone.now()
+    carga.save(update_fields=["estado", "resumen", "fecha_fin", "total_filas", "filas_ok", "filas_error"])
+    return carga
+
+
+def encolar_carga(archivo_fuente, emisor_id, usuario=None):
+    """
+    Crea una ``ArchivoCarga`` pendiente para ``archivo_fuente``; la procesa luego
+    el comando ``procesar_cargas``. ``emisor_id`` es el emisor sobre el que se
+    autorizó la subida: las filas de otros emisores se rechazan.
+    """
+    return ArchivoCarga.objects.create(
+        archivo_fuente=archivo_fuente,
+        emisor_id=emisor_id,
+        usuario=usuario if getattr(usuario, "is_authenticated", False) else None,
+        estado="pendiente",
+    )
+
+
+def procesar_carga_pendiente(carga):
+    """Procesa una carga encolada a partir de su ``ArchivoFuente``."""
+    fuente = ArchivoFuente.objects.filter(pk=carga.archivo_fuente_id).first() if carga.archivo_fuente_id else None
+    if fuente is None or carga.emisor_id is None:
+        carga.estado = "error"
+        carga.resumen = (
+            "La carga no tiene un archivo fuente asociado."
+            if fuente is None
+            else "La carga no tiene un emisor autorizado asociado."
+        )
+        carga.fecha_fin = timezone.now()
+        carga.save(update_fields=["estado", "resumen", "fecha_fin"])
+        return carga
+    return procesar_carga(carga, ruta_absoluta(fuente.ruta_archivo), usuario=carga.usuario)
+
+
+def carga_previa(archivo_fuente, emisor_id, usuario):
+    """
+    Última carga no fallida de un archivo con el mismo contenido que ``archivo_fuente``
+    (mismo ``ruta_archivo``, que es direccionado por contenido), o ``None``.
+    Solo se consideran las de ``usuario`` para ``emisor_id``: la carga de otro
+    usuario no se le puede mostrar ni delata que ese archivo ya se subió.
+    """
+    return (
+        ArchivoCarga.objects.filter(
+            archivo_fuente__ruta_archivo=archivo_fuente.ruta_archivo,
+            emisor_id=emisor_id,
+            usuario_id=getattr(usuario, "pk", None),
+        )
+        .exclude(estado="error")
+        .order_by("-id")
+        .first()
+    )
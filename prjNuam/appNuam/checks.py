@@ -0,0 +1,28 @@
+"""Verificaciones de configuración (``manage.py check`` y arranque del servidor)."""
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+
+
+# Backends cuyo contenido vive en cada proceso: una invalidación no llega a los demás workers
+CACHES_LOCALES = ("LocMemCache", "DummyCache")
+
+
+@checks.register(checks.Tags.security)
+def revisar_cache_roles(app_configs, **kwargs):
+    ttl = getattr(settings, "ROLES_CACHE_TTL", 0)
+    backend = type(caches["default"]).__name__
+    if ttl > 0 and backend in CACHES_LOCALES:
+        return [
+            checks.Warning(
+                f"ROLES_CACHE_TTL={ttl} con un cache local del proceso ({backend}).",
+                hint=(
+                    "Al quitar un rol solo se invalida el cache del worker que hizo el cambio; en los demás "
+                    "el rol sigue vigente hasta ROLES_CACHE_TTL segundos. Use un cache compartido "
+                    "(CACHE_BACKEND) o ROLES_CACHE_TTL=0."
+                ),
+                id="appNuam.W001",
+            )
+        ]
+    return []
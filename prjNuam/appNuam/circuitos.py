@@ -0,0 +1,154 @@
+"""
+Circuit breaker por proveedor externo (exchangerate.host, mindicador.cl...).
+
+El estado vive en el cache de Django, así que todos los workers lo comparten:
+  - cerrado: las llamadas pasan; cada falla suma y al llegar a
+    ``CIRCUITO_UMBRAL_FALLOS`` seguidas el circuito se abre.
+  - abierto: las llamadas fallan al instante con ``CircuitoAbierto`` (sin esperar
+    el timeout HTTP) durante un tiempo que se duplica con cada apertura seguida,
+    desde ``CIRCUITO_ESPERA`` hasta ``CIRCUITO_ESPERA_MAXIMA`` segundos.
+  - semiabierto: vencida la espera, un solo request prueba al proveedor; si
+    responde se cierra el circuito y si falla vuelve a abrirse.
+
+Solo cuentan como falla los errores de conexión, timeouts y respuestas 5xx: un
+4xx (p. ej. API key inválida) no indica que el proveedor esté caído.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from requests import exceptions as req_exceptions
+
+
+CACHE_PREFIX = "circuito:"
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+CONTADORES = ("exitos", "fallos", "rechazos")
+
+
+class CircuitoAbierto(Exception):
+    """El proveedor está marcado como caído; no se intentó la llamada."""
+
+    def __init__(self, proveedor, reintentar_en):
+        super().__init__(f"{proveedor} no disponible temporalmente; reintente en {reintentar_en} s.")
+        self.proveedor = proveedor
+        self.reintentar_en = reintentar_en
+
+
+def _cache():
+    return caches[getattr(settings, "INDICADORES_CACHE_ALIAS", "default")]
+
+
+def _umbral():
+    return getattr(settings, "CIRCUITO_UMBRAL_FALLOS", 5)
+
+
+def _espera(aperturas):
+    base = getattr(settings, "CIRCUITO_ESPERA", 30)
+    maxima = getattr(settings, "CIRCUITO_ESPERA_MAXIMA", 600)
+    return min(maxima, base * 2 ** max(aperturas - 1, 0))
+
+
+def _es_falla(exc):
+    if isinstance(exc, req_exceptions.HTTPError):
+        return exc.response is None or exc.response.status_code >= 500
+    return isinstance(exc, req_exceptions.RequestException)
+
+
+class Circuito:
+    def __init__(self, proveedor):
+        self.proveedor = proveedor
+        self._clave = f"{CACHE_PREFIX}{proveedor}"
+
+    def estado(self):
+        """Estado compartido: ``{"estado", "fallos_seguidos", "aperturas", "abierto_hasta", ...}``."""
+        return _cache().get(self._clave) or {
+            "estado": CERRADO,
+            "fallos_seguidos": 0,
+            "aperturas": 0,
+            "abierto_hasta": None,
+            "ultimo_error": None,
+            "ultimo_cambio": None,
+        }
+
+    def _guardar(self, estado):
+        # Sin vencimiento: el estado no debe perderse mientras el circuito esté abierto
+        _cache().set(self._clave, estado, None)
+
+    def _contar(self, contador):
+        cache, clave = _cache(), f"{self._clave}:{contador}"
+        cache.add(clave, 0, None)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, 1, None)
+
+    def _permitir(self):
+        estado = self.estado()
+        if estado["estado"] == CERRADO:
+            return
+        restante = (estado["abierto_hasta"] or 0) - time.time()
+        if restante > 0:
+            self._contar("rechazos")
+            raise CircuitoAbierto(self.proveedor, int(restante) + 1)
+        # Semiabierto: solo el worker que gana el candado hace la llamada de prueba
+        if not _cache().add(f"{self._clave}:prueba", 1, 30):
+            self._contar("rechazos")
+            raise CircuitoAbierto(self.proveedor, 1)
+        if estado["estado"] != SEMIABIERTO:
+            estado.update(estado=SEMIABIERTO, ultimo_cambio=time.time())
+            self._guardar(estado)
+
+    def _exito(self):
+        self._contar("exitos")
+        estado = self.estado()
+        if estado["estado"] != CERRADO or estado["fallos_seguidos"]:
+            estado.update(estado=CERRADO, fallos_seguidos=0, aperturas=0, abierto_hasta=None, ultimo_cambio=time.time())
+            self._guardar(estado)
+        _cache().delete(f"{self._clave}:prueba")
+
+    def _falla(self, exc):
+        self._contar("fallos")
+        estado = self.estado()
+        estado["fallos_seguidos"] += 1
+        estado["ultimo_error"] = str(exc)[:300]
+        if estado["estado"] == SEMIABIERTO or estado["fallos_seguidos"] >= _umbral():
+            estado["aperturas"] += 1
+            estado.update(
+                estado=ABIERTO,
+                abierto_hasta=time.time() + _espera(estado["aperturas"]),
+                ultimo_cambio=time.time(),
+            )
+        self._guardar(estado)
+        _cache().delete(f"{self._clave}:prueba")
+
+    def llamar(self, funcion, *args, **kwargs):
+        """Ejecuta ``funcion`` si el circuito lo permite y registra el resultado."""
+        self._permitir()
+        try:
+            resultado = funcion(*args, **kwargs)
+        except Exception as exc:
+            if _es_falla(exc):
+                self._falla(exc)
+            else:
+                self._exito()
+            raise
+        self._exito()
+        return resultado
+
+    def resumen(self):
+        """Estado y contadores para el endpoint de métricas."""
+        estado = self.estado()
+        cache = _cache()
+        datos = {"proveedor": self.proveedor, **estado}
+        if estado["estado"] == ABIERTO and (estado["abierto_hasta"] or 0) <= time.time():
+            datos["estado"] = SEMIABIERTO
+        datos.update({c: cache.get(f"{self._clave}:{c}", 0) for c in CONTADORES})
+        return datos
+
+    def reiniciar(self):
+        _cache().delete_many([self._clave, f"{self._clave}:prueba"] + [f"{self._clave}:{c}" for c in CONTADORES])
@@ -1,3 +1,6 @@
+from .permissions import db_role_names
+
+
 def nuam_globals(request):
     """
     Context processor básico para variables globales.
@@ -15,7 +18,7 @@ def roles_context(request):
     if user and getattr(user, "is_authenticated", False):
         if hasattr(user, "roles"):
             try:
-                roles = [getattr(r, "nombre", str(r)) for r in user.roles.all()]
+                roles = list(db_role_names(user))
             except Exception:
                 roles = []
         elif hasattr(user, "rol"):
@@ -14,6 +14,7 @@ from .models import (
     EmisorContador,
     EmisorUsuario,
 )
+from .passwords import hashear_password
 
 
 class CalificacionTributariaForm(forms.ModelForm):
@@ -303,8 +304,7 @@ class UsuarioForm(forms.ModelForm):
         user = super().save(commit=False)
         password = self.cleaned_data.get("password")
         if password:
-            import hashlib
-            user.password_hash = hashlib.sha256(password.encode("utf-8")).hexdigest()
+            user.password_hash = hashear_password(password)
         
         if commit:
             user.save()
@@ -0,0 +1,483 @@
+"""
+Series de indicadores económicos (USD, UF, UTM...).
+
+Fuente principal: la tabla local ``indicadores_valores`` (``IndicadorValor``),
+que ``manage.py sincronizar_indicadores`` completa descargando solo las fechas
+que faltan. ``serie_local`` lee un rango y lo agrupa por día, semana o mes.
+
+Mientras la tabla no tenga datos recientes de una serie (``serie_local_al_dia``)
+se consulta la API externa a través del cache de Django por (pais, codigo):
+  - fresca (edad < ``INDICADORES_CACHE_TTL``): se responde directo.
+  - vencida pero dentro de ``INDICADORES_CACHE_STALE``: se responde al instante
+    y se refresca en segundo plano (stale-while-revalidate).
+  - ausente: se consulta la API externa; los requests concurrentes por la misma
+    serie esperan a esa única consulta en vez de lanzar la suya (coalescing).
+
+Funciona con cualquier backend de cache (LocMem, archivo, Redis...). El bloqueo
+entre procesos usa ``cache.add``: quien no obtiene el lock sirve la entrada
+vencida si existe o falla con ``ConsultaEnCurso`` (sin esperar); dentro del
+proceso, un evento por clave.
+
+``obtener_series`` resuelve varias series externas a la vez en un pool de hilos
+que comparte una ``requests.Session`` (conexiones keep-alive reutilizadas).
+
+Cada llamada externa pasa por el circuit breaker de su proveedor (``circuitos.py``):
+con el proveedor caído se falla al instante o se sirve lo que haya en cache.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, transaction
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .circuitos import Circuito
+from .models import IndicadorValor
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "indicador:serie:"
+LOCK_PREFIX = "indicador:lock:"
+LOCK_TIMEOUT = 30
+# Segundos sugeridos (Retry-After) cuando otro proceso ya consulta la serie
+LOCK_REINTENTO = 2
+ESPERA_MAXIMA = 15
+
+# Días que se muestran cuando no se pide un rango, y días que se descargan la
+# primera vez que se sincroniza una serie.
+DIAS_POR_DEFECTO = 32
+DIAS_HISTORIA_INICIAL = 365
+# exchangerate.host no acepta rangos de más de un año por consulta
+DIAS_MAXIMOS_FX = 365
+
+AGRUPACIONES = {"dia": None, "semana": TruncWeek, "mes": TruncMonth}
+
+# Proveedor externo (y circuit breaker) de cada tipo de indicador
+PROVEEDORES = {"fx": "exchangerate.host", "mindicador": "mindicador.cl"}
+
+_http_session = None
+_fetch_pool = None
+_init_lock = threading.Lock()
+
+
+# Configuración de indicadores disponibles por país
+INDICADORES = {
+    "chile": {
+        "usd": {
+            "tipo": "fx",
+            "symbol": "CLP",
+            "descripcion": "1 USD en CLP",
+        },
+        "uf": {
+            "tipo": "mindicador",
+            "endpoint": "https://mindicador.cl/api/uf",
+            "descripcion": "UF",
+        },
+        "utm": {
+            "tipo": "mindicador",
+            "endpoint": "https://mindicador.cl/api/utm",
+            "descripcion": "UTM",
+            # Valor mensual (fechado el día 1)
+            "vigencia_dias": 45,
+        },
+    },
+    "colombia": {
+        "usd": {
+            "tipo": "fx",
+            "symbol": "COP",
+            "descripcion": "1 USD en COP",
+        }
+        # Espacio para agregar más indicadores en el futuro
+    },
+    "peru": {
+        "usd": {
+            "tipo": "fx",
+            "symbol": "PEN",
+            "descripcion": "1 USD en PEN",
+        }
+        # Espacio para agregar más indicadores en el futuro
+    },
+}
+
+
+def _http():
+    """Sesión HTTP compartida por los hilos: reutiliza conexiones con cada API externa."""
+    global _http_session
+    with _init_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_workers())
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+    return _http_session
+
+
+def _workers():
+    return getattr(settings, "INDICADORES_FETCH_WORKERS", 8)
+
+
+def _pool():
+    global _fetch_pool
+    with _init_lock:
+        if _fetch_pool is None:
+            _fetch_pool = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="indicador-fetch")
+    return _fetch_pool
+
+
+def _get(proveedor, url, **kwargs):
+    """GET a una API externa a través del circuit breaker del proveedor."""
+
+    def _consulta():
+        resp = _http().get(url, timeout=10, **kwargs)
+        resp.raise_for_status()
+        return resp
+
+    return Circuito(proveedor).llamar(_consulta)
+
+
+def _fetch_fx_timeseries(symbol: str, start_date=None, end_date=None) -> tuple[list[str], list[float]]:
+    """
+    Obtiene serie de tiempo para una moneda con exchangerate.host (por defecto
+    los últimos ~30 días). Requiere ACCESS_KEY si la API lo exige (EXCHANGE_API_KEY en .env).
+    """
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=DIAS_POR_DEFECTO)
+    access_key = os.getenv("EXCHANGE_API_KEY")
+    if not access_key:
+        raise ValueError("Falta configurar EXCHANGE_API_KEY para consultar exchangerate.host")
+
+    url = "https://api.exchangerate.host/timeseries"
+    params = {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "base": "USD",
+        "symbols": symbol,
+        "access_key": access_key,
+    }
+
+    resp = _get(PROVEEDORES["fx"], url, params=params)
+    try:
+        payload = resp.json()
+    except ValueError as exc:
+        raise ValueError(f"No se pudo leer JSON de exchangerate.host: {exc}") from exc
+
+    if payload.get("success") is False:
+        err = payload.get("error", {})
+        msg = err.get("info") or err or "API exchangerate.host respondió sin éxito"
+        raise ValueError(f"API exchangerate.host: {msg}")
+
+    if not payload.get("rates"):
+        raise ValueError("No se encontraron datos de tasas de cambio")
+
+    sorted_dates = sorted(payload["rates"].keys())
+    labels = []
+    values = []
+    for date_key in sorted_dates:
+        rate_info = payload["rates"].get(date_key, {})
+        value = rate_info.get(symbol)
+        if value is not None:
+            labels.append(date_key)
+            values.append(value)
+
+    if not values:
+        raise ValueError("La API no devolvió valores válidos para el indicador solicitado")
+
+    return labels, values
+
+
+def _fetch_mindicador_timeseries(endpoint: str, anio=None) -> tuple[list[str], list[float]]:
+    """
+    Obtiene serie de tiempo desde mindicador.cl: los últimos ~30 puntos o, si se
+    indica ``anio``, el año completo (``<endpoint>/<anio>``).
+    """
+    resp = _get(PROVEEDORES["mindicador"], f"{endpoint}/{anio}" if anio else endpoint)
+    try:
+        payload = resp.json()
+    except ValueError as exc:
+        raise ValueError(f"No se pudo leer JSON de mindicador.cl: {exc}") from exc
+
+    serie = payload.get("serie", [])
+    if not serie:
+        if anio:
+            return [], []
+        raise ValueError("No se encontraron datos en la API de mindicador.cl")
+
+    # Tomamos los últimos ~30 elementos (o el año completo) ordenados por fecha ascendente
+    puntos = sorted(serie if anio else serie[:30], key=lambda item: item.get("fecha"))
+    puntos = [item for item in puntos if "fecha" in item and "valor" in item]
+    labels = [item["fecha"][:10] for item in puntos]
+    values = [item["valor"] for item in puntos]
+
+    if not values and not anio:
+        raise ValueError("La API de mindicador.cl no devolvió valores válidos")
+
+    return labels, values
+
+
+def fetch_indicador(indicador_cfg) -> tuple[list[str], list[float]]:
+    """Consulta la API externa que corresponde al tipo de indicador (últimos ~30 días)."""
+    if indicador_cfg["tipo"] == "fx":
+        return _fetch_fx_timeseries(indicador_cfg["symbol"])
+    return _fetch_mindicador_timeseries(indicador_cfg["endpoint"])
+
+
+def _descargar_rango(indicador_cfg, desde, hasta):
+    """Descarga de la API externa los valores entre ``desde`` y ``hasta`` como ``[(fecha, valor)]``."""
+    puntos = []
+    if indicador_cfg["tipo"] == "fx":
+        inicio = desde
+        while inicio <= hasta:
+            fin = min(hasta, inicio + timedelta(days=DIAS_MAXIMOS_FX - 1))
+            puntos.extend(zip(*_fetch_fx_timeseries(indicador_cfg["symbol"], inicio, fin)))
+            inicio = fin + timedelta(days=1)
+    else:
+        # mindicador.cl publica por año; la UF trae también fechas futuras ya conocidas
+        for anio in range(desde.year, hasta.year + 1):
+            puntos.extend(zip(*_fetch_mindicador_timeseries(indicador_cfg["endpoint"], anio)))
+    return [
+        (fecha, valor)
+        for fecha, valor in ((date.fromisoformat(f), v) for f, v in puntos)
+        if fecha >= desde and (indicador_cfg["tipo"] != "fx" or fecha <= hasta)
+    ]
+
+
+def sincronizar_indicador(pais, codigo, desde=None, hasta=None):
+    """
+    Completa ``indicadores_valores`` para una serie descargando solo las fechas
+    que faltan: las posteriores a la última guardada y, si ``desde`` es anterior
+    a la primera, el tramo inicial. Devuelve la cantidad de valores insertados
+    (las fechas que otro proceso guardó mientras tanto no se cuentan).
+    """
+    indicador_cfg = INDICADORES[pais][codigo]
+    hasta = hasta or date.today()
+    serie = IndicadorValor.objects.filter(pais=pais, codigo=codigo)
+    limites = serie.aggregate(primera=Min("fecha"), ultima=Max("fecha"), total=Count("id"))
+    if limites["ultima"] is None:
+        rangos = [(desde or hasta - timedelta(days=DIAS_HISTORIA_INICIAL), hasta)]
+    else:
+        rangos = []
+        if desde and desde < limites["primera"]:
+            rangos.append((desde, limites["primera"] - timedelta(days=1)))
+        rangos.append((limites["ultima"] + timedelta(days=1), hasta))
+
+    nuevos = []
+    for inicio, fin in rangos:
+        # Al día (o con fechas futuras ya publicadas, como la UF): nada que descargar
+        if inicio > fin:
+            continue
+        nuevos.extend(
+            IndicadorValor(pais=pais, codigo=codigo, fecha=fecha, valor=valor)
+            for fecha, valor in _descargar_rango(indicador_cfg, inicio, fin)
+        )
+    if not nuevos:
+        return 0
+    # ignore_conflicts no informa cuántas filas se insertaron realmente
+    IndicadorValor.objects.bulk_create(nuevos, batch_size=1000, ignore_conflicts=True)
+    return serie.count() - limites["total"]
+
+
+def serie_local(pais, codigo, desde=None, hasta=None, agrupar="dia"):
+    """
+    Lee la serie desde ``indicadores_valores`` y devuelve ``(labels, data)``.
+    Sin ``desde`` se devuelven los últimos ``DIAS_POR_DEFECTO`` días. Con
+    ``agrupar`` = "semana" o "mes" el promedio por período se calcula en la BD.
+    Si la tabla no existe (SQL pack sin aplicar) devuelve ``([], [])``.
+    """
+    if desde is None and hasta is None:
+        desde = date.today() - timedelta(days=DIAS_POR_DEFECTO)
+    qs = IndicadorValor.objects.filter(pais=pais, codigo=codigo)
+    if desde is not None:
+        qs = qs.filter(fecha__gte=desde)
+    if hasta is not None:
+        qs = qs.filter(fecha__lte=hasta)
+
+    truncar = AGRUPACIONES[agrupar]
+    if truncar is None:
+        filas = qs.order_by("fecha").values_list("fecha", "valor")
+    else:
+        filas = (
+            qs.annotate(periodo=truncar("fecha"))
+            .values("periodo")
+            .annotate(promedio=Avg("valor"))
+            .order_by("periodo")
+            .values_list("periodo", "promedio")
+        )
+    try:
+        with transaction.atomic():
+            filas = list(filas)
+    except DatabaseError as exc:
+        logger.warning("No se pudo leer indicadores_valores (%s/%s): %s", pais, codigo, exc)
+        return [], []
+    labels, data = [], []
+    for fecha, valor in filas:
+        labels.append(fecha.isoformat())
+        data.append(float(valor))
+    return labels, data
+
+
+def _vigencia(indicador_cfg):
+    return indicador_cfg.get("vigencia_dias") or getattr(settings, "INDICADORES_LOCAL_VIGENCIA", 7)
+
+
+def serie_local_al_dia(pais, codigo):
+    """
+    Indica si la serie está sincronizada y su último valor tiene a lo más los días
+    de vigencia del indicador (``vigencia_dias`` o ``INDICADORES_LOCAL_VIGENCIA``).
+    ``False`` si no hay datos, si ``sincronizar_indicadores`` dejó de correr o si
+    la tabla no existe: en esos casos se consulta la API externa.
+    """
+    limite = date.today() - timedelta(days=_vigencia(INDICADORES[pais][codigo]))
+    try:
+        with transaction.atomic():
+            return IndicadorValor.objects.filter(pais=pais, codigo=codigo, fecha__gte=limite).exists()
+    except DatabaseError:
+        return False
+
+
+def _cache():
+    return caches[getattr(settings, "INDICADORES_CACHE_ALIAS", "default")]
+
+
+def _ttl():
+    return getattr(settings, "INDICADORES_CACHE_TTL", 6 * 3600)
+
+
+def _stale():
+    return getattr(settings, "INDICADORES_CACHE_STALE", 7 * 24 * 3600)
+
+
+def _clave(pais, codigo):
+    return f"{CACHE_PREFIX}{pais}:{codigo}"
+
+
+class ConsultaEnCurso(Exception):
+    """Otro proceso ya consulta la serie y todavía no hay nada en cache para servir."""
+
+    def __init__(self, reintentar_en):
+        super().__init__(f"El indicador se está actualizando; reintente en {reintentar_en} s.")
+        self.reintentar_en = reintentar_en
+
+
+class _Vuelo:
+    """Consulta en curso compartida por todos los hilos que piden la misma serie."""
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+_vuelos = {}
+_vuelos_lock = threading.Lock()
+
+
+def _guardar(pais, codigo, labels, data):
+    entrada = {"labels": labels, "data": data, "obtenido": time.time()}
+    _cache().set(_clave(pais, codigo), entrada, _stale())
+    return entrada
+
+
+def _consultar(pais, codigo, fetch):
+    """
+    Ejecuta ``fetch()`` una sola vez por serie dentro del proceso; el resto de
+    hilos espera el mismo resultado (o la misma excepción).
+    """
+    with _vuelos_lock:
+        vuelo = _vuelos.get((pais, codigo))
+        propio = vuelo is None
+        if propio:
+            vuelo = _vuelos[(pais, codigo)] = _Vuelo()
+
+    if not propio:
+        if not vuelo.listo.wait(ESPERA_MAXIMA):
+            raise TimeoutError("Tiempo de espera agotado consultando el indicador")
+        if vuelo.error is not None:
+            raise vuelo.error
+        return vuelo.resultado
+
+    cache = _cache()
+    lock_key = f"{LOCK_PREFIX}{pais}:{codigo}"
+    try:
+        # Entre procesos: si otro ya está consultando no se espera; se sirve lo que
+        # haya en cache (aunque esté vencido) o se pide reintentar.
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            entrada = cache.get(_clave(pais, codigo))
+            if entrada is None:
+                raise ConsultaEnCurso(LOCK_REINTENTO)
+            vuelo.resultado = entrada
+            return entrada
+        try:
+            labels, data = fetch()
+            vuelo.resultado = _guardar(pais, codigo, labels, data)
+            return vuelo.resultado
+        finally:
+            cache.delete(lock_key)
+    except Exception as exc:
+        vuelo.error = exc
+        raise
+    finally:
+        vuelo.listo.set()
+        with _vuelos_lock:
+            _vuelos.pop((pais, codigo), None)
+
+
+def _refrescar_en_segundo_plano(pais, codigo, fetch):
+    def _run():
+        try:
+            _consultar(pais, codigo, fetch)
+        except Exception as exc:
+            logger.warning("No se pudo refrescar el indicador %s/%s: %s", pais, codigo, exc)
+
+    with _vuelos_lock:
+        if (pais, codigo) in _vuelos:
+            return
+    threading.Thread(target=_run, name=f"indicador-{pais}-{codigo}", daemon=True).start()
+
+
+def obtener_serie(pais, codigo, fetch):
+    """
+    Devuelve ``(labels, data, estado)`` con ``estado`` en {"hit", "stale", "miss"}.
+    ``fetch`` es la función que consulta la API externa y devuelve ``(labels, data)``.
+    """
+    entrada = _cache().get(_clave(pais, codigo))
+    if entrada is not None:
+        if time.time() - entrada["obtenido"] < _ttl():
+            return entrada["labels"], entrada["data"], "hit"
+        _refrescar_en_segundo_plano(pais, codigo, fetch)
+        return entrada["labels"], entrada["data"], "stale"
+
+    entrada = _consultar(pais, codigo, fetch)
+    return entrada["labels"], entrada["data"], "miss"
+
+
+def obtener_series(pedidos):
+    """
+    Resuelve en paralelo varias series externas (``pedidos`` = ``[(pais, codigo)]``)
+    con ``obtener_serie``; la espera total es la de la serie más lenta.
+    Devuelve ``{(pais, codigo): (labels, data, estado)}``, o la excepción si esa
+    serie falló, sin afectar al resto.
+    """
+    futuros = {
+        (pais, codigo): _pool().submit(
+            obtener_serie, pais, codigo, lambda cfg=INDICADORES[pais][codigo]: fetch_indicador(cfg)
+        )
+        for pais, codigo in pedidos
+    }
+    resultados = {}
+    for clave, futuro in futuros.items():
+        try:
+            resultados[clave] = futuro.result()
+        except Exception as exc:
+            resultados[clave] = exc
+    return resultados
@@ -0,0 +1,150 @@
+"""
+Limitación de intentos de login fallidos por username y por IP.
+
+Cada clave cuenta los fallos en una ventana deslizante de ``LOGIN_VENTANA``
+segundos, aproximada con dos contadores de ventana fija (actual y anterior,
+ponderada por el tiempo que aún cubre). Los contadores viven en el cache
+compartido y usan ``cache.incr``, atómico en Redis/Memcached.
+
+``limite_superado`` se consulta antes de buscar al usuario o calcular el hash,
+así que un ataque de fuerza bruta se corta sin trabajo de BD ni de CPU. Aparte,
+al llegar a ``LOGIN_BLOQUEO_UMBRAL`` fallos de un username existente dentro de
+``LOGIN_BLOQUEO_VENTANA`` la cuenta queda bloqueada en BD (``estado="bloqueado"``,
+``fecha_bloqueo``) hasta que un administrador la reactive, y sus sesiones JWT
+se revocan.
+"""
+
+import hashlib
+import ipaddress
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Usuario
+from .sesiones_jwt import revocar_usuario
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "login:fallos:"
+
+
+def _ventana(tipo):
+    if tipo == "bloqueo":
+        return getattr(settings, "LOGIN_BLOQUEO_VENTANA", 24 * 3600)
+    return getattr(settings, "LOGIN_VENTANA", 900)
+
+
+def _clave(tipo, valor, bucket):
+    # Hash del valor: los usernames pueden traer espacios o caracteres no válidos en claves de Memcached
+    return f"{CACHE_PREFIX}{tipo}:{hashlib.sha1(str(valor).encode()).hexdigest()[:20]}:{bucket}"
+
+
+def _proxies_confiables():
+    redes = []
+    for valor in getattr(settings, "PROXIES_CONFIABLES", ()):
+        try:
+            redes.append(ipaddress.ip_network(valor.strip(), strict=False))
+        except ValueError:
+            logger.warning("PROXIES_CONFIABLES: '%s' no es una IP o red válida", valor)
+    return redes
+
+
+def _es_confiable(ip, redes):
+    try:
+        direccion = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(direccion in red for red in redes)
+
+
+def ip_cliente(request):
+    """
+    IP del cliente. ``X-Forwarded-For`` solo se lee si la conexión viene de un
+    proxy de ``PROXIES_CONFIABLES``; se recorre de derecha a izquierda y la IP
+    del cliente es la primera que no es un proxy confiable. Sin proxies
+    configurados se usa ``REMOTE_ADDR`` (el header lo puede falsificar cualquiera).
+    """
+    if request is None:
+        return "desconocida"
+    ip = request.META.get("REMOTE_ADDR") or "desconocida"
+    redes = _proxies_confiables()
+    if not redes or not _es_confiable(ip, redes):
+        return ip
+    reenviadas = [v.strip() for v in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if v.strip()]
+    for anterior in reversed(reenviadas):
+        ip = anterior
+        if not _es_confiable(ip, redes):
+            break
+    return ip
+
+
+def _contar(tipo, valor, ahora):
+    ventana = _ventana(tipo)
+    bucket = int(ahora // ventana)
+    valores = cache.get_many([_clave(tipo, valor, bucket), _clave(tipo, valor, bucket - 1)])
+    actual = valores.get(_clave(tipo, valor, bucket), 0)
+    anterior = valores.get(_clave(tipo, valor, bucket - 1), 0)
+    return actual + anterior * (1 - (ahora % ventana) / ventana)
+
+
+def _sumar(tipo, valor, ahora):
+    ventana = _ventana(tipo)
+    clave = _clave(tipo, valor, int(ahora // ventana))
+    cache.add(clave, 0, 2 * ventana)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, 1, 2 * ventana)
+
+
+def limite_superado(username, ip):
+    """
+    Devuelve los segundos sugeridos de espera si el username o la IP superaron
+    su límite en la ventana, o 0 si el intento puede continuar.
+    """
+    ahora = time.time()
+    if (
+        _contar("usuario", username.lower(), ahora) >= getattr(settings, "LOGIN_MAX_FALLOS_USUARIO", 5)
+        or _contar("ip", ip, ahora) >= getattr(settings, "LOGIN_MAX_FALLOS_IP", 20)
+    ):
+        return int(_ventana("usuario") - ahora % _ventana("usuario")) + 1
+    return 0
+
+
+def registrar_fallo(username, ip, usuario=None):
+    """
+    Suma un fallo al username y a la IP. Si ``usuario`` existe y acumula
+    ``LOGIN_BLOQUEO_UMBRAL`` fallos en ``LOGIN_BLOQUEO_VENTANA``, se bloquea la cuenta.
+    Devuelve ``True`` si el intento dejó la cuenta bloqueada.
+    """
+    ahora = time.time()
+    _sumar("usuario", username.lower(), ahora)
+    _sumar("ip", ip, ahora)
+    if usuario is None:
+        return False
+    _sumar("bloqueo", usuario.pk, ahora)
+    if _contar("bloqueo", usuario.pk, ahora) < getattr(settings, "LOGIN_BLOQUEO_UMBRAL", 10):
+        return False
+    bloqueado = (
+        Usuario.objects.filter(pk=usuario.pk)
+        .exclude(estado="bloqueado")
+        .update(estado="bloqueado", fecha_bloqueo=timezone.now())
+    )
+    if bloqueado:
+        revocar_usuario(usuario.pk)
+        logger.warning("ADMIN_ALERT cuenta '%s' bloqueada por intentos fallidos de login (IP %s)", username, ip)
+    return True
+
+
+def limpiar(usuario):
+    """Reinicia los contadores del usuario tras un login correcto (el de la IP se mantiene)."""
+    ahora = time.time()
+    claves = []
+    for tipo, valor in (("usuario", usuario.username.lower()), ("bloqueo", usuario.pk)):
+        bucket = int(ahora // _ventana(tipo))
+        claves += [_clave(tipo, valor, bucket), _clave(tipo, valor, bucket - 1)]
+    cache.delete_many(claves)
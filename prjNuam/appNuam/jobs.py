@@ -0,0 +1,148 @@
+"""
+Cola de trabajos en proceso para las cargas masivas.
+
+Las vistas solo crean ``ArchivoCarga`` con ``estado="pendiente"``; este módulo
+las reclama y procesa en un pool de hilos, fuera del ciclo request/response.
+Se ejecuta mediante el comando ``procesar_cargas``. Las cargas de un worker caído
+vuelven a la cola tras ``CARGAS_TIMEOUT`` segundos sin avance.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .cargas import procesar_carga_pendiente
+from .models import ArchivoCarga
+
+
+logger = logging.getLogger(__name__)
+
+
+def reclamar_carga(carga_id):
+    """
+    Marca la carga como ``procesando`` solo si seguía pendiente.
+    El UPDATE condicional evita que dos workers (o procesos) tomen la misma carga.
+    """
+    return (
+        ArchivoCarga.objects.filter(pk=carga_id, estado="pendiente").update(
+            estado="procesando", fecha_latido=timezone.now()
+        )
+        == 1
+    )
+
+
+def reencolar_colgadas(timeout=None):
+    """
+    Devuelve a ``pendiente`` las cargas ``procesando`` sin latido en ``timeout`` segundos
+    (su worker cayó). Al reclamarlas otra vez continúan tras la última fila registrada.
+    Devuelve cuántas se reencolaron.
+    """
+    limite = timezone.now() - timedelta(seconds=timeout or settings.CARGAS_TIMEOUT)
+    sin_latido = Q(fecha_latido__isnull=True) & (Q(fecha_inicio__isnull=True) | Q(fecha_inicio__lt=limite))
+    reencoladas = ArchivoCarga.objects.filter(
+        Q(fecha_latido__lt=limite) | sin_latido, estado="procesando"
+    ).update(estado="pendiente")
+    if reencoladas:
+        logger.warning("%s cargas sin avance en %ss vuelven a la cola", reencoladas, timeout or settings.CARGAS_TIMEOUT)
+    return reencoladas
+
+
+def _ejecutar(carga_id):
+    close_old_connections()
+    try:
+        carga = ArchivoCarga.objects.select_related("usuario").get(pk=carga_id)
+        procesar_carga_pendiente(carga)
+        logger.info("Carga %s finalizada: %s", carga_id, carga.resumen)
+    except Exception:
+        logger.exception("Error procesando la carga %s", carga_id)
+        ArchivoCarga.objects.filter(pk=carga_id).update(estado="error")
+    finally:
+        # Cada hilo abre su propia conexión; se cierra al terminar el trabajo
+        connection.close()
+
+
+class CargaWorkerPool:
+    """Pool de workers que consume las cargas pendientes de la BD."""
+
+    def __init__(self, workers=None, intervalo=None):
+        self.workers = workers or settings.CARGAS_WORKERS
+        self.intervalo = intervalo or settings.CARGAS_POLL_INTERVAL
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="carga")
+        self._en_curso = set()
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._ultima_revision = 0.0
+
+    def _liberar(self, carga_id):
+        with self._lock:
+            self._en_curso.discard(carga_id)
+
+    def despachar(self):
+        """Reclama tantas cargas pendientes como workers libres haya. Devuelve cuántas tomó."""
+        ahora = time.monotonic()
+        if ahora - self._ultima_revision >= min(settings.CARGAS_TIMEOUT, 60):
+            self._ultima_revision = ahora
+            reencolar_colgadas()
+        with self._lock:
+            libres = self.workers - len(self._en_curso)
+        if libres <= 0:
+            return 0
+        candidatas = ArchivoCarga.objects.filter(estado="pendiente").order_by("id").values_list("id", flat=True)
+        tomadas = 0
+        for carga_id in candidatas[:libres]:
+            if not reclamar_carga(carga_id):
+                continue
+            with self._lock:
+                self._en_curso.add(carga_id)
+            futuro = self._executor.submit(_ejecutar, carga_id)
+            futuro.add_done_callback(lambda _f, cid=carga_id: self._liberar(cid))
+            tomadas += 1
+        return tomadas
+
+    def ocupado(self):
+        with self._lock:
+            return bool(self._en_curso)
+
+    def ejecutar(self, una_vez=False):
+        """
+        Bucle principal. Con ``una_vez`` procesa lo pendiente y termina cuando
+        la cola queda vacía.
+        """
+        try:
+            while not self._detener.is_set():
+                tomadas = self.despachar()
+                if una_vez and not tomadas and not self.ocupado():
+                    break
+                self._detener.wait(self.intervalo if not tomadas else 0.1)
+        finally:
+            self._executor.shutdown(wait=True)
+            connection.close()
+
+    def detener(self):
+        self._detener.set()
+
+
+def progreso_carga(carga_id):
+    """Estado de avance de una carga en una sola consulta (para polling)."""
+    return (
+        ArchivoCarga.objects.filter(pk=carga_id)
+        .values(
+            "id",
+            "usuario_id",
+            "estado",
+            "total_filas",
+            "filas_ok",
+            "filas_error",
+            "fecha_inicio",
+            "fecha_fin",
+            "resumen",
+        )
+        .first()
+    )
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.utils import timezone
+
+from appNuam.cargas import CHUNK_SIZE, procesar_carga
+from appNuam.models import ArchivoCarga, Usuario
+
+
+class Command(BaseCommand):
+    help = "Carga masiva de calificaciones tributarias desde un archivo CSV/XLSX."
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta del archivo CSV o XLSX a cargar.")
+        parser.add_argument(
+            "--usuario",
+            help="Username que quedará como creador de las calificaciones y de la carga.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help=f"Filas por lote (default: {CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options["usuario"]:
+            usuario = Usuario.objects.filter(username=options["usuario"]).first()
+            if usuario is None:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+
+        # Ya "procesando": un worker de procesar_cargas no debe reclamarla mientras se carga aquí
+        carga = ArchivoCarga.objects.create(usuario=usuario, estado="procesando", fecha_inicio=timezone.now())
+        self.stdout.write(self.style.NOTICE(f"Procesando carga {carga.pk}..."))
+
+        inicio = time.perf_counter()
+        carga = procesar_carga(
+            carga,
+            options["archivo"],
+            usuario=usuario,
+            chunk_size=options["chunk_size"],
+            on_progreso=lambda c: self.stdout.write(f"  {c.total_filas} filas ({c.filas_error} con error)"),
+        )
+        duracion = time.perf_counter() - inicio
+
+        estilo = self.style.ERROR if carga.estado == "error" else self.style.SUCCESS
+        self.stdout.write(estilo(carga.resumen))
+        if carga.total_filas:
+            self.stdout.write(f"{carga.total_filas / max(duracion, 1e-9):.0f} filas/s en {duracion:.2f}s")
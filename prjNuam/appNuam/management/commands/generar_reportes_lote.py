@@ -0,0 +1,32 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from appNuam.models import Emisor
+from appNuam.reportes import zip_lote
+
+
+class Command(BaseCommand):
+    help = "Genera en paralelo los reportes PDF de calificaciones de varios emisores y los guarda en un ZIP."
+
+    def add_arguments(self, parser):
+        parser.add_argument("emisores", nargs="+", type=int, help="Ids de los emisores.")
+        parser.add_argument("--salida", default="reportes_calificaciones.zip", help="Ruta del ZIP a generar.")
+        parser.add_argument("--workers", type=int, help="Reportes generados a la vez (default y máximo: REPORTES_WORKERS).")
+
+    def handle(self, *args, **options):
+        ids = list(dict.fromkeys(options["emisores"]))
+        existentes = set(Emisor.objects.filter(pk__in=ids).values_list("pk", flat=True))
+        faltantes = [i for i in ids if i not in existentes]
+        if faltantes:
+            raise CommandError(f"Emisores no encontrados: {', '.join(map(str, faltantes))}")
+
+        inicio = time.perf_counter()
+        with open(options["salida"], "wb") as fh:
+            for bloque in zip_lote(ids, workers=options["workers"]):
+                fh.write(bloque)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(ids)} reportes en {options['salida']} ({time.perf_counter() - inicio:.1f} s)."
+            )
+        )
@@ -0,0 +1,76 @@
+import hashlib
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from appNuam.passwords import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+PASSWORD_PRUEBA = "Contraseña-de-prueba-123"
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide cuántos inicios de sesión por segundo soporta un núcleo con cada algoritmo y factor de trabajo "
+        "(una verificación de contraseña por login), para ajustar el costo frente al peak de logins."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pbkdf2", default="260000,600000,1000000", help="Iteraciones PBKDF2 a medir.")
+        parser.add_argument("--scrypt", default="16384,32768,65536", help="Factores N de scrypt a medir.")
+        parser.add_argument("--argon2", default="2,3,4", help="time_cost de Argon2 (requiere argon2-cffi).")
+        parser.add_argument("--segundos", type=float, default=1.0, help="Duración mínima de cada medición.")
+        parser.add_argument("--peak", type=float, help="Logins por segundo a soportar; informa núcleos necesarios.")
+
+    def _valores(self, texto, opcion):
+        try:
+            return [int(v) for v in texto.split(",") if v.strip()]
+        except ValueError as exc:
+            raise CommandError(f"--{opcion} debe ser una lista de enteros separados por coma.") from exc
+
+    def _medir(self, verificar, segundos):
+        verificar()  # calentamiento
+        n, inicio = 0, time.perf_counter()
+        while True:
+            verificar()
+            n += 1
+            transcurrido = time.perf_counter() - inicio
+            if transcurrido >= segundos:
+                return n / transcurrido
+
+    def _informar(self, etiqueta, por_segundo, peak):
+        linea = f"{etiqueta:<32} {1000 / por_segundo:9.2f} ms/login {por_segundo:10.1f} logins/s/núcleo"
+        if peak:
+            linea += f"  ({peak / por_segundo:.1f} núcleos para {peak:g} logins/s)"
+        self.stdout.write(linea)
+
+    def _hasher(self, clase, **atributos):
+        hasher = clase()
+        for nombre, valor in atributos.items():
+            setattr(hasher, nombre, valor)
+        encoded = hasher.encode(PASSWORD_PRUEBA, hasher.salt())
+        return lambda: hasher.verify(PASSWORD_PRUEBA, encoded)
+
+    def handle(self, *args, **options):
+        segundos, peak = options["segundos"], options["peak"]
+
+        legado = hashlib.sha256(PASSWORD_PRUEBA.encode("utf-8")).hexdigest()
+        self._informar(
+            "sha256 sin sal (legado)",
+            self._medir(lambda: hashlib.sha256(PASSWORD_PRUEBA.encode("utf-8")).hexdigest() == legado, segundos),
+            peak,
+        )
+        for iteraciones in self._valores(options["pbkdf2"], "pbkdf2"):
+            verificar = self._hasher(PBKDF2PasswordHasher, iterations=iteraciones)
+            self._informar(f"pbkdf2_sha256 iter={iteraciones}", self._medir(verificar, segundos), peak)
+        for n in self._valores(options["scrypt"], "scrypt"):
+            verificar = self._hasher(ScryptPasswordHasher, work_factor=n)
+            self._informar(f"scrypt N={n}", self._medir(verificar, segundos), peak)
+        try:
+            import argon2  # noqa: F401
+        except ImportError:
+            self.stdout.write(self.style.WARNING("argon2-cffi no está instalado; se omite Argon2."))
+            return
+        for costo in self._valores(options["argon2"], "argon2"):
+            verificar = self._hasher(Argon2PasswordHasher, time_cost=costo)
+            self._informar(f"argon2id t={costo}", self._medir(verificar, segundos), peak)
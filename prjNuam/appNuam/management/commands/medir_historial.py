@@ -0,0 +1,70 @@
+import time
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from appNuam.models import HistorialAccion
+from appNuam.pagination import HistorialCursorPagination
+from appNuam.views_api import filtrar_historial
+
+
+class Command(BaseCommand):
+    help = (
+        "Recorre el historial de acciones con la paginación por cursor de la API y compara, a distintas "
+        "profundidades, el tiempo de una página por cursor contra la misma página con OFFSET."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calificacion", help="Filtra por calificación (como ?calificacion=).")
+        parser.add_argument("--usuario", help="Filtra por usuario (como ?usuario=).")
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument(
+            "--paginas",
+            default="1,10,100,1000",
+            help="Páginas en las que se informa el tiempo, separadas por coma (default: 1,10,100,1000).",
+        )
+
+    def _pagina(self, params, cursor):
+        consulta = dict(params, **({"cursor": cursor} if cursor else {}))
+        request = Request(RequestFactory().get("/api/historial/", consulta))
+        paginador = HistorialCursorPagination()
+        inicio = time.perf_counter()
+        filas = paginador.paginate_queryset(filtrar_historial(HistorialAccion.objects.all(), params), request)
+        segundos = time.perf_counter() - inicio
+        siguiente = paginador.get_next_link()
+        return segundos, filas, parse_qs(urlparse(siguiente).query)["cursor"][0] if siguiente else None
+
+    def _offset(self, params, numero, tamano):
+        queryset = filtrar_historial(HistorialAccion.objects.all(), params).order_by("-created_at", "-id")
+        inicio = time.perf_counter()
+        list(queryset[(numero - 1) * tamano : numero * tamano])
+        return time.perf_counter() - inicio
+
+    def handle(self, *args, **options):
+        try:
+            objetivo = sorted({int(p) for p in options["paginas"].split(",") if p.strip()})
+        except ValueError as exc:
+            raise CommandError("--paginas debe ser una lista de enteros separados por coma.") from exc
+        if not objetivo or objetivo[0] < 1:
+            raise CommandError("--paginas debe contener números de página positivos.")
+
+        tamano = options["page_size"]
+        params = {"page_size": str(tamano)}
+        for filtro in ("calificacion", "usuario"):
+            if options[filtro]:
+                params[filtro] = options[filtro]
+
+        cursor, numero = None, 0
+        while numero < objetivo[-1]:
+            numero += 1
+            segundos, filas, cursor = self._pagina(params, cursor)
+            if numero in objetivo:
+                self.stdout.write(
+                    f"página {numero:>6}: cursor {segundos * 1000:8.2f} ms   "
+                    f"offset {self._offset(params, numero, tamano) * 1000:8.2f} ms   ({len(filas)} filas)"
+                )
+            if cursor is None:
+                self.stdout.write(f"Fin del historial en la página {numero}.")
+                break
@@ -0,0 +1,69 @@
+import io
+import time
+from decimal import Decimal
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from appNuam.models import Emisor
+from appNuam.reportes import filas_reporte, generar_pdf_calificaciones
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el tiempo de generación del reporte PDF de calificaciones (ms por cada 1.000 filas). "
+        "Con --emisor usa los datos reales de ese emisor (consulta + dibujo); sin él, filas sintéticas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--emisor", type=int, help="Id del emisor a medir (incluye la consulta a BD).")
+        parser.add_argument(
+            "--filas",
+            default="1000,10000,50000",
+            help="Tamaños sintéticos separados por coma (default: 1000,10000,50000).",
+        )
+        parser.add_argument("--repeticiones", type=int, default=3, help="Se informa la mejor de N corridas.")
+
+    def _medir(self, emisor, filas_factory, repeticiones):
+        mejor = None
+        for _ in range(max(1, repeticiones)):
+            buffer = io.BytesIO()
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                total = generar_pdf_calificaciones(emisor, buffer, filas_factory())
+                segundos = time.perf_counter() - inicio
+            if mejor is None or segundos < mejor[1]:
+                mejor = (total, segundos, buffer.tell(), len(consultas))
+        return mejor
+
+    def _informar(self, etiqueta, total, segundos, bytes_pdf, consultas):
+        por_mil = segundos * 1000 / (total / 1000) if total else 0
+        self.stdout.write(
+            f"{etiqueta}: {total} filas en {segundos * 1000:.0f} ms "
+            f"({por_mil:.1f} ms por 1.000 filas, {bytes_pdf / 1024:.0f} KiB, {consultas} consultas)"
+        )
+
+    def handle(self, *args, **options):
+        if options["emisor"] is not None:
+            emisor = Emisor.objects.filter(pk=options["emisor"]).first()
+            if emisor is None:
+                raise CommandError(f"No existe el emisor {options['emisor']}.")
+            resultado = self._medir(emisor, lambda: filas_reporte(emisor.pk), options["repeticiones"])
+            self._informar(f"Emisor {emisor.pk} ({emisor.nombre})", *resultado)
+            return
+
+        try:
+            tamanos = [int(t) for t in options["filas"].split(",") if t.strip()]
+        except ValueError as exc:
+            raise CommandError("--filas debe ser una lista de enteros separados por coma.") from exc
+
+        emisor = Emisor(pk=0, nombre="Emisor de prueba", rut="11.111.111-1")
+        for tamano in tamanos:
+            def filas(n=tamano):
+                return (
+                    (2000 + i % 25, f"Instrumento {i:06d}", Decimal(i) * Decimal("1000.50"), Decimal("0.125"), "AA")
+                    for i in range(n)
+                )
+
+            self._informar("Sintético", *self._medir(emisor, filas, options["repeticiones"]))
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from appNuam.jobs import CargaWorkerPool
+
+
+class Command(BaseCommand):
+    help = "Procesa en segundo plano las cargas masivas pendientes (ArchivoCarga.estado='pendiente')."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.CARGAS_WORKERS,
+            help=f"Cantidad de cargas procesadas en paralelo (default: {settings.CARGAS_WORKERS}).",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=settings.CARGAS_POLL_INTERVAL,
+            help="Segundos entre consultas a la cola cuando no hay trabajo.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Procesa lo pendiente y termina en lugar de quedar escuchando.",
+        )
+
+    def handle(self, *args, **options):
+        pool = CargaWorkerPool(workers=options["workers"], intervalo=options["intervalo"])
+        self.stdout.write(self.style.NOTICE(f"Procesando cargas con {pool.workers} workers..."))
+        try:
+            pool.ejecutar(una_vez=options["once"])
+        except KeyboardInterrupt:
+            pool.detener()
+            self.stdout.write(self.style.WARNING("Detenido; esperando a que terminen las cargas en curso."))
+        self.stdout.write(self.style.SUCCESS("Cola de cargas finalizada."))
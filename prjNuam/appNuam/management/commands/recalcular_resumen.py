@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from appNuam.models import ResumenCalificaciones
+from appNuam.resumen import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero la tabla calificaciones_resumen usada por los dashboards."
+
+    def handle(self, *args, **options):
+        reconstruir()
+        self.stdout.write(
+            self.style.SUCCESS(f"Resumen recalculado: {ResumenCalificaciones.objects.count()} combinaciones.")
+        )
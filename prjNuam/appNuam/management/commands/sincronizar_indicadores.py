@@ -0,0 +1,53 @@
+from django.core.management import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from requests import exceptions as req_exceptions
+
+from appNuam.circuitos import CircuitoAbierto
+from appNuam.indicadores import DIAS_HISTORIA_INICIAL, INDICADORES, sincronizar_indicador
+
+
+class Command(BaseCommand):
+    help = (
+        "Descarga los valores de indicadores económicos que faltan en la tabla indicadores_valores "
+        "(solo las fechas posteriores a la última guardada)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pais", help="Solo este país (default: todos).")
+        parser.add_argument("--codigo", help="Solo este indicador, p. ej. usd, uf, utm (default: todos).")
+        parser.add_argument(
+            "--desde",
+            help=f"Fecha inicial YYYY-MM-DD para la primera descarga (default: últimos {DIAS_HISTORIA_INICIAL} días).",
+        )
+
+    def handle(self, *args, **options):
+        desde = None
+        if options["desde"]:
+            desde = parse_date(options["desde"])
+            if desde is None:
+                raise CommandError("--desde debe tener formato YYYY-MM-DD.")
+
+        series = [
+            (pais, codigo)
+            for pais, indicadores in INDICADORES.items()
+            for codigo in indicadores
+            if (not options["pais"] or pais == options["pais"].lower())
+            and (not options["codigo"] or codigo == options["codigo"].lower())
+        ]
+        if not series:
+            raise CommandError("No hay indicadores configurados que coincidan con el filtro.")
+
+        errores = 0
+        for pais, codigo in series:
+            try:
+                nuevos = sincronizar_indicador(pais, codigo, desde=desde)
+            except (req_exceptions.RequestException, ValueError, CircuitoAbierto) as exc:
+                errores += 1
+                self.stderr.write(self.style.ERROR(f"{pais}/{codigo}: {exc}"))
+                continue
+            self.stdout.write(f"{pais}/{codigo}: {nuevos} valores nuevos.")
+
+        if errores:
+            self.stdout.write(self.style.WARNING(f"Sincronización terminada con {errores} series con error."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Sincronización terminada."))
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import re
+from collections import defaultdict
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import NoReverseMatch, reverse
+
+from appNuam.models import Emisor, Usuario, UsuarioRol
+
+
+# Vistas sin argumentos que se recorren por defecto (listados y dashboards)
+VISTAS = (
+    "landing_public",
+    "admin_ti_dashboard",
+    "admin_ti_usuarios",
+    "admin_ti_emisores",
+    "contador_dashboard",
+    "contador_calificaciones",
+    "supervisor_dashboard",
+    "supervisor_calificaciones",
+    "accionista_dashboard",
+    "inversionista_dashboard",
+    "calificaciontributaria-list",
+    "api_historial",
+)
+# Vistas por emisor; se resuelven con el primer emisor de la BD
+VISTAS_EMISOR = ("emisor_calificaciones", "admin_ti_emisor_contadores", "admin_ti_emisor_representantes")
+
+# "tabla"."columna" <operador>, tal como lo escribe el ORM
+_CONDICION = re.compile(r'"(\w+)"\."(\w+)"\s*(=|IN\b|IS\b|<=|>=|<|>|BETWEEN\b)', re.IGNORECASE)
+_JOIN = re.compile(r'ON\s*\(\s*"(\w+)"\."(\w+)"\s*=\s*"(\w+)"\."(\w+)"\s*\)', re.IGNORECASE)
+# Alias de tabla ("tabla" U0, "tabla" AS T3): EXPLAIN de SQLite informa el alias
+_ALIAS = re.compile(r'(?:FROM|JOIN)\s+"(\w+)"\s+(?:AS\s+)?"?(\w+)"?', re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+MAX_COLUMNAS = 3
+
+
+def _normalizar(sql):
+    return _LITERAL.sub("?", sql)
+
+
+def columnas_candidatas(sql, tabla):
+    """
+    Columnas de ``tabla`` usadas en el WHERE y en los JOIN de la consulta, en el
+    orden de un índice compuesto: igualdades, luego columnas de JOIN y al final rangos.
+    Un JOIN solo cuenta si la otra tabla está filtrada (el plan podría partir de
+    ella y buscar en ``tabla`` por esa columna).
+    """
+    where = sql.split(" WHERE ", 1)[1] if " WHERE " in sql else ""
+    where = re.split(r"\b(?:ORDER BY|GROUP BY|LIMIT)\b", where)[0]
+    igualdad, rango, filtradas = [], [], set()
+    for t, columna, operador in _CONDICION.findall(where):
+        filtradas.add(t)
+        if t == tabla:
+            (igualdad if operador.upper() in ("=", "IN", "IS") else rango).append(columna)
+    joins = []
+    for t1, c1, t2, c2 in _JOIN.findall(sql):
+        for t, c, otra in ((t1, c1, t2), (t2, c2, t1)):
+            if t == tabla and otra != tabla and otra in filtradas:
+                joins.append(c)
+    columnas = []
+    for columna in igualdad + joins + rango:
+        if columna not in columnas:
+            columnas.append(columna)
+    return columnas[:MAX_COLUMNAS]
+
+
+class Command(BaseCommand):
+    help = (
+        "Recorre las vistas principales con usuarios de cada rol, registra las consultas del ORM, las "
+        "analiza con EXPLAIN e informa los scans secuenciales sobre tablas grandes junto con el DDL "
+        "idempotente de los índices sugeridos (ver también appNuam/sql/indices_vistas.sql)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", action="append", default=[], help="Ruta extra a recorrer (repetible).")
+        parser.add_argument(
+            "--usuario", action="append", default=[], help="Username con el que navegar (default: uno por rol)."
+        )
+        parser.add_argument(
+            "--min-filas", type=int, default=1000, help="Ignora scans sobre tablas con menos filas (default: 1000)."
+        )
+        parser.add_argument("--salida", help="Archivo donde escribir el DDL sugerido.")
+
+    # --- recolección ---
+
+    def _rutas(self, extra):
+        rutas = []
+        for nombre in VISTAS:
+            try:
+                rutas.append(reverse(nombre))
+            except NoReverseMatch:
+                pass
+        emisor_id = Emisor.objects.order_by("pk").values_list("pk", flat=True).first()
+        if emisor_id is not None:
+            rutas += [reverse(nombre, kwargs={"id_emisor": emisor_id}) for nombre in VISTAS_EMISOR]
+        return rutas + extra
+
+    def _usuarios(self, usernames):
+        if usernames:
+            usuarios = list(Usuario.objects.filter(username__in=usernames))
+            faltantes = set(usernames) - {u.username for u in usuarios}
+            if faltantes:
+                raise CommandError(f"No existen los usuarios: {', '.join(sorted(faltantes))}.")
+            return usuarios
+        primeros = {}
+        for rol, usuario_id in UsuarioRol.objects.order_by("usuario_id").values_list("rol__nombre", "usuario_id"):
+            primeros.setdefault(rol, usuario_id)
+        return list(Usuario.objects.filter(pk__in=set(primeros.values())))
+
+    def _recolectar(self, rutas, usuarios):
+        """
+        {sql normalizado: (sql, params, [rutas])} de los SELECT ejecutados.
+
+        Todo corre dentro de una transacción que se revierte (``force_login`` y
+        algunas vistas escriben) y cada request en su propio savepoint, también
+        revertido, para que un error en una vista no aborte la transacción. El
+        presupuesto de consultas se desactiva: aquí interesan todas las consultas.
+        """
+        consultas = {}
+        actual = {"ruta": None, "total": 0}
+
+        def registrar(execute, sql, params, many, context):
+            actual["total"] += 1
+            if actual["ruta"] and not many and sql.lstrip().upper().startswith("SELECT"):
+                _, _, vistas = consultas.setdefault(_normalizar(sql), (sql, params, []))
+                if actual["ruta"] not in vistas:
+                    vistas.append(actual["ruta"])
+            return execute(sql, params, many, context)
+
+        with override_settings(ALLOWED_HOSTS=["testserver"], CONSULTAS_PRESUPUESTO=""), transaction.atomic():
+            with connection.execute_wrapper(registrar):
+                for usuario in usuarios:
+                    cliente = Client(raise_request_exception=False)
+                    actual["ruta"] = None
+                    cliente.force_login(usuario, backend="appNuam.auth_backends.SHA256Backend")
+                    for ruta in rutas:
+                        punto = transaction.savepoint()
+                        actual.update(ruta=ruta, total=0)
+                        respuesta = cliente.get(ruta)
+                        if getattr(respuesta, "streaming", False):
+                            b"".join(respuesta.streaming_content)
+                        actual["ruta"] = None
+                        transaction.savepoint_rollback(punto)
+                        self.stdout.write(
+                            f"{usuario.username:<20} {respuesta.status_code} {ruta} ({actual['total']} consultas)"
+                        )
+            transaction.set_rollback(True)
+        return consultas
+
+    # --- EXPLAIN ---
+
+    def _scans_postgresql(self, cursor, sql, params):
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        pendientes, tablas = [plan[0]["Plan"]], []
+        while pendientes:
+            nodo = pendientes.pop()
+            if nodo.get("Node Type") == "Seq Scan":
+                tablas.append(nodo["Relation Name"])
+            pendientes.extend(nodo.get("Plans", []))
+        return tablas
+
+    def _scans_sqlite(self, cursor, sql, params):
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        alias = {nombre: tabla for tabla, nombre in _ALIAS.findall(sql)}
+        tablas = []
+        for fila in cursor.fetchall():
+            detalle = fila[-1]
+            if detalle.startswith("SCAN ") and " USING " not in detalle:
+                nombre = detalle.split()[1]
+                tablas.append(alias.get(nombre, nombre))
+        return tablas
+
+    def _filas(self, cursor, tabla, cache):
+        if tabla not in cache:
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [tabla])
+                fila = cursor.fetchone()
+                cache[tabla] = max(fila[0], 0) if fila else 0
+            else:
+                cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(tabla)}")
+                cache[tabla] = cursor.fetchone()[0]
+        return cache[tabla]
+
+    # --- sugerencias ---
+
+    def _cubierto(self, cursor, tabla, columnas, cache):
+        if tabla not in cache:
+            restricciones = connection.introspection.get_constraints(cursor, tabla)
+            cache[tabla] = [r["columns"] for r in restricciones.values() if r["index"] or r["unique"] or r["primary_key"]]
+        return any(existentes[: len(columnas)] == columnas for existentes in cache[tabla])
+
+    def _ddl(self, tabla, columnas):
+        nombre = f"ix_{tabla}_{'_'.join(columnas)}"
+        if len(nombre) > 63:
+            nombre = f"{nombre[:54]}_{hashlib.md5(nombre.encode()).hexdigest()[:8]}"
+        concurrente = " CONCURRENTLY" if connection.vendor == "postgresql" else ""
+        lista = ", ".join(connection.ops.quote_name(c) for c in columnas)
+        return f"CREATE INDEX{concurrente} IF NOT EXISTS {nombre} ON {connection.ops.quote_name(tabla)} ({lista});"
+
+    def handle(self, *args, **options):
+        if connection.vendor == "postgresql":
+            explicar = self._scans_postgresql
+        elif connection.vendor == "sqlite":
+            explicar = self._scans_sqlite
+        else:
+            raise CommandError(f"EXPLAIN no soportado para {connection.vendor}.")
+
+        usuarios = self._usuarios(options["usuario"])
+        if not usuarios:
+            raise CommandError("No hay usuarios con roles asignados; use --usuario.")
+        consultas = self._recolectar(self._rutas(options["url"]), usuarios)
+
+        scans = defaultdict(lambda: {"consultas": 0, "rutas": set(), "columnas": defaultdict(int)})
+        filas, indices = {}, {}
+        with connection.cursor() as cursor:
+            # Descarta lo que EXPLAIN informe y no sea una tabla (subconsultas, CTE, alias sin resolver)
+            existentes = set(connection.introspection.table_names(cursor, include_views=True))
+            for ejemplo, params, rutas in consultas.values():
+                try:
+                    tablas = explicar(cursor, ejemplo, params)
+                except Exception as exc:
+                    self.stderr.write(f"No se pudo explicar: {ejemplo[:120]}... ({exc})")
+                    continue
+                for tabla in tablas:
+                    if tabla not in existentes or self._filas(cursor, tabla, filas) < options["min_filas"]:
+                        continue
+                    scan = scans[tabla]
+                    scan["consultas"] += 1
+                    scan["rutas"].update(rutas)
+                    columnas = tuple(columnas_candidatas(ejemplo, tabla))
+                    if columnas:
+                        scan["columnas"][columnas] += 1
+
+            self.stdout.write(f"\n{len(consultas)} consultas distintas analizadas.")
+            if not scans:
+                self.stdout.write(self.style.SUCCESS(f"Sin scans secuenciales sobre tablas de {options['min_filas']}+ filas."))
+                return
+
+            ddl = []
+            for tabla, scan in sorted(scans.items(), key=lambda item: -item[1]["consultas"]):
+                self.stdout.write(
+                    self.style.WARNING(f"\nSeq scan en {tabla} (~{filas[tabla]} filas) en {scan['consultas']} consultas")
+                )
+                self.stdout.write(f"  vistas: {', '.join(sorted(scan['rutas']))}")
+                if not scan["columnas"]:
+                    self.stdout.write("  sin filtros indexables (tabla completa o LIKE con comodín inicial)")
+                for columnas, veces in sorted(scan["columnas"].items(), key=lambda item: -item[1]):
+                    columnas = list(columnas)
+                    if self._cubierto(cursor, tabla, columnas, indices):
+                        self.stdout.write(f"  ({', '.join(columnas)}): ya existe un índice que lo cubre")
+                        continue
+                    sentencia = self._ddl(tabla, columnas)
+                    if sentencia not in ddl:
+                        ddl.append(sentencia)
+                    self.stdout.write(f"  ({', '.join(columnas)}) en {veces} consultas -> {sentencia}")
+
+        if ddl:
+            texto = "-- Índices sugeridos por sugerir_indices (revisar antes de aplicar)\n" + "\n".join(ddl) + "\n"
+            if options["salida"]:
+                with open(options["salida"], "w", encoding="utf-8") as archivo:
+                    archivo.write(texto)
+                self.stdout.write(self.style.SUCCESS(f"\nDDL escrito en {options['salida']}"))
+            else:
+                self.stdout.write("\n" + texto)
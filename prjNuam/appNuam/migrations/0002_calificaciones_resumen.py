@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appNuam', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCalificaciones',
+            fields=[
+                ('id', models.AutoField(db_column='id_resumen', primary_key=True, serialize=False)),
+                ('estado_proceso', models.CharField(max_length=12)),
+                ('anio', models.IntegerField()),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'calificaciones_resumen',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appNuam', '0002_calificaciones_resumen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicadorValor',
+            fields=[
+                ('id', models.AutoField(db_column='id_indicador_valor', primary_key=True, serialize=False)),
+                ('pais', models.CharField(max_length=30)),
+                ('codigo', models.CharField(max_length=20)),
+                ('fecha', models.DateField()),
+                ('valor', models.DecimalField(decimal_places=6, max_digits=18)),
+            ],
+            options={
+                'db_table': 'indicadores_valores',
+                'managed': False,
+            },
+        ),
+    ]
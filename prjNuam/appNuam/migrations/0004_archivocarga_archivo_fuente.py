@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appNuam', '0003_indicadores_valores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocarga',
+            name='archivo_fuente',
+            field=models.ForeignKey(blank=True, db_column='id_archivo_fuente', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='appNuam.archivofuente'),
+        ),
+    ]
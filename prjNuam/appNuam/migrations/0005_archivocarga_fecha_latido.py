@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appNuam', '0004_archivocarga_archivo_fuente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocarga',
+            name='fecha_latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
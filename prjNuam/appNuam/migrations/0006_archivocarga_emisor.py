@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appNuam', '0005_archivocarga_fecha_latido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivocarga',
+            name='emisor',
+            field=models.ForeignKey(blank=True, db_column='id_emisor', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='appNuam.emisor'),
+        ),
+    ]
@@ -87,8 +87,10 @@ class Usuario(models.Model):
 
     @property
     def is_staff(self):
-        # Allow staff access if they have ADMIN_TI role
-        return self.roles.filter(nombre="ADMIN_TI").exists() or self.username == "admin"
+        # Allow staff access if they have ADMIN_TI role (roles cacheados, ver permissions.db_role_names)
+        from .permissions import db_role_names
+
+        return self.username == "admin" or "ADMIN_TI" in db_role_names(self)
     
     def has_perm(self, perm, obj=None):
         return self.is_staff
@@ -305,6 +307,17 @@ class CalificacionTributaria(models.Model):
     def id_calificacion(self):
         return self.id
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Clave original (emisor, estado, año) para mantener calificaciones_resumen al guardar
+        instance._clave_resumen_original = instance.clave_resumen
+        return instance
+
+    @property
+    def clave_resumen(self):
+        return (self.__dict__.get("emisor_id"), self.__dict__.get("estado_proceso"), self.__dict__.get("anio"))
+
     def clean(self):
         current_year = date.today().year
         if self.anio < 2023 or self.anio > current_year:
@@ -319,6 +332,50 @@ class CalificacionTributaria(models.Model):
             raise ValidationError("Debe indicar un motivo de rechazo para la calificación.")
 
 
+class ResumenCalificaciones(models.Model):
+    """
+    Contadores materializados de calificaciones por (emisor, estado_proceso, año).
+    Se mantienen de forma incremental desde la aplicación (ver ``resumen.py``);
+    la tabla se crea con ``sql/calificaciones_resumen.sql``.
+    """
+
+    id = models.AutoField(primary_key=True, db_column="id_resumen")
+    emisor = models.ForeignKey(Emisor, on_delete=models.CASCADE, db_column="id_emisor", related_name="+")
+    estado_proceso = models.CharField(max_length=12)
+    anio = models.IntegerField()
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        managed = False
+        db_table = "calificaciones_resumen"
+        unique_together = ("emisor", "estado_proceso", "anio")
+
+    def __str__(self):
+        return f"{self.emisor_id}/{self.estado_proceso}/{self.anio}: {self.total}"
+
+
+class IndicadorValor(models.Model):
+    """
+    Valor diario de un indicador económico (USD, UF, UTM...) por país.
+    Se llena con ``manage.py sincronizar_indicadores`` (ver ``indicadores.py``);
+    la tabla se crea con ``sql/indicadores_valores.sql``.
+    """
+
+    id = models.AutoField(primary_key=True, db_column="id_indicador_valor")
+    pais = models.CharField(max_length=30)
+    codigo = models.CharField(max_length=20)
+    fecha = models.DateField()
+    valor = models.DecimalField(max_digits=18, decimal_places=6)
+
+    class Meta:
+        managed = False
+        db_table = "indicadores_valores"
+        unique_together = ("pais", "codigo", "fecha")
+
+    def __str__(self):
+        return f"{self.pais}/{self.codigo} {self.fecha}: {self.valor}"
+
+
 class Documento(models.Model):
     id = models.AutoField(primary_key=True, db_column="id_documento")
     tipo_documento = models.CharField(max_length=50)
@@ -382,11 +439,21 @@ class ArchivoFuente(models.Model):
 class ArchivoCarga(models.Model):
     id = models.AutoField(primary_key=True, db_column="id_carga")
     archivo_normalizado = models.IntegerField(db_column="id_archivo_normalizado", blank=True, null=True)
+    # Archivo subido que origina la carga (ver appNuam/sql/cargas_masivas_origen.sql)
+    archivo_fuente = models.ForeignKey(
+        ArchivoFuente, on_delete=models.SET_NULL, db_column="id_archivo_fuente", blank=True, null=True, related_name="+"
+    )
+    # Emisor autorizado al subir el archivo: la carga solo admite filas de este emisor
+    emisor = models.ForeignKey(
+        Emisor, on_delete=models.SET_NULL, db_column="id_emisor", blank=True, null=True, related_name="+"
+    )
     usuario = models.ForeignKey(
         Usuario, on_delete=models.SET_NULL, db_column="id_usuario", blank=True, null=True, related_name="+"
     )
     fecha_inicio = models.DateTimeField(blank=True, null=True)
     fecha_fin = models.DateTimeField(blank=True, null=True)
+    # Último avance del worker que la procesa (ver appNuam/sql/cargas_masivas_latido.sql)
+    fecha_latido = models.DateTimeField(blank=True, null=True)
     total_filas = models.IntegerField(blank=True, null=True)
     filas_ok = models.IntegerField(blank=True, null=True)
     filas_error = models.IntegerField(blank=True, null=True)
@@ -0,0 +1,100 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+
+class CalificacionCursorPagination(CursorPagination):
+    """
+    Paginación por cursor sobre la PK: cada página es un ``WHERE id > x ORDER BY id
+    LIMIT n`` que usa el índice primario, sin COUNT(*) ni OFFSET, así que su costo
+    no crece con la profundidad ni con el tamaño de la tabla.
+    """
+
+    ordering = "id"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class HistorialCursorPagination(CursorPagination):
+    """
+    Historial del más reciente al más antiguo. La posición del cursor es
+    ``created_at`` (desempate por ``id``), de modo que con los índices
+    ``(calificacion_id, created_at, id)`` / ``(usuario_id, created_at, id)`` cada
+    página es un rango del índice sin importar cuán atrás se esté.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+def _codificar_cursor(valor, pk, atras):
+    datos = json.dumps([valor, pk, "a" if atras else "s"], separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor):
+    """``(valor, pk, atras)`` o ``None`` si el cursor no es uno generado por ``_codificar_cursor``."""
+    try:
+        valor, pk, sentido = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    # El cursor viene del cliente: solo escalares (nada de listas u objetos que lleguen al filtro)
+    if isinstance(valor, bool) or not isinstance(valor, (str, int, float, type(None))):
+        return None
+    if isinstance(pk, bool) or not isinstance(pk, int) or sentido not in ("a", "s"):
+        return None
+    return valor, pk, sentido == "a"
+
+
+def _valor(obj, campo):
+    for parte in campo.split("__"):
+        obj = getattr(obj, parte)
+    return obj
+
+
+def pagina_por_clave(queryset, orden, cursor=None, tamano=50):
+    """
+    Paginación por clave para vistas HTML: ``orden`` es un campo (``"-anio"``,
+    ``"emisor__nombre"``...) y se desempata por PK en el mismo sentido. Cada página
+    es un ``WHERE (campo, pk) > (valor, pk)`` + ``LIMIT``, sin OFFSET ni COUNT.
+
+    El campo debe ser no nulo y con valores serializables en JSON (texto o número).
+    Devuelve ``{"filas", "siguiente", "anterior"}`` con los cursores (o ``None``).
+    Un cursor inválido (alterado, o de otro orden) se ignora y se entrega la primera página.
+    """
+    descendente = orden.startswith("-")
+    campo = orden.lstrip("-")
+    posicion = _decodificar_cursor(cursor) if cursor else None
+    if posicion:
+        # Hacia atrás se lee en el sentido inverso desde la primera fila de la página actual
+        operador = "lt" if descendente != posicion[2] else "gt"
+        valor, pk = posicion[0], posicion[1]
+        try:
+            queryset = queryset.filter(
+                Q(**{f"{campo}__{operador}": valor}) | Q(**{campo: valor, f"pk__{operador}": pk})
+            )
+        except (ValueError, TypeError, ValidationError):
+            posicion = None
+    atras = bool(posicion and posicion[2])
+    inverso = descendente != atras
+    prefijo = "-" if inverso else ""
+    filas = list(queryset.order_by(f"{prefijo}{campo}", f"{prefijo}pk")[: tamano + 1])
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+    if atras:
+        filas.reverse()
+
+    siguiente = anterior = None
+    if filas:
+        if atras or hay_mas:
+            siguiente = _codificar_cursor(_valor(filas[-1], campo), filas[-1].pk, False)
+        if (atras and hay_mas) or (posicion and not atras):
+            anterior = _codificar_cursor(_valor(filas[0], campo), filas[0].pk, True)
+    return {"filas": filas, "siguiente": siguiente, "anterior": anterior}
@@ -0,0 +1,131 @@
+"""
+Hash de contraseñas de ``Usuario.password_hash``.
+
+Se usa el sistema de hashers de Django (``PASSWORD_HASHERS``): el primero de la
+lista es el preferido (PBKDF2, scrypt o Argon2 según ``PASSWORD_HASHER``) y sus
+factores de trabajo se ajustan por settings. Los hashes antiguos se actualizan
+de forma transparente cuando el usuario inicia sesión:
+  - SHA-256 hexadecimal sin sal (formato original de la tabla ``usuarios``).
+  - Hashes de otro algoritmo o con un factor de trabajo distinto al configurado.
+
+``usuarios_demo`` arma (y guarda en cache) la lista corta de credenciales de
+prueba que muestra la página de login cuando ``LOGIN_DEMO_USUARIOS`` está activo.
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+
+from .models import Usuario
+
+
+_HASH_LEGADO = re.compile(r"[0-9a-f]{64}")
+
+DEMO_CACHE_KEY = "login:usuarios_demo"
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 con iteraciones configurables (``PASSWORD_PBKDF2_ITERATIONS``)."""
+
+    def __init__(self):
+        self.iterations = getattr(settings, "PASSWORD_PBKDF2_ITERATIONS", 0) or self.iterations
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """scrypt con factor N configurable (``PASSWORD_SCRYPT_WORK_FACTOR``, potencia de 2)."""
+
+    def __init__(self):
+        self.work_factor = getattr(settings, "PASSWORD_SCRYPT_WORK_FACTOR", 0) or self.work_factor
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id con costo de tiempo configurable (``PASSWORD_ARGON2_TIME_COST``); requiere argon2-cffi."""
+
+    def __init__(self):
+        self.time_cost = getattr(settings, "PASSWORD_ARGON2_TIME_COST", 0) or self.time_cost
+
+
+def es_hash_legado(encoded):
+    return bool(encoded) and _HASH_LEGADO.fullmatch(encoded) is not None
+
+
+def hashear_password(raw):
+    """Hash con el algoritmo y factor de trabajo preferidos."""
+    return hashers.make_password(raw)
+
+
+def _actualizar_hash(usuario, raw):
+    usuario.password_hash = hashear_password(raw)
+    if usuario.pk:
+        Usuario.objects.filter(pk=usuario.pk).update(password_hash=usuario.password_hash)
+
+
+def verificar_password(usuario, raw, actualizar=True):
+    """
+    Indica si ``raw`` es la contraseña de ``usuario``. Si es correcta y el hash
+    está desactualizado (legado, otro algoritmo u otro costo) y ``actualizar``
+    es verdadero, se reemplaza por uno nuevo con una sola escritura.
+    """
+    encoded = usuario.password_hash or ""
+    setter = (lambda nueva: _actualizar_hash(usuario, nueva)) if actualizar else None
+    if es_hash_legado(encoded):
+        valida = constant_time_compare(hashlib.sha256(raw.encode("utf-8")).hexdigest(), encoded)
+        if valida and setter:
+            setter(raw)
+        return valida
+    return hashers.check_password(raw, encoded, setter=setter)
+
+
+def simular_verificacion(raw):
+    """
+    Hace el mismo trabajo que una verificación real; se usa cuando el usuario no
+    existe para que el tiempo de respuesta no revele qué usernames son válidos.
+    """
+    hashers.make_password(raw)
+
+
+@lru_cache(maxsize=1024)
+def es_password(encoded, raw):
+    """``verificar_password`` sin efectos y memorizado por hash (p. ej. detectar la clave demo)."""
+    if es_hash_legado(encoded):
+        return constant_time_compare(hashlib.sha256(raw.encode("utf-8")).hexdigest(), encoded)
+    return hashers.check_password(raw, encoded)
+
+
+def _es_demo(encoded, demo_password):
+    return bool(encoded) and es_password(encoded, demo_password)
+
+
+def usuarios_demo():
+    """
+    Credenciales de prueba para la página de login: los primeros ``LOGIN_DEMO_MAX``
+    usuarios (por username) con estado, roles y la contraseña demo si es la suya.
+    Se calcula una vez y se guarda en cache ``LOGIN_DEMO_CACHE_TTL`` segundos; las
+    señales de ``Usuario``/``UsuarioRol`` la invalidan.
+    """
+    lista = cache.get(DEMO_CACHE_KEY)
+    if lista is None:
+        demo_password = getattr(settings, "LOGIN_DEMO_PASSWORD", "1234")
+        usuarios = Usuario.objects.order_by("username").prefetch_related("roles")[
+            : getattr(settings, "LOGIN_DEMO_MAX", 20)
+        ]
+        lista = [
+            {
+                "username": u.username,
+                "estado": u.estado,
+                "roles": [rol.nombre for rol in u.roles.all()],
+                "demo_password": demo_password if _es_demo(u.password_hash, demo_password) else None,
+            }
+            for u in usuarios
+        ]
+        cache.set(DEMO_CACHE_KEY, lista, getattr(settings, "LOGIN_DEMO_CACHE_TTL", 300))
+    return lista
+
+
+def invalidar_usuarios_demo():
+    cache.delete(DEMO_CACHE_KEY)
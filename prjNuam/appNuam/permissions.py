@@ -2,14 +2,51 @@ from functools import wraps
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.http import HttpResponseForbidden
 
+from .models import EmisorContador, EmisorUsuario
+
+
+ROLES_CACHE_PREFIX = "roles:usuario:"
+
+
+def _roles_cache_key(user_id):
+    return f"{ROLES_CACHE_PREFIX}{user_id}"
+
+
+def invalidate_role_cache(user_id):
+    """Descarta los roles cacheados de un usuario (se llama al cambiar ``UsuarioRol``)."""
+    cache.delete(_roles_cache_key(user_id))
+
+
+def db_role_names(user):
+    """
+    Nombres de rol del usuario según ``usuario_rol``, en orden de BD.
+
+    Se memorizan en el propio objeto (vale para todo el request) y, si
+    ``ROLES_CACHE_TTL`` > 0, en el cache compartido para los requests siguientes.
+    """
+    cached = getattr(user, "_role_names_cache", None)
+    if cached is not None:
+        return cached
+
+    ttl = getattr(settings, "ROLES_CACHE_TTL", 0)
+    key = _roles_cache_key(user.pk) if ttl and getattr(user, "pk", None) else None
+    names = cache.get(key) if key else None
+    if names is None:
+        names = list(user.roles.values_list("nombre", flat=True))
+        if key:
+            cache.set(key, names, ttl)
+    user._role_names_cache = names
+    return names
+
 
 def _role_names(user):
     names = set()
     if hasattr(user, "roles"):
         try:
-            names.update([getattr(r, "nombre", str(r)) for r in user.roles.all()])
+            names.update(db_role_names(user))
         except Exception:
             pass
     if hasattr(user, "role_names"):
@@ -24,6 +61,32 @@ def _role_names(user):
     return {n for n in names if n}
 
 
+# Roles que operan sobre todos los emisores
+ROLES_TODOS_LOS_EMISORES = {"ADMIN_TI", "SUPERVISOR"}
+
+
+def emisores_del_contador(user):
+    """Ids de los emisores asignados al contador de ``user`` (``emisores_contadores``)."""
+    return set(EmisorContador.objects.filter(contador__usuario=user).values_list("emisor_id", flat=True))
+
+
+def emisores_permitidos(user):
+    """
+    Ids de los emisores cuyas calificaciones puede ver ``user``, o ``None`` si ve todas
+    (ADMIN_TI / SUPERVISOR). Contadores y analistas por ``emisores_contadores``;
+    accionistas e inversionistas por ``emisor_usuario``.
+    """
+    roles = _role_names(user)
+    if roles & ROLES_TODOS_LOS_EMISORES:
+        return None
+    ids = set()
+    if roles & {"CONTADOR", "ANALISTA"}:
+        ids |= emisores_del_contador(user)
+    if roles & {"ACCIONISTA", "INVERSIONISTA"}:
+        ids |= set(EmisorUsuario.objects.filter(usuario=user).values_list("emisor_id", flat=True))
+    return ids
+
+
 def role_required(*allowed_roles):
     def decorator(view_func):
         @login_required
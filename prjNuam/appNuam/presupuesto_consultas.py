@@ -0,0 +1,78 @@
+"""
+Presupuesto de consultas SQL por vista, para detectar N+1 antes de producción.
+
+Una vista declara ``max_consultas = N`` (consultas de todo el request: sesión,
+usuario y roles incluidos). ``PresupuestoConsultasMiddleware`` las cuenta con
+un ``execute_wrapper`` y, si se excede, según ``CONSULTAS_PRESUPUESTO``:
+  - ``"error"``: lanza ``PresupuestoExcedido`` (el request falla; útil en DEBUG y tests).
+  - ``"log"``: deja un warning con la vista y las consultas.
+  - ``""``: desactivado.
+
+Para scripts o tests: ``with presupuesto_consultas(5): client.get(url)``.
+"""
+
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class PresupuestoExcedido(AssertionError):
+    pass
+
+
+class _Contador:
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.consultas.append(sql)
+        return execute(sql, params, many, context)
+
+
+def _mensaje(nombre, maximo, consultas):
+    detalle = "\n".join(f"  {i}. {sql}" for i, sql in enumerate(consultas, 1))
+    return f"{nombre}: {len(consultas)} consultas, presupuesto {maximo}\n{detalle}"
+
+
+@contextmanager
+def presupuesto_consultas(maximo, using="default", nombre="bloque"):
+    """Falla con ``PresupuestoExcedido`` si el bloque ejecuta más de ``maximo`` consultas."""
+    contador = _Contador()
+    with connections[using].execute_wrapper(contador):
+        yield contador
+    if len(contador.consultas) > maximo:
+        raise PresupuestoExcedido(_mensaje(nombre, maximo, contador.consultas))
+
+
+class PresupuestoConsultasMiddleware:
+    """Aplica ``max_consultas`` de la vista resuelta a todo el request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        modo = getattr(settings, "CONSULTAS_PRESUPUESTO", "")
+        if not modo:
+            return self.get_response(request)
+        contador = _Contador()
+        with connections["default"].execute_wrapper(contador):
+            response = self.get_response(request)
+        vista = getattr(request, "_presupuesto_vista", None)
+        if vista is not None and len(contador.consultas) > vista[1]:
+            mensaje = _mensaje(vista[0], vista[1], contador.consultas)
+            if modo == "error":
+                raise PresupuestoExcedido(mensaje)
+            logger.warning("Presupuesto de consultas excedido en %s", mensaje)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        clase = getattr(view_func, "view_class", None) or getattr(view_func, "cls", None)
+        maximo = getattr(clase or view_func, "max_consultas", None)
+        if maximo is not None:
+            request._presupuesto_vista = (getattr(clase or view_func, "__name__", "vista"), maximo)
+        return None
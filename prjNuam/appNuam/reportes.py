@@ -0,0 +1,454 @@
+"""
+Reportes PDF de calificaciones por emisor, con cache en disco.
+
+Cada PDF se guarda en ``MEDIA_ROOT/reportes/calificaciones/<emisor>/<version>.pdf``.
+La versión es un hash de todo lo que el reporte imprime: nombre/RUT del emisor
+y cada fila de ``filas_reporte`` (incluido el nombre del instrumento). Así
+cualquier cambio la invalida, aunque no pase por ``save()`` ni toque
+``fecha_modificacion`` (``bulk_update``, ``update``, renombrar un instrumento).
+Mientras la versión no cambie, las descargas sirven el archivo ya generado; la
+versión también se usa como ETag.
+
+``zip_lote`` genera los reportes de varios emisores en paralelo y los entrega
+como un ZIP que se transmite a medida que cada PDF termina. Lo usan la vista de
+lote y el comando ``generar_reportes_lote``, y ambos comparten un pool de
+procesos por proceso servidor (``_pool_reportes``): el dibujo con reportlab usa
+CPU y retiene el GIL. Los procesos se crean con "spawn" y abren sus propias
+conexiones a BD, de modo que no heredan ni cierran las del proceso que los usa.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from .models import CalificacionTributaria, Emisor, Reporte
+
+
+logger = logging.getLogger(__name__)
+
+DIR_REPORTES = os.path.join("reportes", "calificaciones")
+TIPO_REPORTE = "calificaciones_emisor"
+TIPO_LOTE = "calificaciones_lote"
+REPORTES_LOTE_MAX = 100
+
+CHUNK_REPORTE = 2000
+ANCHO_PAGINA, ALTO_PAGINA = letter
+MARGEN = 50
+ALTO_FILA = 14
+TAMANO_FUENTE = 10
+
+# (título, campo de values_list, x, ancho, alineación): cada columna ocupa [x, x + ancho]
+# y su texto se recorta a ese ancho; las columnas "der" se alinean a x + ancho.
+COLUMNAS_REPORTE = (
+    ("Año", "anio", MARGEN, 35, "izq"),
+    ("Instrumento", "instrumento__nombre", 90, 230, "izq"),
+    ("Monto", "monto", 325, 85, "der"),
+    ("Factor", "factor", 415, 65, "der"),
+    ("Rating", "rating", 490, ANCHO_PAGINA - MARGEN - 490, "izq"),
+)
+
+
+CAMPOS_REPORTE = tuple(campo for _, campo, _, _, _ in COLUMNAS_REPORTE)
+
+
+def _filas_vigentes(ids_emisor):
+    return CalificacionTributaria.objects.filter(emisor_id__in=ids_emisor, estado_registro="vigente").order_by(
+        "emisor_id", "anio", "id"
+    )
+
+
+def versiones_reporte(ids_emisor):
+    """
+    Devuelve ``{id_emisor: (emisor, version, ultima_modificacion)}`` con dos
+    consultas para todo el lote; los emisores inexistentes no aparecen.
+    ``ultima_modificacion`` (para Last-Modified) es la fecha más reciente de sus
+    calificaciones o del emisor, y puede ser ``None``.
+    """
+    emisores = {
+        emisor.pk: emisor
+        for emisor in Emisor.objects.filter(pk__in=ids_emisor).annotate(
+            max_modificacion=Max("calificaciontributaria__fecha_modificacion"),
+            max_creacion=Max("calificaciontributaria__fecha_creacion"),
+        )
+    }
+    hashes = {pk: hashlib.sha256(repr((e.nombre, e.rut)).encode()) for pk, e in emisores.items()}
+    filas = _filas_vigentes(list(emisores)).values_list("emisor_id", *CAMPOS_REPORTE).iterator(chunk_size=CHUNK_REPORTE)
+    for id_emisor, *valores in filas:
+        hashes[id_emisor].update(repr(valores).encode())
+
+    versiones = {}
+    for pk, emisor in emisores.items():
+        fechas = [f for f in (emisor.max_modificacion, emisor.max_creacion, emisor.fecha_creacion) if f is not None]
+        versiones[pk] = (emisor, hashes[pk].hexdigest()[:32], max(fechas, default=None))
+    return versiones
+
+
+def version_reporte(id_emisor):
+    """Igual que ``versiones_reporte`` para un emisor: la tupla o ``None`` si no existe."""
+    return versiones_reporte([id_emisor]).get(id_emisor)
+
+
+def ruta_reporte(id_emisor, version):
+    return os.path.join(settings.MEDIA_ROOT, DIR_REPORTES, str(id_emisor), f"{version}.pdf")
+
+
+def filas_reporte(id_emisor):
+    """
+    Filas del reporte en una sola consulta (JOIN con instrumentos), leídas con
+    cursor del lado del servidor para no cargar miles de instancias en memoria.
+    """
+    return _filas_vigentes([id_emisor]).values_list(*CAMPOS_REPORTE).iterator(chunk_size=CHUNK_REPORTE)
+
+
+def _texto_celda(campo, valor):
+    if campo == "instrumento__nombre":
+        return valor or "N/A"
+    if campo == "factor":
+        return str(valor) if valor else "-"
+    if valor is None or valor == "":
+        return "-"
+    return str(valor)
+
+
+def _ajustar(texto, ancho, fuente, tamano):
+    """Recorta ``texto`` (con "...") hasta que quepa en ``ancho``; devuelve ``(texto, ancho_final)``."""
+    medida = stringWidth(texto, fuente, tamano)
+    if medida <= ancho:
+        return texto, medida
+    while texto:
+        texto = texto[:-1]
+        medida = stringWidth(texto + "...", fuente, tamano)
+        if medida <= ancho:
+            break
+    return texto + "...", medida
+
+
+class _TablaPDF:
+    """Dibuja la tabla página a página, repitiendo encabezado y pie en cada una."""
+
+    def __init__(self, p, emisor):
+        self.p = p
+        self.emisor = emisor
+        self.pagina = 0
+        self.texto = None
+        self.y = 0
+
+    def _encabezado(self):
+        p = self.p
+        self.pagina += 1
+        y = ALTO_PAGINA - MARGEN
+        if self.pagina == 1:
+            p.setFont("Helvetica-Bold", 16)
+            p.drawString(MARGEN, y, "Reporte de Calificaciones Tributarias")
+            p.setFont("Helvetica", 12)
+            p.drawString(MARGEN, y - 20, f"Emisor: {self.emisor.nombre}")
+            p.drawString(MARGEN, y - 35, f"RUT: {self.emisor.rut}")
+            y -= 70
+        p.setFont("Helvetica-Bold", 11)
+        for titulo, _, x, ancho, alineacion in COLUMNAS_REPORTE:
+            titulo, medida = _ajustar(titulo, ancho, "Helvetica-Bold", 11)
+            p.drawString(x + ancho - medida if alineacion == "der" else x, y, titulo)
+        p.line(MARGEN, y - 5, ANCHO_PAGINA - MARGEN, y - 5)
+        p.setFont("Helvetica", 8)
+        p.drawString(MARGEN, MARGEN - 20, f"{self.emisor.nombre} · Página {self.pagina}")
+        # Un solo objeto de texto por página: evita abrir/cerrar un bloque BT/ET por celda
+        self.texto = p.beginText()
+        self.texto.setFont("Helvetica", TAMANO_FUENTE)
+        self.y = y - ALTO_FILA - 4
+
+    def _cerrar_pagina(self):
+        self.p.drawText(self.texto)
+        self.p.showPage()
+
+    def fila(self, valores):
+        if self.texto is None:
+            self._encabezado()
+        elif self.y < MARGEN:
+            self._cerrar_pagina()
+            self._encabezado()
+        texto = self.texto
+        for (_, campo, x, ancho, alineacion), valor in zip(COLUMNAS_REPORTE, valores):
+            contenido, medida = _ajustar(_texto_celda(campo, valor), ancho, "Helvetica", TAMANO_FUENTE)
+            if alineacion == "der":
+                x += ancho - medida
+            texto.setTextOrigin(x, self.y)
+            texto.textOut(contenido)
+        self.y -= ALTO_FILA
+
+    def terminar(self, filas):
+        if self.texto is None:
+            self._encabezado()
+        if not filas:
+            self.texto.setFont("Helvetica-Bold", 14)
+            self.texto.setTextOrigin(MARGEN, self.y)
+            self.texto.textOut("Sin Calificaciones")
+        self._cerrar_pagina()
+        self.p.save()
+
+
+def generar_pdf_calificaciones(emisor, salida, filas=None):
+    """
+    Dibuja el reporte de calificaciones vigentes de ``emisor`` en ``salida``
+    (archivo o buffer). ``filas`` permite pasar las filas ya leídas (por defecto
+    ``filas_reporte``). Devuelve la cantidad de filas dibujadas.
+    """
+    p = canvas.Canvas(salida, pagesize=letter)
+    p.setTitle(f"Reporte Calificaciones - {emisor.nombre}")
+    tabla = _TablaPDF(p, emisor)
+    total = 0
+    for valores in filas_reporte(emisor.pk) if filas is None else filas:
+        tabla.fila(valores)
+        total += 1
+    tabla.terminar(total)
+    return total
+
+
+def _limpiar_versiones(directorio, vigente):
+    for nombre in os.listdir(directorio):
+        if nombre.endswith(".pdf") and nombre != os.path.basename(vigente):
+            try:
+                os.remove(os.path.join(directorio, nombre))
+            except OSError:
+                pass
+
+
+def _pdf_en_memoria(emisor):
+    buffer = io.BytesIO()
+    generar_pdf_calificaciones(emisor, buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def _escribir_reporte(emisor, version):
+    ruta = ruta_reporte(emisor.pk, version)
+    directorio = os.path.dirname(ruta)
+    os.makedirs(directorio, exist_ok=True)
+    buffer = _pdf_en_memoria(emisor)
+    # Escritura atómica: otro worker puede estar sirviendo o generando el mismo archivo
+    fd, temporal = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(buffer.getvalue())
+    os.replace(temporal, ruta)
+    _limpiar_versiones(directorio, ruta)
+    return ruta
+
+
+def _registrar_reporte(tipo, formato, usuario, party_id=None, **parametros):
+    try:
+        Reporte.objects.create(
+            tipo=tipo,
+            formato=formato,
+            usuario=usuario if getattr(usuario, "is_authenticated", False) else None,
+            party_id=party_id,
+            parametros=json.dumps(parametros),
+        )
+    except Exception as exc:
+        logger.warning("No se pudo registrar el reporte %s: %s", tipo, exc)
+
+
+def obtener_reporte(emisor, version, usuario=None):
+    """
+    Devuelve la ruta del PDF de ``emisor`` para ``version``, generándolo (y
+    registrándolo en ``Reporte``) solo si no está en disco. Las versiones
+    anteriores del mismo emisor se eliminan.
+    """
+    ruta = ruta_reporte(emisor.pk, version)
+    if os.path.exists(ruta):
+        return ruta
+    ruta = _escribir_reporte(emisor, version)
+    _registrar_reporte(
+        TIPO_REPORTE,
+        "PDF",
+        usuario,
+        party_id=emisor.pk,
+        id_emisor=emisor.pk,
+        version=version,
+        ruta=os.path.relpath(ruta, settings.MEDIA_ROOT),
+    )
+    return ruta
+
+
+def abrir_reporte(ruta, id_emisor):
+    """
+    Abre el PDF en ``ruta`` para enviarlo. Si entre medio otro worker generó una
+    versión más nueva y borró esta (``_limpiar_versiones``), el reporte se
+    genera en memoria en vez de fallar; no se escribe para no borrar la nueva.
+    """
+    try:
+        return open(ruta, "rb")
+    except FileNotFoundError:
+        logger.info("El reporte %s desapareció antes de enviarlo; se genera en memoria", ruta)
+        return _pdf_en_memoria(Emisor.objects.get(pk=id_emisor))
+
+
+def _iniciar_proceso():
+    # Con "spawn" el proceso hijo arranca sin Django configurado; las conexiones
+    # a BD se abren en el hijo al primer uso y se mantienen entre tareas
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def _generar_en_worker(id_emisor, version):
+    """Tarea del pool: genera el PDF de un emisor con la conexión a BD del proceso hijo."""
+    # Descarta la conexión si quedó inservible o superó CONN_MAX_AGE desde la tarea anterior
+    close_old_connections()
+    try:
+        return _escribir_reporte(Emisor.objects.get(pk=id_emisor), version)
+    finally:
+        close_old_connections()
+
+
+def _workers_lote():
+    return getattr(settings, "REPORTES_WORKERS", None) or min(4, os.cpu_count() or 1)
+
+
+_pool = {"pid": None, "instancia": None}
+_pool_lock = threading.Lock()
+
+
+def _pool_reportes():
+    """Pool de procesos compartido, creado al primer uso en cada proceso servidor."""
+    with _pool_lock:
+        if _pool["pid"] != os.getpid() or _pool["instancia"] is None:
+            _pool.update(
+                pid=os.getpid(),
+                instancia=ProcessPoolExecutor(
+                    max_workers=_workers_lote(),
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_iniciar_proceso,
+                ),
+            )
+        return _pool["instancia"]
+
+
+def _descartar_pool(pool):
+    # Un hijo murió (p. ej. por OOM): el pool queda inservible y se recrea en el próximo lote
+    with _pool_lock:
+        if _pool["instancia"] is pool:
+            _pool["instancia"] = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def generar_lote(ids_emisor, usuario=None, workers=None):
+    """
+    Genera los PDF de varios emisores en paralelo. Es un generador que entrega
+    ``(id_emisor, ruta, error)`` a medida que cada PDF está listo; los que ya
+    están en disco para su versión vigente salen primero, sin pasar por el pool,
+    y los emisores inexistentes salen con su error.
+
+    Los PDF se generan en el pool de procesos compartido (``_pool_reportes``);
+    ``workers`` limita cuántos de este lote se encolan a la vez. Si el lote se
+    abandona (cliente desconectado), se cancelan sus tareas aún no iniciadas.
+    """
+    versiones = versiones_reporte(ids_emisor)
+    pendientes = []
+    for id_emisor in ids_emisor:
+        if id_emisor not in versiones:
+            yield id_emisor, None, "Emisor no encontrado"
+            continue
+        emisor, version, _ = versiones[id_emisor]
+        ruta = ruta_reporte(id_emisor, version)
+        if os.path.exists(ruta):
+            yield id_emisor, ruta, None
+        else:
+            pendientes.append((id_emisor, version))
+    if not pendientes:
+        return
+
+    pool = _pool_reportes()
+    limite = workers or _workers_lote()
+    restantes = iter(pendientes)
+    futuros = {}
+    try:
+        while True:
+            for id_emisor, version in restantes:
+                futuros[pool.submit(_generar_en_worker, id_emisor, version)] = (id_emisor, version)
+                if len(futuros) >= limite:
+                    break
+            if not futuros:
+                break
+            listos, _ = wait(futuros, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                id_emisor, version = futuros.pop(futuro)
+                try:
+                    ruta = futuro.result()
+                except Exception as exc:
+                    if isinstance(exc, BrokenProcessPool):
+                        _descartar_pool(pool)
+                    logger.warning("No se pudo generar el reporte del emisor %s: %s", id_emisor, exc)
+                    yield id_emisor, None, str(exc)
+                    continue
+                _registrar_reporte(
+                    TIPO_REPORTE,
+                    "PDF",
+                    usuario,
+                    party_id=id_emisor,
+                    id_emisor=id_emisor,
+                    version=version,
+                    ruta=os.path.relpath(ruta, settings.MEDIA_ROOT),
+                )
+                yield id_emisor, ruta, None
+    finally:
+        for futuro in futuros:
+            futuro.cancel()
+
+
+class _SalidaZip:
+    """Destino no posicionable para ``ZipFile``: acumula bytes hasta que se retiran."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+def zip_lote(ids_emisor, usuario=None, workers=None):
+    """
+    Generador de bytes de un ZIP con un PDF por emisor, que se va enviando a
+    medida que cada PDF termina. Registra el lote en ``Reporte`` (formato ZIP);
+    los emisores que fallen se listan en ``errores.txt`` dentro del ZIP.
+    ``workers`` se pasa a ``generar_lote``.
+    """
+    salida = _SalidaZip()
+    errores = []
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for id_emisor, ruta, error in generar_lote(ids_emisor, usuario, workers):
+            if error:
+                errores.append(f"Emisor {id_emisor}: {error}")
+                continue
+            with abrir_reporte(ruta, id_emisor) as origen, zf.open(f"reporte_{id_emisor}.pdf", "w") as destino:
+                shutil.copyfileobj(origen, destino)
+            yield salida.retirar()
+        if errores:
+            zf.writestr("errores.txt", "\n".join(errores) + "\n")
+    yield salida.retirar()
+    _registrar_reporte(TIPO_LOTE, "ZIP", usuario, ids_emisor=list(ids_emisor), errores=len(errores))
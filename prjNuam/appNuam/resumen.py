@@ -0,0 +1,110 @@
+"""
+Conteos de calificaciones para los dashboards.
+
+``conteo_calificaciones`` resuelve todos los contadores de un dashboard en una
+sola consulta: sobre la tabla materializada ``calificaciones_resumen`` si
+``CALIFICACIONES_RESUMEN`` está activo, o con un agregado condicional sobre
+``calificaciones_tributarias`` en caso contrario.
+
+La tabla materializada se mantiene de forma incremental: las altas, cambios y
+bajas individuales vía señales, y las escrituras por lote (``bulk_create`` /
+``bulk_update``) llamando explícitamente a ``registrar_altas`` / ``registrar_cambios``.
+"""
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import CalificacionTributaria, ResumenCalificaciones
+
+
+# Estados que aceptan el enum de BD (pendiente, terminada, rechazada)
+ESTADOS = ("pendiente", "terminada", "rechazada")
+
+
+def resumen_activo():
+    return getattr(settings, "CALIFICACIONES_RESUMEN", False)
+
+
+def conteo_calificaciones(emisores_ids=None):
+    """
+    Devuelve ``{"total", "pendiente", "terminada", "rechazada"}`` en una consulta.
+    ``emisores_ids`` restringe el conteo a esos emisores (``None`` = todos).
+    """
+    if resumen_activo():
+        qs, agregado = ResumenCalificaciones.objects.all(), lambda **f: Sum("total", **f)
+    else:
+        qs, agregado = CalificacionTributaria.objects.all(), lambda **f: Count("id", **f)
+    if emisores_ids is not None:
+        qs = qs.filter(emisor_id__in=emisores_ids)
+    # Alias con prefijo para no chocar con la columna "total" de la tabla resumen
+    agregados = {"n_total": agregado()}
+    agregados.update({f"n_{estado}": agregado(filter=Q(estado_proceso=estado)) for estado in ESTADOS})
+    return {clave[2:]: valor or 0 for clave, valor in qs.aggregate(**agregados).items()}
+
+
+def aplicar_deltas(deltas):
+    """
+    Suma ``deltas`` ({(emisor_id, estado_proceso, anio): n}) a la tabla resumen.
+    UPDATE atómico (total = total + n) y, si la fila no existe, INSERT.
+    Las filas se recorren en orden de clave: dos lotes concurrentes bloquean las
+    mismas filas en el mismo orden y no pueden caer en un deadlock.
+    """
+    if not resumen_activo():
+        return
+    pendientes = [
+        (clave, delta) for clave, delta in deltas.items() if delta and clave[0] is not None and clave[2] is not None
+    ]
+    pendientes.sort(key=lambda par: (par[0][0], par[0][1] or "", par[0][2]))
+    for (emisor_id, estado, anio), delta in pendientes:
+        filtro = {"emisor_id": emisor_id, "estado_proceso": estado, "anio": anio}
+        if ResumenCalificaciones.objects.filter(**filtro).update(total=F("total") + delta):
+            continue
+        try:
+            with transaction.atomic():
+                ResumenCalificaciones.objects.create(total=delta, **filtro)
+        except IntegrityError:
+            # Otro proceso creó la fila entre el UPDATE y el INSERT
+            ResumenCalificaciones.objects.filter(**filtro).update(total=F("total") + delta)
+
+
+def registrar_altas(califs):
+    """Contabiliza calificaciones recién creadas con ``bulk_create``."""
+    aplicar_deltas(Counter(c.clave_resumen for c in califs))
+
+
+def registrar_cambios(califs):
+    """
+    Contabiliza calificaciones actualizadas con ``bulk_update``. Requiere que las
+    instancias se hayan leído de BD (``_clave_resumen_original``).
+    """
+    deltas = Counter()
+    for calif in califs:
+        original = getattr(calif, "_clave_resumen_original", None)
+        if original is not None and original != calif.clave_resumen:
+            deltas[original] -= 1
+            deltas[calif.clave_resumen] += 1
+        calif._clave_resumen_original = calif.clave_resumen
+    aplicar_deltas(deltas)
+
+
+def reconstruir():
+    """Recalcula la tabla resumen completa a partir de calificaciones_tributarias."""
+    filas = (
+        CalificacionTributaria.objects.values("emisor_id", "estado_proceso", "anio")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    with transaction.atomic():
+        ResumenCalificaciones.objects.all().delete()
+        ResumenCalificaciones.objects.bulk_create(
+            [
+                ResumenCalificaciones(
+                    emisor_id=f["emisor_id"], estado_proceso=f["estado_proceso"], anio=f["anio"], total=f["n"]
+                )
+                for f in filas
+            ],
+            batch_size=1000,
+        )
@@ -1,10 +1,20 @@
+import copy
+
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.utils import timezone
 from rest_framework import serializers
 
-from .models import CalificacionTributaria
+from .models import CalificacionTributaria, HistorialAccion
 
 
 class CalificacionTributariaSerializer(serializers.ModelSerializer):
+    # Nombres legibles; la vista hace select_related para que no generen consultas extra
+    emisor_nombre = serializers.CharField(source="emisor.nombre", read_only=True)
+    instrumento_nombre = serializers.CharField(source="instrumento.nombre", read_only=True, default=None)
+    contador_nombre = serializers.CharField(
+        source="contador_responsable.nombre_completo", read_only=True, default=None
+    )
+
     class Meta:
         model = CalificacionTributaria
         fields = "__all__"
@@ -18,6 +28,59 @@ class CalificacionTributariaSerializer(serializers.ModelSerializer):
         return value
 
 
+class HistorialAccionSerializer(serializers.ModelSerializer):
+    # La vista hace select_related("usuario")
+    usuario_username = serializers.CharField(source="usuario.username", read_only=True, default=None)
+
+    class Meta:
+        model = HistorialAccion
+        fields = ["id", "calificacion", "usuario", "usuario_username", "accion", "detalle", "created_at"]
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resuelve la FK desde ``context["fk_cache"][Modelo]`` (dict pk -> objeto) si existe,
+    evitando un ``SELECT`` por ítem al validar lotes.
+    """
+
+    def to_internal_value(self, data):
+        cache = self.context.get("fk_cache", {}).get(self.get_queryset().model)
+        if cache is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            obj = cache.get(int(data))
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if obj is None:
+            self.fail("does_not_exist", pk_value=data)
+        return obj
+
+
+class CalificacionTributariaBulkSerializer(CalificacionTributariaSerializer):
+    """
+    Variante para altas/actualizaciones por lote: FKs desde cache y reglas de
+    ``CalificacionTributaria.clean()``. La unicidad se verifica para todo el lote
+    en la vista, por eso no se usan los validadores por ítem.
+    """
+
+    serializer_related_field = CachedPrimaryKeyRelatedField
+
+    def get_validators(self):
+        return []
+
+    def validate(self, attrs):
+        calif = copy.copy(self.instance) if self.instance is not None else CalificacionTributaria()
+        for campo, valor in attrs.items():
+            setattr(calif, campo, valor)
+        try:
+            calif.clean()
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
+        return attrs
+
+
 class CreateUsuarioSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     role = serializers.ChoiceField(choices=["accionista", "inversionista"], write_only=True)
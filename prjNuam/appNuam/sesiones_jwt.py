@@ -0,0 +1,236 @@
+"""
+Autenticación JWT para la API REST sobre la tabla ``sesiones``.
+
+Cada inicio de sesión por API crea una fila ``Sesion`` (``jwt_id``,
+``emitido_at``, ``expira_at``) y entrega dos tokens HS256 firmados con
+``JWT_SECRET``:
+  - access: corto (``JWT_ACCESS_TTL``); lleva id, username y nombres de rol,
+    así que autenticar un request no consulta la BD ni el usuario ni sus roles.
+  - refresh: dura lo que la sesión (``JWT_REFRESH_TTL``); con él se piden
+    nuevos access tokens y ahí sí se valida contra BD (sesión vigente, usuario
+    activo, roles actuales).
+
+Revocar una sesión adelanta su ``expira_at``. La lista de revocadas son las
+sesiones emitidas dentro de ``JWT_REFRESH_TTL`` que ya expiraron (las más
+antiguas ya no tienen tokens válidos); se guarda en memoria del proceso y se
+recarga cuando cambia la versión en el cache compartido o cada
+``JWT_REVOCADAS_TTL`` segundos.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from .models import Sesion, Usuario
+from .permissions import db_role_names
+
+
+VERSION_REVOCADAS_KEY = "jwt:revocadas:version"
+
+_ENCABEZADO = {"alg": "HS256", "typ": "JWT"}
+
+_revocadas = {"ids": frozenset(), "version": None, "cargadas": 0.0}
+_revocadas_lock = threading.Lock()
+
+
+class TokenInvalido(Exception):
+    pass
+
+
+def _ttl_access():
+    return getattr(settings, "JWT_ACCESS_TTL", 300)
+
+
+def _ttl_refresh():
+    return getattr(settings, "JWT_REFRESH_TTL", 7 * 24 * 3600)
+
+
+def _secreto():
+    return (getattr(settings, "JWT_SECRET", "") or settings.SECRET_KEY).encode("utf-8")
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64_decodificar(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _json(datos):
+    return _b64(json.dumps(datos, separators=(",", ":")).encode("utf-8"))
+
+
+def _firma(contenido):
+    return _b64(hmac.new(_secreto(), contenido.encode("ascii"), hashlib.sha256).digest())
+
+
+def codificar(payload):
+    contenido = f"{_json(_ENCABEZADO)}.{_json(payload)}"
+    return f"{contenido}.{_firma(contenido)}"
+
+
+def decodificar(token, tipo):
+    """Valida firma, expiración y tipo (``access``/``refresh``) y devuelve el payload."""
+    try:
+        encabezado, cuerpo, firma = token.split(".")
+        contenido = f"{encabezado}.{cuerpo}"
+        if not hmac.compare_digest(firma, _firma(contenido)):
+            raise TokenInvalido("Firma inválida.")
+        if json.loads(_b64_decodificar(encabezado)).get("alg") != "HS256":
+            raise TokenInvalido("Algoritmo no soportado.")
+        payload = json.loads(_b64_decodificar(cuerpo))
+    except TokenInvalido:
+        raise
+    except (ValueError, TypeError, UnicodeError) as exc:
+        raise TokenInvalido("Token mal formado.") from exc
+    if payload.get("typ") != tipo:
+        raise TokenInvalido("Tipo de token incorrecto.")
+    if not isinstance(payload.get("exp"), int) or payload["exp"] <= time.time():
+        raise TokenInvalido("Token expirado.")
+    return payload
+
+
+def _access(usuario_id, username, roles, sid, expira):
+    ahora = int(time.time())
+    return codificar(
+        {
+            "typ": "access",
+            "sub": str(usuario_id),
+            "usr": username,
+            "roles": sorted(roles),
+            "sid": sid,
+            "iat": ahora,
+            "exp": min(ahora + _ttl_access(), expira),
+        }
+    )
+
+
+def emitir_sesion(usuario):
+    """Crea la fila ``Sesion`` y devuelve el par access/refresh para ``usuario``."""
+    ahora = timezone.now()
+    sesion = Sesion.objects.create(
+        usuario=usuario,
+        jwt_id=uuid.uuid4().hex,
+        emitido_at=ahora,
+        expira_at=ahora + timedelta(seconds=_ttl_refresh()),
+    )
+    expira = int(sesion.expira_at.timestamp())
+    refresh = codificar(
+        {"typ": "refresh", "sub": str(usuario.pk), "sid": sesion.jwt_id, "iat": int(ahora.timestamp()), "exp": expira}
+    )
+    return {
+        "access": _access(usuario.pk, usuario.username, db_role_names(usuario), sesion.jwt_id, expira),
+        "refresh": refresh,
+        "token_type": "Bearer",
+        "expira_en": _ttl_access(),
+    }
+
+
+def refrescar(refresh):
+    """Nuevo access token a partir de un refresh token de una sesión vigente."""
+    payload = decodificar(refresh, "refresh")
+    sesion = (
+        Sesion.objects.select_related("usuario")
+        .filter(jwt_id=payload["sid"], expira_at__gt=timezone.now())
+        .first()
+    )
+    if sesion is None or str(sesion.usuario_id) != payload.get("sub"):
+        raise TokenInvalido("Sesión revocada o expirada.")
+    usuario = sesion.usuario
+    if usuario.estado != "activo":
+        raise TokenInvalido("Usuario no activo.")
+    return {
+        "access": _access(
+            usuario.pk, usuario.username, db_role_names(usuario), sesion.jwt_id, int(sesion.expira_at.timestamp())
+        ),
+        "token_type": "Bearer",
+        "expira_en": _ttl_access(),
+    }
+
+
+def _publicar_revocacion():
+    cache.set(VERSION_REVOCADAS_KEY, uuid.uuid4().hex, None)
+
+
+def revocar(sid):
+    """Cierra la sesión ``sid``; sus access tokens dejan de aceptarse en todos los procesos."""
+    revocadas = Sesion.objects.filter(jwt_id=sid, expira_at__gt=timezone.now()).update(expira_at=timezone.now())
+    if revocadas:
+        _publicar_revocacion()
+    return revocadas
+
+
+def revocar_usuario(usuario_id):
+    """Cierra todas las sesiones vigentes del usuario (p. ej. al bloquear la cuenta)."""
+    revocadas = Sesion.objects.filter(usuario_id=usuario_id, expira_at__gt=timezone.now()).update(
+        expira_at=timezone.now()
+    )
+    if revocadas:
+        _publicar_revocacion()
+    return revocadas
+
+
+def sesiones_revocadas():
+    """``jwt_id`` de las sesiones cerradas cuyos tokens aún podrían circular."""
+    version = cache.get(VERSION_REVOCADAS_KEY)
+    ahora = time.monotonic()
+    if version == _revocadas["version"] and ahora - _revocadas["cargadas"] < getattr(settings, "JWT_REVOCADAS_TTL", 60):
+        return _revocadas["ids"]
+    with _revocadas_lock:
+        if version != _revocadas["version"] or ahora - _revocadas["cargadas"] >= getattr(
+            settings, "JWT_REVOCADAS_TTL", 60
+        ):
+            limite = timezone.now()
+            ids = Sesion.objects.filter(
+                emitido_at__gte=limite - timedelta(seconds=_ttl_refresh()), expira_at__lte=limite
+            ).values_list("jwt_id", flat=True)
+            _revocadas.update(ids=frozenset(ids), version=version, cargadas=ahora)
+    return _revocadas["ids"]
+
+
+def usuario_desde_token(payload):
+    """
+    ``Usuario`` armado con los datos del token, sin consultar la BD. El resto de
+    los campos quedan diferidos (se cargan solo si una vista los lee).
+    """
+    usuario = Usuario.from_db(
+        DEFAULT_DB_ALIAS, ["id", "username", "estado"], [int(payload["sub"]), payload.get("usr", ""), "activo"]
+    )
+    usuario._role_names_cache = list(payload.get("roles", []))
+    return usuario
+
+
+class JWTAuthentication(BaseAuthentication):
+    """``Authorization: Bearer <access>``; ``request.auth`` queda con el payload del token."""
+
+    keyword = b"bearer"
+
+    def authenticate(self, request):
+        partes = get_authorization_header(request).split()
+        if not partes or partes[0].lower() != self.keyword:
+            return None
+        if len(partes) != 2:
+            raise AuthenticationFailed("Cabecera Authorization inválida.")
+        try:
+            payload = decodificar(partes[1].decode("ascii"), "access")
+        except (TokenInvalido, UnicodeError) as exc:
+            raise AuthenticationFailed(str(exc)) from exc
+        if payload.get("sid") in sesiones_revocadas():
+            raise AuthenticationFailed("Sesión revocada.")
+        return usuario_desde_token(payload), payload
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
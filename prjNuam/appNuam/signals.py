@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CalificacionTributaria, Usuario, UsuarioRol
+from .passwords import invalidar_usuarios_demo
+from .permissions import invalidate_role_cache
+from .resumen import aplicar_deltas, registrar_cambios
+
+
+@receiver(post_save, sender=UsuarioRol)
+@receiver(post_delete, sender=UsuarioRol)
+def invalidar_roles_usuario(sender, instance, **kwargs):
+    """Mantiene coherente el cache de roles cuando se asigna o quita un rol."""
+    invalidate_role_cache(instance.usuario_id)
+    invalidar_usuarios_demo()
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_usuarios_demo_login(sender, **kwargs):
+    """La lista de credenciales de prueba del login muestra usuarios, estados y roles."""
+    invalidar_usuarios_demo()
+
+
+@receiver(post_save, sender=CalificacionTributaria)
+def actualizar_resumen_guardado(sender, instance, created, **kwargs):
+    """Ajusta calificaciones_resumen al crear o modificar una calificación."""
+    if created:
+        aplicar_deltas({instance.clave_resumen: 1})
+        instance._clave_resumen_original = instance.clave_resumen
+    else:
+        registrar_cambios([instance])
+
+
+@receiver(post_delete, sender=CalificacionTributaria)
+def actualizar_resumen_borrado(sender, instance, **kwargs):
+    clave = getattr(instance, "_clave_resumen_original", None) or instance.clave_resumen
+    aplicar_deltas({clave: -1})
@@ -0,0 +1,20 @@
+-- Contadores materializados de calificaciones por (emisor, estado_proceso, año).
+-- Modelo: appNuam.models.ResumenCalificaciones (managed = False).
+-- La aplicación los mantiene de forma incremental; para recalcularlos desde cero:
+--   python manage.py recalcular_resumen
+
+CREATE TABLE IF NOT EXISTS calificaciones_resumen (
+    id_resumen      SERIAL PRIMARY KEY,
+    id_emisor       INTEGER NOT NULL REFERENCES emisores (id_emisor) ON DELETE CASCADE,
+    estado_proceso  VARCHAR(12) NOT NULL,
+    anio            INTEGER NOT NULL,
+    total           INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT uq_calificaciones_resumen UNIQUE (id_emisor, estado_proceso, anio)
+);
+
+-- Carga inicial (idempotente)
+INSERT INTO calificaciones_resumen (id_emisor, estado_proceso, anio, total)
+SELECT id_emisor, estado_proceso::text, anio, COUNT(*)
+FROM calificaciones_tributarias
+GROUP BY id_emisor, estado_proceso, anio
+ON CONFLICT (id_emisor, estado_proceso, anio) DO UPDATE SET total = EXCLUDED.total;
@@ -0,0 +1,11 @@
+-- Latido de las cargas masivas en proceso.
+-- Modelo: appNuam.models.ArchivoCarga (managed = False), campo fecha_latido.
+-- El worker lo actualiza al reclamar la carga y tras cada lote; procesar_cargas devuelve a
+-- 'pendiente' las cargas 'procesando' sin latido en CARGAS_TIMEOUT segundos (worker caído).
+
+ALTER TABLE cargas_masivas
+    ADD COLUMN IF NOT EXISTS fecha_latido TIMESTAMP WITH TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS ix_cargas_masivas_procesando
+    ON cargas_masivas (fecha_latido)
+    WHERE estado = 'procesando';
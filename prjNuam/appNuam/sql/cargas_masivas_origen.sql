@@ -0,0 +1,25 @@
+-- Archivo subido que origina cada carga masiva y emisor para el que se autorizó.
+-- Modelo: appNuam.models.ArchivoCarga (managed = False), campos archivo_fuente y emisor.
+-- id_archivo_normalizado se reserva para el archivo normalizado; las cargas encoladas
+-- desde la web (appNuam.cargas.encolar_carga) apuntan a su ArchivoFuente en esta columna.
+
+ALTER TABLE cargas_masivas
+    ADD COLUMN IF NOT EXISTS id_archivo_fuente INTEGER
+        REFERENCES archivos_fuente (id_archivo_fuente) ON DELETE SET NULL;
+
+-- El motor de carga rechaza las filas de otro emisor (NULL = sin restricción, p. ej. cargar_calificaciones)
+ALTER TABLE cargas_masivas
+    ADD COLUMN IF NOT EXISTS id_emisor INTEGER
+        REFERENCES emisores (id_emisor) ON DELETE SET NULL;
+
+-- Cargas encoladas antes de esta columna guardaban el id del archivo fuente en id_archivo_normalizado
+UPDATE cargas_masivas AS c
+SET id_archivo_fuente = c.id_archivo_normalizado,
+    id_archivo_normalizado = NULL
+WHERE c.id_archivo_fuente IS NULL
+  AND c.id_archivo_normalizado IS NOT NULL
+  AND EXISTS (SELECT 1 FROM archivos_fuente f WHERE f.id_archivo_fuente = c.id_archivo_normalizado);
+
+-- Búsqueda de la carga previa de un archivo con el mismo contenido (carga_previa)
+CREATE INDEX IF NOT EXISTS ix_cargas_masivas_archivo_fuente
+    ON cargas_masivas (id_archivo_fuente);
@@ -0,0 +1,20 @@
+-- Índices para el historial de auditoría (api/historial/, api/calificaciones/<id>/historial/).
+-- Modelo: appNuam.models.HistorialAccion (managed = False).
+-- El listado pagina por cursor con ORDER BY created_at DESC, id DESC; con estos
+-- índices cada página es un rango del índice, sin importar cuán atrás se esté:
+--   python manage.py medir_historial --calificacion <id>
+--
+-- CONCURRENTLY no bloquea escrituras pero no puede ir dentro de una transacción:
+--   psql -f appNuam/sql/historial_accion_indices.sql
+
+-- Historial de una calificación
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_historial_accion_calificacion_created
+    ON historial_accion (calificacion_id, created_at, id);
+
+-- Acciones de un usuario
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_historial_accion_usuario_created
+    ON historial_accion (usuario_id, created_at, id);
+
+-- Listado general y filtros solo por rango de fechas / acción
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_historial_accion_created
+    ON historial_accion (created_at, id);
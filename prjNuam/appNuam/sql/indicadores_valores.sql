@@ -0,0 +1,14 @@
+-- Serie histórica local de indicadores económicos (USD, UF, UTM...) por país.
+-- Modelo: appNuam.models.IndicadorValor (managed = False).
+-- Se llena de forma incremental con:
+--   python manage.py sincronizar_indicadores
+
+CREATE TABLE IF NOT EXISTS indicadores_valores (
+    id_indicador_valor  SERIAL PRIMARY KEY,
+    pais                VARCHAR(30) NOT NULL,
+    codigo              VARCHAR(20) NOT NULL,
+    fecha               DATE NOT NULL,
+    valor               NUMERIC(18, 6) NOT NULL,
+    -- El índice único cubre las consultas por rango: (pais, codigo, fecha BETWEEN ...)
+    CONSTRAINT uq_indicadores_valores UNIQUE (pais, codigo, fecha)
+);
@@ -0,0 +1,77 @@
+-- Índices para los filtros frecuentes de las vistas sobre las tablas no gestionadas por Django.
+-- Revisados contra las consultas de views.py, views_api.py, resumen.py, reportes.py, cargas.py,
+-- jobs.py y sesiones_jwt.py; para revisar una BD concreta:
+--   python manage.py sugerir_indices
+--
+-- Idempotente. CONCURRENTLY no bloquea escrituras pero no puede ir dentro de una transacción:
+--   psql -f appNuam/sql/indices_vistas.sql
+
+-- calificaciones_tributarias -----------------------------------------------------------------
+
+-- Conteos y pendientes por emisor y estado (dashboards, conteo_calificaciones)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_calificaciones_emisor_estado_proceso
+    ON calificaciones_tributarias (id_emisor, estado_proceso);
+
+-- Vigentes por emisor ordenadas por año: listado del contador, reportes PDF y
+-- verificación de duplicados (emisor, instrumento, año) de las cargas
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_calificaciones_emisor_vigentes
+    ON calificaciones_tributarias (id_emisor, anio, id_instrumento)
+    WHERE estado_registro = 'vigente';
+
+-- Filtros de la API y listados por año / estado de registro sin emisor
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_calificaciones_anio
+    ON calificaciones_tributarias (anio);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_calificaciones_estado_registro_anio
+    ON calificaciones_tributarias (estado_registro, anio);
+
+-- FKs con ON DELETE SET NULL (sin índice cada borrado recorre la tabla)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_calificaciones_instrumento
+    ON calificaciones_tributarias (id_instrumento);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_calificaciones_contador_responsable
+    ON calificaciones_tributarias (id_contador_responsable);
+
+-- Asignaciones emisor-contador / emisor-usuario -------------------------------------------------
+-- Las restricciones únicas empiezan por id_emisor; estas cubren la búsqueda inversa
+-- (emisores del contador / del representante que inició sesión).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_emisores_contadores_contador
+    ON emisores_contadores (id_contador);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_emisor_usuario_usuario
+    ON emisor_usuario (id_usuario);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_contadores_usuario
+    ON contadores (id_usuario);
+
+-- Catálogos --------------------------------------------------------------------------------------
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_instrumentos_emisor_nombre
+    ON instrumentos (id_emisor, nombre);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_emisores_estado_nombre
+    ON emisores (estado, nombre);
+
+-- documentos -------------------------------------------------------------------------------------
+-- Igualdad por tipo y últimos documentos (dashboard del inversionista: ORDER BY fecha_creacion DESC LIMIT 5)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documentos_tipo_fecha
+    ON documentos (tipo_documento, fecha_creacion);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documentos_fecha
+    ON documentos (fecha_creacion);
+-- tipo_documento__icontains ('%reporte%') no puede usar un B-tree; si el volumen lo
+-- justifica, con la extensión pg_trgm disponible:
+--   CREATE EXTENSION IF NOT EXISTS pg_trgm;
+--   CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documentos_tipo_trgm
+--       ON documentos USING gin (tipo_documento gin_trgm_ops);
+
+-- Cargas masivas ---------------------------------------------------------------------------------
+-- Cola de procesar_cargas: WHERE estado = 'pendiente' ORDER BY id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_cargas_masivas_pendientes
+    ON cargas_masivas (id_carga)
+    WHERE estado = 'pendiente';
+-- El índice por archivo fuente (carga previa del mismo contenido) está en cargas_masivas_origen.sql
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_archivos_fuente_ruta
+    ON archivos_fuente (ruta_archivo);
+
+-- Sesiones JWT -----------------------------------------------------------------------------------
+-- Refresh por jwt_id, lista de revocadas por rango de emisión y revocación por usuario
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_sesiones_jwt_id
+    ON sesiones (jwt_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sesiones_emitido
+    ON sesiones (emitido_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sesiones_usuario
+    ON sesiones (usuario_id);
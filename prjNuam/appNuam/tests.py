@@ -1,3 +1,1173 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import hashers
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.auth.signals import user_logged_in
+from django.db import connection, connections, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from requests import exceptions as req_exceptions
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import auditoria, circuitos, indicadores, reportes, uploads
+from .cargas import procesar_carga, procesar_carga_pendiente
+from .checks import revisar_cache_roles
+from .intentos_login import ip_cliente
+from .jobs import reclamar_carga, reencolar_colgadas
+from .pagination import _codificar_cursor, pagina_por_clave
+from .permissions import db_role_names
+from .presupuesto_consultas import PresupuestoExcedido, presupuesto_consultas
+from .management.commands.sugerir_indices import Command as SugerirIndices
+from .sesiones_jwt import JWTAuthentication, TokenInvalido, emitir_sesion, refrescar, revocar, revocar_usuario
+from .resumen import aplicar_deltas
+from .models import (
+    ArchivoCarga,
+    CalificacionTributaria,
+    Contador,
+    Emisor,
+    EmisorContador,
+    EmisorUsuario,
+    HistorialAccion,
+    IndicadorValor,
+    Instrumento,
+    ResumenCalificaciones,
+    Rol,
+    Usuario,
+    UsuarioRol,
+)
+
+BACKEND = "appNuam.auth_backends.SHA256Backend"
+
+
+class NuamTestRunner(DiscoverRunner):
+    """
+    Las tablas de los modelos ``managed = False`` las crea el SQL del proyecto, no las
+    migraciones; en la BD de tests se crean a partir de los modelos.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Usuario.last_login es de solo lectura; LoginView ya ignora el error, Client.force_login no
+        user_logged_in.disconnect(dispatch_uid="update_last_login")
+
+    def setup_databases(self, **kwargs):
+        config = super().setup_databases(**kwargs)
+        for alias in connections:
+            connection = connections[alias]
+            existentes = set(connection.introspection.table_names())
+            with connection.schema_editor() as editor:
+                for model in apps.get_app_config("appNuam").get_models():
+                    if not model._meta.managed and model._meta.db_table not in existentes:
+                        editor.create_model(model)
+        return config
+
+
+def crear_usuario(username, *roles):
+    usuario = Usuario.objects.create(username=username, email=f"{username}@nuam.test", password_hash="")
+    for nombre in roles:
+        UsuarioRol.objects.create(usuario=usuario, rol=Rol.objects.get_or_create(nombre=nombre)[0])
+    return usuario
+
+
+def crear_contador(username, *emisores):
+    usuario = crear_usuario(username, "CONTADOR")
+    contador = Contador.objects.create(nombre_completo=username, usuario=usuario)
+    for emisor in emisores:
+        EmisorContador.objects.create(emisor=emisor, contador=contador)
+    return usuario
+
+
+class ArchivoTemporalMixin:
+    def setUp(self):
+        super().setUp()
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.directorio)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def archivo(self, nombre, contenido):
+        ruta = os.path.join(self.directorio, nombre)
+        with open(ruta, "w", encoding="utf-8") as fh:
+            fh.write(contenido)
+        return ruta
+
+
+class CargaMasivaTests(ArchivoTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.emisor = Emisor.objects.create(nombre="Emisor Uno", rut="76.111.111-1")
+        self.instrumentos = [
+            Instrumento.objects.create(emisor=self.emisor, nombre=f"Bono {i}", codigo_interno=f"B{i}")
+            for i in range(3)
+        ]
+
+    def test_procesa_en_lotes_y_registra_detalle_por_fila(self):
+        ruta = self.archivo(
+            "carga.csv",
+            "rut_emisor;codigo_instrumento;anio;monto;factor\n"
+            "76.111.111-1;B0;2024;1.000,50;0,5\n"
+            "76.111.111-1;B1;2024;200;\n"
+            "76.111.111-1;B0;2024;300;\n"  # duplicada dentro del mismo archivo
+            "99.999.999-9;B2;2024;100;\n"  # emisor inexistente
+            "76.111.111-1;B2;1999;100;\n"  # año fuera de rango
+            "76.111.111-1;B2;2024;abc;\n",
+        )
+        carga = ArchivoCarga.objects.create(estado="procesando")
+
+        procesar_carga(carga, ruta, chunk_size=2)
+
+        carga.refresh_from_db()
+        self.assertEqual(carga.estado, "completada_con_errores")
+        self.assertEqual((carga.total_filas, carga.filas_ok, carga.filas_error), (6, 2, 4))
+        calif = CalificacionTributaria.objects.get(instrumento=self.instrumentos[0])
+        self.assertEqual(str(calif.monto), "1000.50")
+        self.assertEqual(calif.origen, "carga_masiva")
+        detalles = {d.fila_numero: d for d in carga.detalles.all()}
+        self.assertEqual(sorted(detalles), [2, 3, 4, 5, 6, 7])
+        self.assertEqual(detalles[2].calificacion_afectada_id, calif.pk)
+        self.assertIn("Ya existe", detalles[4].mensaje_error)
+        self.assertIn("Emisor no encontrado", detalles[5].mensaje_error)
+        self.assertIn("no es un número", detalles[7].mensaje_error)
+
+    def test_rechaza_duplicados_de_calificaciones_vigentes_en_bd(self):
+        CalificacionTributaria.objects.create(emisor=self.emisor, instrumento=self.instrumentos[0], anio=2024, monto=1)
+        ruta = self.archivo(
+            "carga.csv", f"emisor_id,instrumento_id,anio,monto\n{self.emisor.pk},{self.instrumentos[0].pk},2024,5\n"
+        )
+        carga = ArchivoCarga.objects.create(estado="procesando")
+
+        procesar_carga(carga, ruta)
+
+        carga.refresh_from_db()
+        self.assertEqual((carga.filas_ok, carga.filas_error), (0, 1))
+        self.assertEqual(CalificacionTributaria.objects.count(), 1)
+
+    def test_carga_reencolada_continua_tras_la_ultima_fila_registrada(self):
+        ruta = self.archivo(
+            "carga.csv",
+            "rut_emisor,codigo_instrumento,anio,monto\n"
+            + "".join(f"76.111.111-1,B{i},2024,{i + 1}\n" for i in range(3)),
+        )
+        carga = ArchivoCarga.objects.create(estado="procesando")
+        procesar_carga(carga, ruta, chunk_size=2)
+        # Simula un worker que cayó tras confirmar el primer lote
+        carga.detalles.filter(fila_numero=4).delete()
+        CalificacionTributaria.objects.filter(instrumento=self.instrumentos[2]).delete()
+        ArchivoCarga.objects.filter(pk=carga.pk).update(
+            estado="procesando", fecha_latido=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertEqual(reencolar_colgadas(timeout=60), 1)
+        self.assertTrue(reclamar_carga(carga.pk))
+        procesar_carga(ArchivoCarga.objects.get(pk=carga.pk), ruta, chunk_size=2)
+
+        carga.refresh_from_db()
+        self.assertEqual((carga.estado, carga.total_filas, carga.filas_ok), ("completada", 3, 3))
+        self.assertEqual(CalificacionTributaria.objects.count(), 3)
+        self.assertEqual(carga.detalles.count(), 3)
+
+    def test_no_reencola_cargas_con_latido_reciente(self):
+        ArchivoCarga.objects.create(estado="procesando", fecha_latido=timezone.now())
+        self.assertEqual(reencolar_colgadas(timeout=60), 0)
+
+
+class SubidaPorPartesTests(ArchivoTemporalMixin, TestCase):
+    def test_reanuda_desde_el_offset_recibido_y_rechaza_offsets_desfasados(self):
+        fuente = uploads.iniciar_subida("datos.csv")
+
+        self.assertEqual(uploads.agregar_fragmento(fuente, 0, [b"abc"]), 3)
+        # Reintento del mismo fragmento (la respuesta anterior se perdió)
+        with self.assertRaises(uploads.OffsetInvalido) as ctx:
+            uploads.agregar_fragmento(fuente, 0, [b"abc"])
+        self.assertEqual(ctx.exception.esperado, 3)
+        self.assertEqual(uploads.offset_actual(fuente), 3)
+        self.assertEqual(uploads.agregar_fragmento(fuente, 3, [b"de", b"f"]), 6)
+
+        digest, original = uploads.finalizar_subida(fuente, sha256_esperado=hashlib.sha256(b"abcdef").hexdigest())
+
+        self.assertIsNone(original)
+        self.assertEqual(fuente.estado_proceso, uploads.ESTADO_CARGADO)
+        with open(uploads.ruta_absoluta(fuente.ruta_archivo), "rb") as fh:
+            self.assertEqual(fh.read(), b"abcdef")
+        with self.assertRaises(uploads.SubidaFinalizada):
+            uploads.agregar_fragmento(fuente, 0, [b"abc"])
+
+    def test_hash_distinto_al_informado(self):
+        fuente = uploads.iniciar_subida("datos.csv")
+        uploads.agregar_fragmento(fuente, 0, [b"abc"])
+        with self.assertRaises(uploads.HashInvalido):
+            uploads.finalizar_subida(fuente, sha256_esperado="0" * 64)
+
+        fuente.refresh_from_db()
+        self.assertEqual(fuente.estado_proceso, uploads.ESTADO_ERROR)
+        self.assertFalse(os.path.exists(uploads.ruta_absoluta(fuente.ruta_archivo)))
+        with self.assertRaises(uploads.SubidaFinalizada):
+            uploads.agregar_fragmento(fuente, 3, [b"d"])
+
+
+class EmisorArchivoUploadViewTests(ArchivoTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.emisor = Emisor.objects.create(nombre="Propio", rut="1-9")
+        self.otro = Emisor.objects.create(nombre="Ajeno", rut="2-7")
+        self.usuario = crear_usuario("accionista", "ACCIONISTA")
+        EmisorUsuario.objects.create(emisor=self.emisor, usuario=self.usuario)
+        self.client.force_login(self.usuario, backend=BACKEND)
+
+    def subir(self, emisor, contenido, **extra):
+        url = reverse("emisor_archivo_upload", kwargs={"id_emisor": emisor.pk})
+        respuesta = self.client.post(url, {"accion": "iniciar", "nombre": "carga.csv"})
+        if respuesta.status_code != 201:
+            return respuesta
+        return self.client.post(
+            url,
+            {
+                "accion": "fragmento",
+                "upload_id": respuesta.json()["upload_id"],
+                "offset": 0,
+                "total": len(contenido),
+                "chunk": SimpleUploadedFile("chunk", contenido),
+                **extra,
+            },
+        )
+
+    def test_hash_invalido_deja_la_subida_en_error(self):
+        url = reverse("emisor_archivo_upload", kwargs={"id_emisor": self.emisor.pk})
+
+        respuesta = self.subir(self.emisor, b"rut_emisor,anio,monto\n", sha256="0" * 64)
+
+        self.assertEqual(respuesta.status_code, 422)
+        self.assertEqual(respuesta.json()["estado"], uploads.ESTADO_ERROR)
+        consulta = self.client.get(url, {"upload_id": respuesta.json()["upload_id"]})
+        self.assertEqual(consulta.status_code, 410)
+        self.assertEqual(consulta.json()["estado"], uploads.ESTADO_ERROR)
+
+    def test_la_carga_solo_admite_filas_del_emisor_autorizado(self):
+        contenido = b"rut_emisor,anio,monto\n1-9,2024,10\n2-7,2024,20\n"
+
+        respuesta = self.subir(self.emisor, contenido)
+
+        self.assertEqual(respuesta.status_code, 200)
+        carga = ArchivoCarga.objects.get(pk=respuesta.json()["carga_id"])
+        self.assertEqual(carga.emisor_id, self.emisor.pk)
+        procesar_carga_pendiente(carga)
+        self.assertEqual((carga.filas_ok, carga.filas_error), (1, 1))
+        self.assertEqual(list(CalificacionTributaria.objects.values_list("emisor_id", flat=True)), [self.emisor.pk])
+        error = carga.detalles.get(estado="error")
+        self.assertIn("no corresponde al emisor de la carga", error.mensaje_error)
+
+    def test_rechaza_subidas_a_emisores_no_vinculados(self):
+        respuesta = self.subir(self.otro, b"rut_emisor,anio,monto\n2-7,2024,20\n")
+        self.assertEqual(respuesta.status_code, 403)
+
+    def test_reutiliza_solo_la_carga_previa_del_mismo_usuario_y_emisor(self):
+        contenido = b"rut_emisor,anio,monto\n1-9,2024,10\n"
+        primera = self.subir(self.emisor, contenido).json()
+        repetida = self.subir(self.emisor, contenido).json()
+        self.assertEqual(repetida["carga_id"], primera["carga_id"])
+        self.assertIsNotNone(repetida["duplicado_de"])
+
+        colega = crear_usuario("colega", "INVERSIONISTA")
+        EmisorUsuario.objects.create(emisor=self.emisor, usuario=colega)
+        self.client.force_login(colega, backend=BACKEND)
+        ajena = self.subir(self.emisor, contenido).json()
+
+        self.assertNotEqual(ajena["carga_id"], primera["carga_id"])
+        self.assertIsNone(ajena["duplicado_de"])
+        self.assertEqual(ArchivoCarga.objects.get(pk=ajena["carga_id"]).usuario_id, colega.pk)
+
+
+class CalificacionExportViewTests(TestCase):
+    def setUp(self):
+        self.propio = Emisor.objects.create(nombre="Propio")
+        self.ajeno = Emisor.objects.create(nombre="Ajeno")
+        for emisor in (self.propio, self.ajeno):
+            CalificacionTributaria.objects.create(emisor=emisor, anio=2024, monto=1)
+        self.url = reverse("api_calificaciones_export")
+
+    def test_requiere_autenticacion(self):
+        self.assertIn(self.client.get(self.url).status_code, (401, 403))
+
+    def test_exporta_solo_los_emisores_del_usuario(self):
+        self.client.force_login(crear_contador("contador", self.propio), backend=BACKEND)
+        filas = [json.loads(linea) for linea in b"".join(self.client.get(self.url).streaming_content).splitlines()]
+        self.assertEqual([f["emisor_id"] for f in filas], [self.propio.pk])
+
+        self.client.force_login(crear_usuario("supervisor", "SUPERVISOR"), backend=BACKEND)
+        contenido = b"".join(self.client.get(self.url, {"formato": "csv"}).streaming_content).decode()
+        self.assertEqual(len(contenido.strip().splitlines()), 3)
+
+
+class CalificacionBulkViewTests(TestCase):
+    def setUp(self):
+        self.emisor = Emisor.objects.create(nombre="Propio")
+        self.ajeno = Emisor.objects.create(nombre="Ajeno")
+        self.bono = Instrumento.objects.create(emisor=self.emisor, nombre="Bono")
+        self.accion = Instrumento.objects.create(emisor=self.emisor, nombre="Acción")
+        self.url = reverse("api_calificaciones_bulk")
+        self.client.force_login(crear_contador("contador", self.emisor), backend=BACKEND)
+
+    def enviar(self, items):
+        return self.client.post(self.url, json.dumps(items), content_type="application/json")
+
+    def test_requiere_usuario_con_rol_de_edicion(self):
+        self.client.logout()
+        self.assertIn(self.enviar([{"emisor": self.emisor.pk}]).status_code, (401, 403))
+        self.client.force_login(crear_usuario("inversionista", "INVERSIONISTA"), backend=BACKEND)
+        self.assertEqual(self.enviar([{"emisor": self.emisor.pk}]).status_code, 403)
+
+    def test_crea_y_rechaza_duplicados_dentro_del_lote(self):
+        alta = {"emisor": self.emisor.pk, "instrumento": self.bono.pk, "anio": 2024, "monto": "10.00"}
+
+        respuesta = self.enviar([alta, dict(alta, monto="20.00"), {"emisor": self.emisor.pk, "anio": 1990}])
+
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual((datos["creadas"], datos["errores"]), (1, 2))
+        self.assertEqual([r["estado"] for r in datos["resultados"]], ["creada", "error", "error"])
+        creada = CalificacionTributaria.objects.get()
+        self.assertEqual(creada.creado_por.username, "contador")
+
+    def test_actualizacion_que_choca_con_otra_fila_devuelve_error_por_item(self):
+        existente = CalificacionTributaria.objects.create(
+            emisor=self.emisor, instrumento=self.bono, anio=2024, monto=1
+        )
+        otra = CalificacionTributaria.objects.create(emisor=self.emisor, instrumento=self.accion, anio=2024, monto=2)
+        anulada = CalificacionTributaria.objects.create(
+            emisor=self.emisor, instrumento=self.bono, anio=2025, monto=3, estado_registro="anulado"
+        )
+        alta_anulada = {
+            "emisor": self.emisor.pk,
+            "instrumento": self.bono.pk,
+            "anio": 2025,
+            "monto": "4",
+            "estado_registro": "anulado",
+        }
+
+        datos = self.enviar(
+            [{"id": otra.pk, "instrumento": self.bono.pk}, alta_anulada, {"id": existente.pk, "monto": "9.50"}]
+        ).json()
+
+        self.assertEqual([r["estado"] for r in datos["resultados"]], ["error", "error", "actualizada"])
+        otra.refresh_from_db()
+        self.assertEqual(otra.instrumento_id, self.accion.pk)
+        self.assertEqual(CalificacionTributaria.objects.filter(anio=2025).get(), anulada)
+
+    def test_cada_item_escribe_solo_los_campos_enviados(self):
+        a = CalificacionTributaria.objects.create(emisor=self.emisor, instrumento=self.bono, anio=2024, monto=1)
+        b = CalificacionTributaria.objects.create(emisor=self.emisor, instrumento=self.accion, anio=2024, monto=2)
+
+        with CaptureQueriesContext(connection) as consultas:
+            datos = self.enviar([{"id": a.pk, "monto": "5"}, {"id": b.pk, "rating": "AA"}]).json()
+
+        self.assertEqual(datos["actualizadas"], 2)
+        updates = [
+            q["sql"] for q in consultas if q["sql"].startswith('UPDATE "calificaciones_tributarias"')
+        ]
+        self.assertEqual(len(updates), 2)
+        self.assertFalse(any('"monto"' in sql and '"rating"' in sql for sql in updates))
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((str(a.monto), a.rating, str(b.monto), b.rating), ("5.00", None, "2.00", "AA"))
+
+    def test_no_modifica_emisores_no_asignados(self):
+        ajena = CalificacionTributaria.objects.create(emisor=self.ajeno, anio=2024, monto=1)
+        datos = self.enviar(
+            [{"id": ajena.pk, "monto": "5"}, {"emisor": self.ajeno.pk, "anio": 2024, "monto": "1"}]
+        ).json()
+        self.assertEqual(datos["resultados"][0]["errores"], {"id": ["No existe."]})
+        self.assertIn("emisor", datos["resultados"][1]["errores"])
+        self.assertEqual(CalificacionTributaria.objects.count(), 1)
+
+
+@override_settings(CALIFICACIONES_RESUMEN=True)
+class ResumenCalificacionesTests(TestCase):
+    def test_aplica_los_deltas_en_orden_de_clave(self):
+        emisores = [Emisor.objects.create(nombre=f"E{i}") for i in range(3)]
+        deltas = {(e.pk, "pendiente", 2024): 1 for e in reversed(emisores)}
+
+        aplicar_deltas(deltas)
+
+        # Las filas nuevas se insertan en el orden en que se recorren las claves
+        creadas = ResumenCalificaciones.objects.order_by("id").values_list("emisor_id", flat=True)
+        self.assertEqual(list(creadas), [e.pk for e in emisores])
+
+
+class IndicadorCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.lock_key = f"{indicadores.LOCK_PREFIX}chile:uf"
+
+    def fetch_prohibido(self):
+        raise AssertionError("no debe consultar la API externa")
+
+    def test_sin_lock_ni_cache_responde_503_sin_esperar(self):
+        cache.add(self.lock_key, 1, indicadores.LOCK_TIMEOUT)
+
+        with self.assertRaises(indicadores.ConsultaEnCurso):
+            indicadores.obtener_serie("chile", "uf", self.fetch_prohibido)
+        response = self.client.get(reverse("indicador_timeseries_api", args=["chile", "uf"]))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], str(indicadores.LOCK_REINTENTO))
+        # El lock es de otro proceso: no se libera
+        self.assertEqual(cache.get(self.lock_key), 1)
+
+    def test_sin_lock_sirve_la_entrada_vencida(self):
+        cache.set(
+            indicadores._clave("chile", "uf"),
+            {"labels": ["2024-01-01"], "data": [1.0], "obtenido": 0},
+            indicadores._stale(),
+        )
+        cache.add(self.lock_key, 1, indicadores.LOCK_TIMEOUT)
+
+        entrada = indicadores._consultar("chile", "uf", self.fetch_prohibido)
+
+        self.assertEqual(entrada["data"], [1.0])
+        self.assertEqual(cache.get(self.lock_key), 1)
+
+
+class IndicadorLocalTests(TestCase):
+    def test_cuenta_solo_los_valores_insertados(self):
+        dia = date(2024, 1, 2)
+        with mock.patch.object(indicadores, "_descargar_rango", return_value=[(dia, 1), (dia, 1)]):
+            nuevos = indicadores.sincronizar_indicador("chile", "uf", desde=dia, hasta=dia)
+
+        self.assertEqual(nuevos, 1)
+        self.assertEqual(IndicadorValor.objects.count(), 1)
+
+    def test_no_descarga_si_la_serie_esta_al_dia(self):
+        IndicadorValor.objects.create(pais="chile", codigo="uf", fecha=date.today() + timedelta(days=20), valor=1)
+
+        with mock.patch.object(indicadores, "_fetch_mindicador_timeseries") as fetch:
+            self.assertEqual(indicadores.sincronizar_indicador("chile", "uf"), 0)
+        fetch.assert_not_called()
+
+    def test_descarga_desde_el_dia_siguiente_al_ultimo(self):
+        ultima = date.today() - timedelta(days=3)
+        IndicadorValor.objects.create(pais="chile", codigo="usd", fecha=ultima, valor=1)
+
+        with mock.patch.object(indicadores, "_fetch_fx_timeseries", return_value=([], [])) as fetch:
+            indicadores.sincronizar_indicador("chile", "usd")
+
+        fetch.assert_called_once_with("CLP", ultima + timedelta(days=1), date.today())
+
+    def test_serie_local_atrasada_vuelve_a_la_api_externa(self):
+        IndicadorValor.objects.create(pais="chile", codigo="usd", fecha=date.today() - timedelta(days=10), valor=1)
+        url = reverse("indicador_timeseries_api", args=["chile", "usd"])
+
+        with mock.patch("appNuam.views.obtener_serie", return_value=(["2024-01-02"], [1.0], "hit")):
+            response = self.client.get(url)
+            historico = self.client.get(url, {"desde": (date.today() - timedelta(days=15)).isoformat()})
+
+        self.assertEqual(response["X-Cache"], "HIT")
+        # Un rango explícito con datos locales se sigue sirviendo desde la tabla
+        self.assertEqual(historico["X-Cache"], "LOCAL")
+        self.assertFalse(indicadores.serie_local_al_dia("chile", "usd"))
+        with self.settings(INDICADORES_LOCAL_VIGENCIA=30):
+            self.assertTrue(indicadores.serie_local_al_dia("chile", "usd"))
+
+    @mock.patch.object(IndicadorValor._meta, "db_table", "indicadores_valores_sin_crear")
+    def test_sin_tabla_local_consulta_la_api_externa(self):
+        self.assertEqual(indicadores.serie_local("chile", "uf"), ([], []))
+        self.assertFalse(indicadores.serie_local_al_dia("chile", "uf"))
+
+        with mock.patch("appNuam.views.obtener_serie", return_value=(["2024-01-02"], [1.0], "miss")):
+            response = self.client.get(reverse("indicador_timeseries_api", args=["chile", "uf"]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Cache"], "MISS")
+
+
+class ReportesTests(ArchivoTemporalMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.emisor = Emisor.objects.create(nombre="Emisor Uno", rut="76.111.111-1")
+        CalificacionTributaria.objects.create(emisor=self.emisor, anio=2024, monto=1)
+        self.borrada = os.path.join(self.directorio, "reporte_borrado.pdf")
+
+    def test_descarga_regenera_si_la_version_fue_borrada(self):
+        self.client.force_login(crear_usuario("inversionista", "INVERSIONISTA"), backend=BACKEND)
+
+        with mock.patch("appNuam.views.obtener_reporte", return_value=self.borrada):
+            response = self.client.get(reverse("reporte_calificaciones_pdf", args=[self.emisor.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+    def test_lote_regenera_si_la_version_fue_borrada(self):
+        with mock.patch.object(reportes, "generar_lote", return_value=iter([(self.emisor.pk, self.borrada, None)])):
+            contenido = b"".join(reportes.zip_lote([self.emisor.pk]))
+
+        with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+            self.assertEqual(zf.namelist(), [f"reporte_{self.emisor.pk}.pdf"])
+            self.assertTrue(zf.read(f"reporte_{self.emisor.pk}.pdf").startswith(b"%PDF"))
+
+    def test_columnas_no_se_superponen_ni_salen_del_margen(self):
+        limites = [(x, x + ancho) for _, _, x, ancho, _ in reportes.COLUMNAS_REPORTE]
+        for (_, fin), (inicio, _) in zip(limites, limites[1:]):
+            self.assertLessEqual(fin, inicio)
+        self.assertLessEqual(limites[-1][1], reportes.ANCHO_PAGINA - reportes.MARGEN)
+
+        texto, medida = reportes._ajustar("Instrumento " * 20, 230, "Helvetica", reportes.TAMANO_FUENTE)
+        self.assertTrue(texto.endswith("..."))
+        self.assertLessEqual(medida, 230)
+
+    def test_version_cambia_con_lo_que_imprime_el_reporte(self):
+        instrumento = Instrumento.objects.create(emisor=self.emisor, nombre="Bono A")
+        calificacion = CalificacionTributaria.objects.create(
+            emisor=self.emisor, anio=2025, monto=1, instrumento=instrumento
+        )
+        versiones = [reportes.version_reporte(self.emisor.pk)[1]]
+
+        Instrumento.objects.filter(pk=instrumento.pk).update(nombre="Bono B")
+        versiones.append(reportes.version_reporte(self.emisor.pk)[1])
+        calificacion.monto = 99
+        CalificacionTributaria.objects.bulk_update([calificacion], ["monto"])
+        versiones.append(reportes.version_reporte(self.emisor.pk)[1])
+
+        self.assertEqual(len(set(versiones)), 3)
+        self.assertEqual(reportes.version_reporte(self.emisor.pk)[1], versiones[-1])
+
+    def test_descarga_sin_fecha_de_modificacion_omite_last_modified(self):
+        self.client.force_login(crear_usuario("inversionista", "INVERSIONISTA"), backend=BACKEND)
+
+        with mock.patch("appNuam.views.version_reporte", return_value=(self.emisor, "v1", None)), mock.patch(
+            "appNuam.views.obtener_reporte", return_value=self.borrada
+        ):
+            response = self.client.get(reverse("reporte_calificaciones_pdf", args=[self.emisor.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], '"v1"')
+        self.assertNotIn("Last-Modified", response)
+
+    def test_pool_de_procesos_es_unico_y_usa_spawn(self):
+        with mock.patch.dict(reportes._pool, {"pid": None, "instancia": None}), mock.patch.object(
+            reportes, "ProcessPoolExecutor"
+        ) as pool:
+            self.assertIs(reportes._pool_reportes(), reportes._pool_reportes())
+
+        pool.assert_called_once()
+        self.assertEqual(pool.call_args.kwargs["mp_context"].get_start_method(), "spawn")
+        self.assertIs(pool.call_args.kwargs["initializer"], reportes._iniciar_proceso)
+
+    def test_lote_usa_el_pool_compartido_sin_cerrar_conexiones(self):
+        otro = Emisor.objects.create(nombre="Emisor Dos", rut="76.222.222-2")
+        ids = [self.emisor.pk, otro.pk]
+        versiones = reportes.versiones_reporte(ids)
+        pool = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(pool.shutdown)
+
+        with mock.patch.object(reportes, "_pool_reportes", return_value=pool), mock.patch.object(
+            reportes, "_generar_en_worker", side_effect=lambda i, v: self.borrada
+        ) as worker, mock.patch.object(connections, "close_all") as close_all:
+            resultado = sorted(reportes.generar_lote(ids, workers=1))
+
+        self.assertEqual(resultado, [(i, self.borrada, None) for i in sorted(ids)])
+        self.assertCountEqual([c.args for c in worker.call_args_list], [(i, versiones[i][1]) for i in ids])
+        close_all.assert_not_called()
+
+    def test_lote_descarta_el_pool_si_un_proceso_muere(self):
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+
+        with mock.patch.dict(reportes._pool, {"pid": os.getpid(), "instancia": pool}), mock.patch.object(
+            reportes, "_generar_en_worker", side_effect=BrokenProcessPool("hijo terminado")
+        ):
+            resultado = list(reportes.generar_lote([self.emisor.pk]))
+            self.assertIsNone(reportes._pool["instancia"])
+
+        self.assertEqual(resultado, [(self.emisor.pk, None, "hijo terminado")])
+
+    def test_lote_informa_emisores_inexistentes(self):
+        faltante = self.emisor.pk + 1000
+
+        self.assertEqual(list(reportes.generar_lote([faltante])), [(faltante, None, "Emisor no encontrado")])
+
+
+class LoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def login(self, username, password, **extra):
+        return self.client.post(reverse("login"), {"username": username, "password": password}, **extra)
+
+    def test_actualiza_el_hash_legado_al_iniciar_sesion(self):
+        usuario = crear_usuario("legado", "CONTADOR")
+        Usuario.objects.filter(pk=usuario.pk).update(password_hash=hashlib.sha256(b"clave-legada").hexdigest())
+
+        response = self.login("legado", "clave-legada")
+
+        self.assertRedirects(response, reverse("contador_dashboard"), fetch_redirect_response=False)
+        usuario.refresh_from_db()
+        self.assertTrue(usuario.password_hash.startswith("pbkdf2_sha256$"))
+        self.assertTrue(hashers.check_password("clave-legada", usuario.password_hash))
+
+    def test_actualiza_el_hash_con_otro_costo(self):
+        usuario = crear_usuario("costo", "CONTADOR")
+        hasher = hashers.PBKDF2PasswordHasher()
+        antiguo = hasher.encode("clave", hasher.salt(), iterations=1000)
+        Usuario.objects.filter(pk=usuario.pk).update(password_hash=antiguo)
+
+        self.login("costo", "clave")
+
+        usuario.refresh_from_db()
+        self.assertNotEqual(usuario.password_hash, antiguo)
+        self.assertFalse(hashers.identify_hasher(usuario.password_hash).must_update(usuario.password_hash))
+
+    def test_contrasena_incorrecta_no_modifica_el_hash(self):
+        usuario = crear_usuario("legado", "CONTADOR")
+        legado = hashlib.sha256(b"clave-legada").hexdigest()
+        Usuario.objects.filter(pk=usuario.pk).update(password_hash=legado)
+
+        response = self.login("legado", "otra")
+
+        self.assertEqual(response.status_code, 200)
+        usuario.refresh_from_db()
+        self.assertEqual(usuario.password_hash, legado)
+
+    @override_settings(LOGIN_MAX_FALLOS_USUARIO=3)
+    def test_limita_los_fallos_por_usuario(self):
+        crear_usuario("limitado")
+        for _ in range(3):
+            self.assertEqual(self.login("limitado", "mala").status_code, 200)
+
+        response = self.login("limitado", "mala")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response["Retry-After"]), 0)
+
+    @override_settings(LOGIN_MAX_FALLOS_IP=3, LOGIN_MAX_FALLOS_USUARIO=100)
+    def test_limita_los_fallos_por_ip(self):
+        for i in range(3):
+            self.login(f"inexistente{i}", "mala")
+
+        self.assertEqual(self.login("otro", "mala").status_code, 429)
+        self.assertEqual(self.login("otro", "mala", REMOTE_ADDR="10.0.0.9").status_code, 200)
+
+    @override_settings(LOGIN_BLOQUEO_UMBRAL=2, LOGIN_MAX_FALLOS_USUARIO=100)
+    def test_bloquea_la_cuenta_al_llegar_al_umbral(self):
+        usuario = crear_usuario("bloqueable")
+
+        self.login("bloqueable", "mala")
+        response = self.login("bloqueable", "mala")
+
+        self.assertContains(response, "bloqueada")
+        usuario.refresh_from_db()
+        self.assertEqual(usuario.estado, "bloqueado")
+
+
+class IpClienteTests(TestCase):
+    def request(self, remote, reenviadas=None):
+        extra = {"HTTP_X_FORWARDED_FOR": reenviadas} if reenviadas else {}
+        return RequestFactory().get("/", REMOTE_ADDR=remote, **extra)
+
+    def test_sin_proxies_confiables_ignora_x_forwarded_for(self):
+        self.assertEqual(ip_cliente(self.request("203.0.113.5", "198.51.100.1")), "203.0.113.5")
+
+    @override_settings(PROXIES_CONFIABLES=["10.0.0.0/8"])
+    def test_lee_x_forwarded_for_solo_desde_un_proxy_confiable(self):
+        # El cliente puede anteponer valores falsos; se toma el primero que no es un proxy propio
+        request = self.request("10.0.0.2", "1.2.3.4, 198.51.100.1, 10.0.0.1")
+        self.assertEqual(ip_cliente(request), "198.51.100.1")
+        self.assertEqual(ip_cliente(self.request("203.0.113.5", "198.51.100.1")), "203.0.113.5")
+
+
+class SesionJWTTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.usuario = crear_usuario("api", "CONTADOR")
+        self.tokens = emitir_sesion(self.usuario)
+
+    def autenticar(self, access):
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        return JWTAuthentication().authenticate(request)
+
+    def test_access_autentica_sin_consultar_la_bd(self):
+        self.autenticar(self.tokens["access"])  # carga la lista de sesiones revocadas
+
+        with self.assertNumQueries(0):
+            usuario, payload = self.autenticar(self.tokens["access"])
+        self.assertEqual((usuario.pk, payload["roles"]), (self.usuario.pk, ["CONTADOR"]))
+
+    def test_revocar_invalida_access_y_refresh(self):
+        sid = self.autenticar(self.tokens["access"])[1]["sid"]
+
+        self.assertEqual(revocar(sid), 1)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.autenticar(self.tokens["access"])
+        with self.assertRaises(TokenInvalido):
+            refrescar(self.tokens["refresh"])
+
+    def test_revocar_usuario_cierra_todas_sus_sesiones(self):
+        otra = emitir_sesion(self.usuario)
+
+        self.assertEqual(revocar_usuario(self.usuario.pk), 2)
+
+        for tokens in (self.tokens, otra):
+            with self.assertRaises(AuthenticationFailed):
+                self.autenticar(tokens["access"])
+
+
+class RecorrerPaginasMixin:
+    def recorrer(self, url):
+        ids = []
+        while url:
+            datos = self.client.get(url).json()
+            ids += [fila["id"] for fila in datos["results"]]
+            url = datos["next"]
+        return ids
+
+
+class CalificacionCursorPaginationTests(RecorrerPaginasMixin, TestCase):
+    def test_recorre_todas_las_paginas_en_orden_de_id(self):
+        emisor, otro = Emisor.objects.create(nombre="E1"), Emisor.objects.create(nombre="E2")
+        propias = [CalificacionTributaria.objects.create(emisor=emisor, anio=2020 + i, monto=i).pk for i in range(5)]
+        CalificacionTributaria.objects.create(emisor=otro, anio=2024, monto=1)
+
+        ids = self.recorrer(f"{reverse('calificaciontributaria-list')}?page_size=2&emisor={emisor.pk}")
+
+        self.assertEqual(ids, propias)
+
+
+class HistorialCursorPaginationTests(RecorrerPaginasMixin, TestCase):
+    def setUp(self):
+        emisor = Emisor.objects.create(nombre="E1")
+        self.calificacion = CalificacionTributaria.objects.create(emisor=emisor, anio=2024, monto=1)
+        momento = timezone.now()
+        for i in range(5):
+            accion = HistorialAccion.objects.create(calificacion=self.calificacion, accion="EDICION")
+            # Dos acciones por instante: el desempate por id también se pagina
+            HistorialAccion.objects.filter(pk=accion.pk).update(created_at=momento + timedelta(seconds=i // 2))
+        self.url = reverse("api_calificacion_historial", args=[self.calificacion.pk]) + "?page_size=2"
+
+    def test_recorre_del_mas_reciente_al_mas_antiguo(self):
+        self.client.force_login(crear_usuario("supervisor", "SUPERVISOR"), backend=BACKEND)
+
+        ids = self.recorrer(self.url)
+
+        esperados = HistorialAccion.objects.filter(calificacion=self.calificacion).order_by("-created_at", "-id")
+        self.assertEqual(ids, list(esperados.values_list("id", flat=True)))
+
+    def test_requiere_rol_de_auditoria(self):
+        self.client.force_login(crear_usuario("contador", "CONTADOR"), backend=BACKEND)
+
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class SugerirIndicesTests(TestCase):
+    def test_recorre_las_vistas_sin_escribir_en_la_bd(self):
+        crear_usuario("supervisor", "SUPERVISOR")
+        emisor = Emisor.objects.create(nombre="E1")
+        for anio in (2023, 2024):
+            CalificacionTributaria.objects.create(emisor=emisor, anio=anio, monto=1)
+        salida = io.StringIO()
+
+        call_command("sugerir_indices", "--min-filas", "0", stdout=salida, stderr=io.StringIO())
+
+        self.assertIn("consultas distintas analizadas", salida.getvalue())
+        self.assertFalse(Session.objects.exists())
+
+    def test_resuelve_los_alias_de_tabla_de_explain(self):
+        consulta = CalificacionTributaria.objects.filter(emisor__in=Emisor.objects.filter(nombre__contains="x"))
+        sql, params = consulta.query.sql_with_params()
+        with connection.cursor() as cursor:
+            tablas = SugerirIndices()._scans_sqlite(cursor, sql, params)
+
+        self.assertIn(Emisor._meta.db_table, tablas)
+        self.assertNotIn("U0", tablas)
+
+
+class PresupuestoConsultasTests(TestCase):
+    def test_bloque_dentro_y_fuera_del_presupuesto(self):
+        with presupuesto_consultas(1) as contador:
+            Emisor.objects.count()
+        self.assertEqual(len(contador.consultas), 1)
+
+        with self.assertRaisesMessage(PresupuestoExcedido, "bloque: 2 consultas, presupuesto 1"):
+            with presupuesto_consultas(1):
+                Emisor.objects.count()
+                Emisor.objects.exists()
+
+    @override_settings(CONSULTAS_PRESUPUESTO="error")
+    def test_listado_no_crece_con_la_cantidad_de_filas(self):
+        self.client.force_login(crear_usuario("supervisor", "SUPERVISOR"), backend=BACKEND)
+        for i in range(5):
+            emisor = Emisor.objects.create(nombre=f"E{i}")
+            instrumento = Instrumento.objects.create(emisor=emisor, nombre=f"I{i}")
+            CalificacionTributaria.objects.create(emisor=emisor, instrumento=instrumento, anio=2024, monto=1)
+
+        response = self.client.get(reverse("supervisor_calificaciones"))
+
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(CONSULTAS_PRESUPUESTO="log")
+    def test_modo_log_solo_avisa(self):
+        self.client.force_login(crear_usuario("supervisor", "SUPERVISOR"), backend=BACKEND)
+
+        with mock.patch("appNuam.views.SupervisorCalificacionListView.max_consultas", 1):
+            with self.assertLogs("appNuam.presupuesto_consultas", "WARNING") as logs:
+                response = self.client.get(reverse("supervisor_calificaciones"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("SupervisorCalificacionListView", logs.output[0])
+
+
+class PaginaPorClaveTests(TestCase):
+    def setUp(self):
+        emisor = Emisor.objects.create(nombre="E1")
+        # Años repetidos: el desempate por pk debe mantener el orden entre páginas
+        for anio in (2024, 2022, 2023, 2022, 2024, 2023, 2022):
+            CalificacionTributaria.objects.create(emisor=emisor, anio=anio, monto=1)
+        self.queryset = CalificacionTributaria.objects.all()
+
+    def test_recorre_hacia_adelante_y_hacia_atras(self):
+        esperados = list(self.queryset.order_by("-anio", "-pk").values_list("pk", flat=True))
+        paginas, cursor = [], None
+        while True:
+            pagina = pagina_por_clave(self.queryset, "-anio", cursor, tamano=3)
+            paginas.append([c.pk for c in pagina["filas"]])
+            if not pagina["siguiente"]:
+                break
+            cursor = pagina["siguiente"]
+        self.assertEqual(sum(paginas, []), esperados)
+
+        anterior = pagina_por_clave(self.queryset, "-anio", pagina["anterior"], tamano=3)
+        self.assertEqual([c.pk for c in anterior["filas"]], paginas[-2])
+
+    def test_cursor_invalido_entrega_la_primera_pagina(self):
+        primera = [c.pk for c in pagina_por_clave(self.queryset, "-anio", None, tamano=3)["filas"]]
+        invalidos = [
+            "no-es-base64!",
+            _codificar_cursor(["2024"], 1, False),
+            _codificar_cursor({"$gt": 0}, 1, False),
+            _codificar_cursor(True, 1, False),
+            _codificar_cursor("dos mil", 1, False),
+            _codificar_cursor(None, 1, False),
+        ]
+        for cursor in invalidos:
+            with self.subTest(cursor=cursor):
+                pagina = pagina_por_clave(self.queryset, "-anio", cursor, tamano=3)
+                self.assertEqual([c.pk for c in pagina["filas"]], primera)
+
+    def test_listado_con_cursor_alterado_responde(self):
+        self.client.force_login(crear_usuario("supervisor", "SUPERVISOR"), backend=BACKEND)
+        cursor = _codificar_cursor([1, 2], 1, False)
+
+        response = self.client.get(reverse("supervisor_calificaciones"), {"orden": "-anio", "cursor": cursor})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["calificaciones"]), 7)
+
+    def test_limita_el_selector_de_emisores(self):
+        self.client.force_login(crear_usuario("supervisor", "SUPERVISOR"), backend=BACKEND)
+        ultimo = [Emisor.objects.create(nombre=f"Z{i}") for i in range(3)][-1]
+        url = reverse("supervisor_calificaciones")
+
+        with mock.patch("appNuam.views.SupervisorCalificacionListView.max_emisores_filtro", 2):
+            response = self.client.get(url)
+            filtrado = self.client.get(url, {"emisor": ultimo.pk})
+
+        self.assertEqual(len(response.context["emisores_filtro"]), 2)
+        self.assertTrue(response.context["emisores_filtro_truncado"])
+        self.assertIn(ultimo, filtrado.context["emisores_filtro"])
+
+
+class RolesCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.usuario = crear_usuario("roles", "CONTADOR")
+
+    def roles(self):
+        # Un objeto nuevo por llamada, como en cada request
+        return db_role_names(Usuario.objects.get(pk=self.usuario.pk))
+
+    def test_por_defecto_no_se_reutilizan_entre_requests(self):
+        self.assertEqual(revisar_cache_roles(None), [])
+        self.roles()
+        usuario = Usuario.objects.get(pk=self.usuario.pk)
+
+        with self.assertNumQueries(1):
+            db_role_names(usuario)
+
+    @override_settings(ROLES_CACHE_TTL=600)
+    def test_asignar_y_quitar_un_rol_se_ve_en_la_siguiente_lectura(self):
+        self.assertEqual(self.roles(), ["CONTADOR"])
+
+        asignado = UsuarioRol.objects.create(usuario=self.usuario, rol=Rol.objects.create(nombre="SUPERVISOR"))
+        self.assertEqual(sorted(self.roles()), ["CONTADOR", "SUPERVISOR"])
+
+        asignado.delete()
+        self.assertEqual(self.roles(), ["CONTADOR"])
+
+    @override_settings(ROLES_CACHE_TTL=600)
+    def test_avisa_si_el_cache_es_local_del_proceso(self):
+        self.assertEqual([w.id for w in revisar_cache_roles(None)], ["appNuam.W001"])
+
+
+class IndicadoresLoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def fetch(self, indicador_cfg):
+        if indicador_cfg.get("endpoint", "").endswith("/uf"):
+            raise req_exceptions.ConnectionError("sin conexión")
+        return ["2024-01-02"], [float(len(indicador_cfg["descripcion"]))]
+
+    def test_cada_serie_falla_por_separado(self):
+        pedidos = [("chile", "usd"), ("chile", "uf"), ("peru", "usd")]
+        with mock.patch.object(indicadores, "fetch_indicador", side_effect=self.fetch):
+            resultados = indicadores.obtener_series(pedidos)
+
+        self.assertEqual(set(resultados), set(pedidos))
+        self.assertEqual(resultados[("chile", "usd")][2], "miss")
+        self.assertIsInstance(resultados[("chile", "uf")], req_exceptions.ConnectionError)
+
+    def test_endpoint_devuelve_las_series_sanas_y_el_error_de_la_caida(self):
+        with mock.patch.object(indicadores, "fetch_indicador", side_effect=self.fetch):
+            response = self.client.get(reverse("indicadores_batch_api"), {"series": "chile:usd,chile:uf,peru:usd"})
+
+        self.assertEqual(response.status_code, 200)
+        series = {(s["pais"], s["indicador"]): s for s in response.json()["series"]}
+        self.assertEqual(list(series), [("chile", "usd"), ("chile", "uf"), ("peru", "usd")])
+        self.assertEqual(series[("peru", "usd")]["data"], [float(len("1 USD en PEN"))])
+        self.assertIn("sin conexión", series[("chile", "uf")]["error"])
+        self.assertNotIn("error", series[("chile", "usd")])
+
+
+@override_settings(CIRCUITO_UMBRAL_FALLOS=2, CIRCUITO_ESPERA=10, CIRCUITO_ESPERA_MAXIMA=25)
+class CircuitoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.ahora = 1_000_000.0
+        reloj = mock.patch.object(circuitos.time, "time", side_effect=lambda: self.ahora)
+        reloj.start()
+        self.addCleanup(reloj.stop)
+        self.circuito = circuitos.Circuito("proveedor")
+
+    def caido(self):
+        raise req_exceptions.ConnectionError("caído")
+
+    def fallar(self, veces=1):
+        for _ in range(veces):
+            with self.assertRaises(req_exceptions.ConnectionError):
+                self.circuito.llamar(self.caido)
+
+    def test_se_abre_tras_el_umbral_y_rechaza_sin_llamar(self):
+        self.fallar(2)
+        funcion = mock.Mock()
+
+        with self.assertRaises(circuitos.CircuitoAbierto) as ctx:
+            self.circuito.llamar(funcion)
+
+        funcion.assert_not_called()
+        self.assertEqual(ctx.exception.reintentar_en, 11)
+        self.assertEqual(self.circuito.resumen()["rechazos"], 1)
+
+    def test_un_4xx_no_cuenta_como_falla(self):
+        respuesta = mock.Mock(status_code=404)
+
+        def no_encontrado():
+            raise req_exceptions.HTTPError(response=respuesta)
+
+        for _ in range(3):
+            with self.assertRaises(req_exceptions.HTTPError):
+                self.circuito.llamar(no_encontrado)
+        self.assertEqual(self.circuito.estado()["estado"], circuitos.CERRADO)
+
+    def test_semiabierto_deja_pasar_una_sola_prueba(self):
+        self.fallar(2)
+        self.ahora += 11
+
+        def prueba():
+            # Otro request durante la prueba se rechaza al instante
+            with self.assertRaises(circuitos.CircuitoAbierto):
+                self.circuito.llamar(mock.Mock())
+            return "ok"
+
+        self.assertEqual(self.circuito.llamar(prueba), "ok")
+        estado = self.circuito.estado()
+        self.assertEqual((estado["estado"], estado["aperturas"]), (circuitos.CERRADO, 0))
+
+    def test_cada_reapertura_duplica_la_espera_hasta_el_maximo(self):
+        self.fallar(2)
+        esperas = []
+        for _ in range(3):
+            estado = self.circuito.estado()
+            esperas.append(estado["abierto_hasta"] - self.ahora)
+            self.ahora = estado["abierto_hasta"] + 1
+            self.fallar()  # la prueba semiabierta falla y el circuito vuelve a abrirse
+
+        self.assertEqual(esperas, [10, 20, 25])
+        self.assertEqual(self.circuito.estado()["estado"], circuitos.ABIERTO)
+
+
+@override_settings(CIRCUITO_UMBRAL_FALLOS=2)
+class IndicadorCircuitoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.sesion = mock.Mock()
+        self.sesion.get.side_effect = req_exceptions.ConnectionError("caído")
+        http = mock.patch.object(indicadores, "_http", return_value=self.sesion)
+        http.start()
+        self.addCleanup(http.stop)
+        self.url = reverse("indicador_timeseries_api", args=["chile", "uf"])
+
+    def test_con_el_proveedor_caido_responde_503_sin_llamarlo(self):
+        self.assertEqual([self.client.get(self.url).status_code for _ in range(2)], [502, 502])
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(self.sesion.get.call_count, 2)
+
+    def test_con_el_proveedor_caido_sirve_la_copia_vencida(self):
+        self.assertEqual([self.client.get(self.url).status_code for _ in range(2)], [502, 502])
+        cache.set(
+            indicadores._clave("chile", "uf"),
+            {"labels": ["2024-01-02"], "data": [1.0], "obtenido": 0},
+            indicadores._stale(),
+        )
+
+        with mock.patch.object(indicadores, "_refrescar_en_segundo_plano") as refrescar:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response["X-Cache"], response.json()["data"]), ("STALE", [1.0]))
+        refrescar.assert_called_once()
+
+
+class AuditoriaTests(TestCase):
+    def setUp(self):
+        self.calificacion = CalificacionTributaria.objects.create(
+            emisor=Emisor.objects.create(nombre="Emisor Uno", rut="76.111.111-1"), anio=2024, monto=1
+        )
+
+    def registrar(self, detalle):
+        auditoria.registrar(self.calificacion, None, "EDICION", detalle)
+
+    def detalles(self):
+        return sorted(HistorialAccion.objects.values_list("detalle", flat=True))
+
+    def inserts(self, contexto):
+        return [q for q in contexto.captured_queries if q["sql"].startswith("INSERT")]
+
+    def test_registra_al_confirmar_la_transaccion(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.registrar("a")
+            self.assertEqual(self.detalles(), [])
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(self.detalles(), ["a"])
+
+    def test_rollback_descarta_las_entradas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                self.registrar("revertida")
+                raise ValueError
+
+            with transaction.atomic():
+                self.registrar("confirmada")
+                with self.assertRaises(ValueError), transaction.atomic():
+                    self.registrar("savepoint")
+                    raise ValueError
+
+        self.assertEqual(self.detalles(), ["confirmada"])
+
+    def test_lote_escribe_con_un_solo_insert(self):
+        with CaptureQueriesContext(connection) as contexto:
+            with auditoria.lote():
+                with self.captureOnCommitCallbacks(execute=True):
+                    for detalle in "abc":
+                        self.registrar(detalle)
+                self.assertEqual(self.detalles(), [])
+
+        self.assertEqual(len(self.inserts(contexto)), 1)
+        self.assertEqual(self.detalles(), ["a", "b", "c"])
+
+    def test_un_insert_por_request(self):
+        def vista(request):
+            with self.captureOnCommitCallbacks(execute=True):
+                for detalle in "abc":
+                    self.registrar(detalle)
+            return HttpResponse()
+
+        with self.assertNumQueries(1):
+            auditoria.AuditoriaMiddleware(vista)(RequestFactory().get("/"))
+
+        self.assertEqual(self.detalles(), ["a", "b", "c"])
+
+    def test_sin_lote_cada_entrada_se_escribe_sola(self):
+        with CaptureQueriesContext(connection) as contexto:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.registrar("a")
+                self.registrar("b")
+
+        self.assertEqual(len(self.inserts(contexto)), 2)
+        self.assertEqual(self.detalles(), ["a", "b"])
+
+    @override_settings(HISTORIAL_MODO="cola")
+    def test_modo_cola_entrega_el_lote_al_escritor(self):
+        cola = queue.Queue()
+
+        with mock.patch.object(auditoria, "_cola", return_value=cola), self.assertNumQueries(0):
+            with auditoria.lote(), self.captureOnCommitCallbacks(execute=True):
+                self.registrar("a")
+                self.registrar("b")
+
+        self.assertEqual([f.detalle for f in cola.get_nowait()], ["a", "b"])
+        self.assertTrue(cola.empty())
+
+    def test_escritor_agrupa_lo_pendiente_y_vacia_la_cola_al_detener(self):
+        ocupado, liberar = threading.Event(), threading.Event()
+        guardados = []
+
+        def guardar(filas):
+            guardados.append([f.detalle for f in filas])
+            ocupado.set()
+            liberar.wait(5)
+
+        with mock.patch.object(auditoria, "_guardar", side_effect=guardar), mock.patch.object(
+            auditoria.atexit, "register"
+        ):
+            escritor = auditoria._Escritor()
+            escritor.cola.put([HistorialAccion(detalle="a")])
+            self.assertTrue(ocupado.wait(5))
+            escritor.cola.put([HistorialAccion(detalle="b")])
+            escritor.cola.put([HistorialAccion(detalle="c")])
+            liberar.set()
+            escritor.detener()
+
+        self.assertFalse(escritor.hilo.is_alive())
+        self.assertEqual(guardados, [["a"], ["b", "c"]])
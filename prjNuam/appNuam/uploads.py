@@ -0,0 +1,243 @@
+"""
+Almacenamiento de subidas por partes (chunked) y reanudables para ``ArchivoFuente``.
+
+Cada subida se escribe en ``MEDIA_ROOT/uploads/parciales/<id>.part``. El cliente
+envía fragmentos con su ``offset``; si la conexión se corta basta con consultar
+el offset actual y continuar desde ahí. El SHA-256 se calcula a medida que llegan
+los fragmentos, sin volver a leer el archivo al terminar.
+
+Los archivos terminados se guardan por contenido (``archivos_fuente/sha256/...``):
+subir dos veces el mismo archivo no duplica el almacenamiento.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivoFuente
+
+
+DIR_PARCIALES = os.path.join("uploads", "parciales")
+DIR_FUENTES = "archivos_fuente"
+BLOQUE_LECTURA = 1024 * 1024
+EXTENSIONES_CARGA = (".csv", ".xlsx", ".xlsm")
+
+ESTADO_SUBIENDO = "subiendo"
+ESTADO_CARGADO = "cargado"
+ESTADO_DUPLICADO = "duplicado"
+ESTADO_ERROR = "error"
+
+
+class OffsetInvalido(Exception):
+    """El fragmento no continúa donde terminó el anterior."""
+
+    def __init__(self, esperado):
+        super().__init__(f"Se esperaba el offset {esperado}.")
+        self.esperado = esperado
+
+
+class HashInvalido(Exception):
+    """El SHA-256 calculado no coincide con el informado por el cliente."""
+
+
+class SubidaFinalizada(Exception):
+    """La subida ya no está en curso (otro request la completó)."""
+
+
+class _HashersEnCurso:
+    """
+    Estado SHA-256 de las subidas activas en este proceso, indexado por id y offset.
+    Si el siguiente fragmento llega a otro worker (o tras un reinicio) el estado se
+    reconstruye leyendo la parte ya escrita en disco, sin pedirla otra vez al cliente.
+    """
+
+    def __init__(self, maximo=256):
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def tomar(self, fuente_id, offset, ruta):
+        with self._lock:
+            entrada = self._datos.pop(fuente_id, None)
+        if entrada and entrada[0] == offset:
+            return entrada[1]
+        hasher = hashlib.sha256()
+        if offset:
+            with open(ruta, "rb") as fh:
+                restante = offset
+                while restante > 0:
+                    bloque = fh.read(min(BLOQUE_LECTURA, restante))
+                    if not bloque:
+                        break
+                    hasher.update(bloque)
+                    restante -= len(bloque)
+        return hasher
+
+    def guardar(self, fuente_id, offset, hasher):
+        with self._lock:
+            self._datos[fuente_id] = (offset, hasher)
+            self._datos.move_to_end(fuente_id)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def descartar(self, fuente_id):
+        with self._lock:
+            self._datos.pop(fuente_id, None)
+
+
+_hashers = _HashersEnCurso()
+
+
+def nombre_seguro(nombre):
+    base = os.path.basename(nombre or "archivo")
+    base = re.sub(r"[^A-Za-z0-9._-]+", "_", base).strip("._")
+    return base[:120] or "archivo"
+
+
+def ruta_absoluta(ruta):
+    """Resuelve una ruta guardada en BD (relativa a MEDIA_ROOT) a ruta de disco."""
+    return ruta if os.path.isabs(ruta) else os.path.join(settings.MEDIA_ROOT, ruta)
+
+
+def iniciar_subida(nombre, tipo_mime=None, usuario=None):
+    """Crea el ``ArchivoFuente`` en estado ``subiendo`` y su archivo parcial vacío."""
+    fuente = ArchivoFuente.objects.create(
+        nombre_original=(nombre or "archivo")[:255],
+        tipo_mime=(tipo_mime or "")[:100] or None,
+        ruta_archivo="",
+        subido_por=usuario if getattr(usuario, "is_authenticated", False) else None,
+        estado_proceso=ESTADO_SUBIENDO,
+    )
+    fuente.ruta_archivo = os.path.join(DIR_PARCIALES, f"{fuente.pk}.part")
+    destino = ruta_absoluta(fuente.ruta_archivo)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    open(destino, "wb").close()
+    fuente.save(update_fields=["ruta_archivo"])
+    return fuente
+
+
+def offset_actual(fuente):
+    """Bytes ya recibidos de una subida en curso."""
+    try:
+        return os.path.getsize(ruta_absoluta(fuente.ruta_archivo))
+    except OSError:
+        return 0
+
+
+def _bloquear(fuente):
+    """
+    Toma el lock de fila de la subida (dentro de una transacción) y recarga su
+    ruta y estado; los fragmentos y el cierre de una misma subida se serializan.
+    """
+    fila = (
+        ArchivoFuente.objects.select_for_update()
+        .filter(pk=fuente.pk)
+        .values_list("ruta_archivo", "estado_proceso")
+        .first()
+    )
+    if fila is None or fila[1] != ESTADO_SUBIENDO:
+        raise SubidaFinalizada()
+    fuente.ruta_archivo, fuente.estado_proceso = fila
+
+
+def agregar_fragmento(fuente, offset, fragmentos):
+    """
+    Añade al archivo parcial los bytes de ``fragmentos`` (iterable de bytes, p. ej.
+    ``UploadedFile.chunks()``) si ``offset`` coincide con lo ya recibido.
+    Devuelve el nuevo offset.
+
+    El offset se verifica con el lock de la subida tomado: dos reintentos simultáneos
+    del mismo fragmento no pueden escribirlo dos veces.
+    """
+    with transaction.atomic():
+        _bloquear(fuente)
+        ruta = ruta_absoluta(fuente.ruta_archivo)
+        esperado = offset_actual(fuente)
+        if offset != esperado:
+            raise OffsetInvalido(esperado)
+
+        hasher = _hashers.tomar(fuente.pk, offset, ruta)
+        with open(ruta, "ab") as fh:
+            for bloque in fragmentos:
+                fh.write(bloque)
+                hasher.update(bloque)
+                offset += len(bloque)
+        _hashers.guardar(fuente.pk, offset, hasher)
+    return offset
+
+
+def ruta_por_contenido(digest, nombre):
+    """Ruta relativa direccionada por contenido: ``archivos_fuente/sha256/ab/<hash>.<ext>``."""
+    extension = os.path.splitext(nombre_seguro(nombre))[1].lower()
+    return os.path.join(DIR_FUENTES, "sha256", digest[:2], f"{digest}{extension}")
+
+
+def finalizar_subida(fuente, sha256_esperado=None):
+    """
+    Cierra la subida: verifica el hash y guarda el archivo en su ruta por contenido.
+    Si ese contenido ya estaba almacenado se descarta la copia nueva y el
+    ``ArchivoFuente`` apunta al archivo existente.
+
+    Devuelve ``(sha256, original)``, donde ``original`` es el ``ArchivoFuente``
+    anterior con el mismo contenido (o ``None`` si es la primera vez).
+
+    Si el hash no coincide, los bytes recibidos se descartan y la subida queda en
+    estado ``error`` antes de lanzar ``HashInvalido``: el cliente debe empezar otra.
+    """
+    with transaction.atomic():
+        _bloquear(fuente)
+        try:
+            return _finalizar_bloqueada(fuente, sha256_esperado)
+        except HashInvalido as exc:
+            _marcar_error(fuente)
+            error = exc
+    raise error
+
+
+def _marcar_error(fuente):
+    try:
+        os.remove(ruta_absoluta(fuente.ruta_archivo))
+    except OSError:
+        pass
+    fuente.estado_proceso = ESTADO_ERROR
+    fuente.save(update_fields=["estado_proceso"])
+
+
+def _finalizar_bloqueada(fuente, sha256_esperado):
+    parcial = ruta_absoluta(fuente.ruta_archivo)
+    digest = _hashers.tomar(fuente.pk, offset_actual(fuente), parcial).hexdigest()
+    _hashers.descartar(fuente.pk)
+    if sha256_esperado and sha256_esperado.lower() != digest:
+        raise HashInvalido(f"El SHA-256 recibido ({digest}) no coincide con el informado.")
+
+    relativa = ruta_por_contenido(digest, fuente.nombre_original)
+    destino = ruta_absoluta(relativa)
+    original = (
+        ArchivoFuente.objects.filter(ruta_archivo=relativa)
+        .exclude(pk=fuente.pk)
+        .order_by("id")
+        .first()
+    )
+    if original is not None and os.path.exists(destino):
+        os.remove(parcial)
+    else:
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(parcial, destino)
+        original = None
+
+    fuente.ruta_archivo = relativa
+    fuente.estado_proceso = ESTADO_DUPLICADO if original else ESTADO_CARGADO
+    fuente.fecha_subida = timezone.now()
+    fuente.save(update_fields=["ruta_archivo", "estado_proceso", "fecha_subida"])
+    return digest, original
+
+
+def es_archivo_de_carga(fuente):
+    """Indica si el archivo debe pasar por el motor de carga masiva."""
+    return os.path.splitext(fuente.nombre_original or "")[1].lower() in EXTENSIONES_CARGA
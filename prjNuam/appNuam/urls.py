@@ -31,8 +31,10 @@ from .views import (
     SupervisorDashboardView,
     SupervisorCalificacionEstadoUpdateView,
     indicador_timeseries_api,
+    indicadores_batch_api,
     landing_indicadores_view,
     GenerarReporteCalificacionesView,
+    GenerarReportesLoteView,
 )
 
 urlpatterns = [
@@ -46,6 +48,7 @@ urlpatterns = [
 
     # PDF Reports
     path("reportes/calificaciones/<int:id_emisor>/", GenerarReporteCalificacionesView.as_view(), name="reporte_calificaciones_pdf"),
+    path("reportes/calificaciones/lote/", GenerarReportesLoteView.as_view(), name="reporte_calificaciones_lote"),
 
     # API indicadores económicos
     path(
@@ -53,6 +56,7 @@ urlpatterns = [
         indicador_timeseries_api,
         name="indicador_timeseries_api",
     ),
+    path("api/indicadores/", indicadores_batch_api, name="indicadores_batch_api"),
 
     # ADMIN_TI
     path("admin-ti/dashboard/", AdminTiDashboardView.as_view(), name="admin_ti_dashboard"),
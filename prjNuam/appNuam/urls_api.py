@@ -1,13 +1,23 @@
 from rest_framework import routers
 from django.urls import path
 
-from .views_api import CalificacionViewSet, RegisterInvestorView, RegisterShareholderView
+from .views_api import CalificacionBulkView, CalificacionExportView, CalificacionViewSet, CargaProgresoView, HistorialAccionListView, ProveedoresIndicadoresView, RegisterInvestorView, RegisterShareholderView, TokenRefreshView, TokenRevocarView, TokenView
 
 router = routers.DefaultRouter()
 router.register(r"calificaciones", CalificacionViewSet)
 
 urlpatterns = [
+    # Deben ir antes del router para que "export"/"bulk" no se interpreten como pk
+    path('calificaciones/export/', CalificacionExportView.as_view(), name='api_calificaciones_export'),
+    path('calificaciones/bulk/', CalificacionBulkView.as_view(), name='api_calificaciones_bulk'),
+    path('calificaciones/<int:calificacion_id>/historial/', HistorialAccionListView.as_view(), name='api_calificacion_historial'),
+    path('historial/', HistorialAccionListView.as_view(), name='api_historial'),
     path('auth/register-investor/', RegisterInvestorView.as_view(), name='api_register_investor'),
     path('auth/register-shareholder/', RegisterShareholderView.as_view(), name='api_register_shareholder'),
+    path('auth/token/', TokenView.as_view(), name='api_token'),
+    path('auth/token/refresh/', TokenRefreshView.as_view(), name='api_token_refresh'),
+    path('auth/token/revocar/', TokenRevocarView.as_view(), name='api_token_revocar'),
+    path('cargas/<int:id_carga>/progreso/', CargaProgresoView.as_view(), name='api_carga_progreso'),
+    path('indicadores/proveedores/', ProveedoresIndicadoresView.as_view(), name='api_indicadores_proveedores'),
 ] + router.urls
 
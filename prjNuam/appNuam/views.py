@@ -1,17 +1,20 @@
-from datetime import date, timedelta
-import hashlib
 import logging
-import os
 
-import requests
 from requests import exceptions as req_exceptions
 from django.contrib.auth import logout, login as auth_login
+from django.conf import settings
 from django.contrib import messages
+from django.db.models import Q, Value
+from django.db.models.functions import Replace
 from django.utils import timezone
-from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
 from django.views.generic import CreateView, ListView, TemplateView, UpdateView, DeleteView
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 
 from .forms import (
@@ -24,6 +27,8 @@ from .forms import (
     SupervisorEstadoForm,
 )
 from .models import (
+    ESTADO_PROCESO_CALIF_CHOICES,
+    ESTADO_REGISTRO_CHOICES,
     CalificacionTributaria,
     Emisor,
     EmisorContador,
@@ -35,9 +40,29 @@ from .models import (
     Accionista,
     Inversionista,
     Documento,
-    HistorialAccion,
+    ArchivoFuente,
 )
+from .pagination import pagina_por_clave
+from .passwords import hashear_password, simular_verificacion, usuarios_demo, verificar_password
 from .permissions import RoleRequiredMixin, _role_names
+from . import auditoria, uploads
+from .cargas import carga_previa, encolar_carga
+from .circuitos import CircuitoAbierto
+from .intentos_login import ip_cliente, limite_superado, registrar_fallo
+from .intentos_login import limpiar as limpiar_intentos
+from .indicadores import (
+    AGRUPACIONES,
+    INDICADORES,
+    ConsultaEnCurso,
+    fetch_indicador,
+    obtener_serie,
+    obtener_series,
+    serie_local,
+    serie_local_al_dia,
+)
+from .reportes import REPORTES_LOTE_MAX, abrir_reporte, obtener_reporte, version_reporte, zip_lote
+from .resumen import conteo_calificaciones
+from .views_api import filtrar_calificaciones
 
 from django.db import transaction
 from django.contrib.auth import login as auth_login
@@ -45,43 +70,8 @@ from django.contrib.auth import login as auth_login
 
 logger = logging.getLogger(__name__)
 
-
-# Configuración de indicadores disponibles por país
-INDICADORES = {
-    "chile": {
-        "usd": {
-            "tipo": "fx",
-            "symbol": "CLP",
-            "descripcion": "1 USD en CLP",
-        },
-        "uf": {
-            "tipo": "mindicador",
-            "endpoint": "https://mindicador.cl/api/uf",
-            "descripcion": "UF",
-        },
-        "utm": {
-            "tipo": "mindicador",
-            "endpoint": "https://mindicador.cl/api/utm",
-            "descripcion": "UTM",
-        },
-    },
-    "colombia": {
-        "usd": {
-            "tipo": "fx",
-            "symbol": "COP",
-            "descripcion": "1 USD en COP",
-        }
-        # Espacio para agregar más indicadores en el futuro
-    },
-    "peru": {
-        "usd": {
-            "tipo": "fx",
-            "symbol": "PEN",
-            "descripcion": "1 USD en PEN",
-        }
-        # Espacio para agregar más indicadores en el futuro
-    },
-}
+# Relaciones que muestran los listados de calificaciones (Instrumento.__str__ también lee su emisor)
+CALIFICACION_RELACIONADOS = ("emisor", "instrumento__emisor")
 
 
 def landing_indicadores_view(request):
@@ -97,7 +87,7 @@ def crear_calificacion(request):
     form = CalificacionTributariaForm(request.POST or None, usuario=request.user)
     if request.method == "POST" and form.is_valid():
         calif = form.save()
-        _registrar_historial(calif, request.user, "CREACION", "Creación de calificación tributaria")
+        auditoria.registrar(calif, request.user, "CREACION", "Creación de calificación tributaria")
         messages.success(
             request,
             "La calificación tributaria fue creada correctamente y está en estado Pendiente. "
@@ -107,101 +97,53 @@ def crear_calificacion(request):
     return render(request, "templatesApp/calificaciones/crear.html", {"form": form})
 
 
-def _fetch_fx_timeseries(symbol: str) -> tuple[list[str], list[float]]:
+def _parametros_serie(request):
     """
-    Obtiene serie de tiempo (últimos ~30 días) para una moneda con exchangerate.host.
-    Requiere ACCESS_KEY si la API lo exige (EXCHANGE_API_KEY en .env).
+    Lee ``desde``, ``hasta`` y ``agrupar`` de la query string.
+    Devuelve ``(desde, hasta, agrupar)`` o un ``JsonResponse`` 400.
     """
-    end_date = date.today()
-    start_date = end_date - timedelta(days=32)
-    access_key = os.getenv("EXCHANGE_API_KEY")
-    if not access_key:
-        raise ValueError("Falta configurar EXCHANGE_API_KEY para consultar exchangerate.host")
-
-    url = "https://api.exchangerate.host/timeseries"
-    params = {
-        "start_date": start_date.isoformat(),
-        "end_date": end_date.isoformat(),
-        "base": "USD",
-        "symbols": symbol,
-        "access_key": access_key,
-    }
-
-    resp = requests.get(url, params=params, timeout=10)
-    resp.raise_for_status()
-    try:
-        payload = resp.json()
-    except ValueError as exc:
-        raise ValueError(f"No se pudo leer JSON de exchangerate.host: {exc}") from exc
-
-    if payload.get("success") is False:
-        err = payload.get("error", {})
-        msg = err.get("info") or err or "API exchangerate.host respondió sin éxito"
-        raise ValueError(f"API exchangerate.host: {msg}")
-
-    if not payload.get("rates"):
-        raise ValueError("No se encontraron datos de tasas de cambio")
-
-    sorted_dates = sorted(payload["rates"].keys())
-    labels = []
-    values = []
-    for date_key in sorted_dates:
-        rate_info = payload["rates"].get(date_key, {})
-        value = rate_info.get(symbol)
-        if value is not None:
-            labels.append(date_key)
-            values.append(value)
-
-    if not values:
-        raise ValueError("La API no devolvió valores válidos para el indicador solicitado")
-
-    return labels, values
-
-
-def _fetch_mindicador_timeseries(endpoint: str) -> tuple[list[str], list[float]]:
-    """Obtiene serie de tiempo (últimos ~30 puntos) desde mindicador.cl."""
-    resp = requests.get(endpoint, timeout=10)
-    resp.raise_for_status()
+    agrupar = request.GET.get("agrupar", "dia")
+    if agrupar not in AGRUPACIONES:
+        return JsonResponse({"error": "agrupar debe ser dia, semana o mes"}, status=400)
     try:
-        payload = resp.json()
-    except ValueError as exc:
-        raise ValueError(f"No se pudo leer JSON de mindicador.cl: {exc}") from exc
-
-    serie = payload.get("serie", [])
-    if not serie:
-        raise ValueError("No se encontraron datos en la API de mindicador.cl")
-
-    # Tomamos los últimos ~30 elementos y los ordenamos por fecha ascendente
-    last_points = sorted(serie[:30], key=lambda item: item.get("fecha"))
-    labels = [item["fecha"][:10] for item in last_points if "fecha" in item]
-    values = [item["valor"] for item in last_points if "valor" in item]
-
-    if not values:
-        raise ValueError("La API de mindicador.cl no devolvió valores válidos")
-
-    return labels, values
-
-
-def _registrar_historial(calif: CalificacionTributaria, usuario, accion: str, detalle: str = ""):
+        desde = parse_date(request.GET["desde"]) if request.GET.get("desde") else None
+        hasta = parse_date(request.GET["hasta"]) if request.GET.get("hasta") else None
+    except ValueError:
+        desde = hasta = None
+    if (request.GET.get("desde") and desde is None) or (request.GET.get("hasta") and hasta is None):
+        return JsonResponse({"error": "desde y hasta deben tener formato YYYY-MM-DD"}, status=400)
+    return desde, hasta, agrupar
+
+
+def _error_indicador(exc):
+    """Traduce un error al consultar una API externa a ``(mensaje, status)``."""
+    if isinstance(exc, (CircuitoAbierto, ConsultaEnCurso)):
+        return str(exc), 503
+    if isinstance(exc, req_exceptions.RequestException):
+        return f"Error al consultar API externa: {exc}", 502
+    if isinstance(exc, ValueError):
+        return str(exc), 502
+    return f"Error inesperado: {exc}", 500  # cobertura defensiva
+
+
+def _responder_local(pais, codigo, labels, desde, hasta):
     """
-    Registra una entrada de historial para trazabilidad.
-    No revienta el flujo si falla.
+    La tabla local responde si la serie está al día o si se pidió un rango
+    explícito que tiene datos (la API externa solo entrega los últimos días).
     """
-    try:
-        HistorialAccion.objects.create(
-            calificacion=calif,
-            usuario=usuario if getattr(usuario, "is_authenticated", False) else None,
-            accion=accion[:15],
-            detalle=detalle,
-        )
-    except Exception as exc:
-        logger.warning("No se pudo registrar historial: %s", exc)
+    return bool(labels and (desde or hasta)) or serie_local_al_dia(pais, codigo)
 
 
 def indicador_timeseries_api(request, pais: str, codigo: str):
     """
     Devuelve serie temporal para un indicador solicitado.
     Responde JSON con labels (fechas) y data (valores).
+
+    La serie se lee de la tabla local ``indicadores_valores`` (ver
+    ``manage.py sincronizar_indicadores``), con rango opcional ``?desde=`` /
+    ``?hasta=`` (YYYY-MM-DD) y ``?agrupar=dia|semana|mes``. Si la serie no se ha
+    sincronizado o su último valor quedó atrasado se consulta la API externa a
+    través del cache (``indicadores.obtener_serie``). El header X-Cache indica LOCAL/HIT/STALE/MISS.
     """
     pais = (pais or "").lower()
     codigo = (codigo or "").lower()
@@ -212,29 +154,87 @@ def indicador_timeseries_api(request, pais: str, codigo: str):
     indicador_cfg = INDICADORES[pais][codigo]
     descripcion = indicador_cfg["descripcion"]
 
-    try:
-        if indicador_cfg["tipo"] == "fx":
-            labels, data = _fetch_fx_timeseries(indicador_cfg["symbol"])
-        elif indicador_cfg["tipo"] == "mindicador":
-            labels, data = _fetch_mindicador_timeseries(indicador_cfg["endpoint"])
-        else:
-            return JsonResponse({"error": "Tipo de indicador no soportado"}, status=400)
-    except req_exceptions.RequestException as exc:
-        return JsonResponse({"error": f"Error al consultar API externa: {exc}"}, status=502)
-    except ValueError as exc:
-        return JsonResponse({"error": str(exc)}, status=502)
-    except Exception as exc:  # cobertura defensiva
-        return JsonResponse({"error": f"Error inesperado: {exc}"}, status=500)
-
-    return JsonResponse(
+    if indicador_cfg["tipo"] not in ("fx", "mindicador"):
+        return JsonResponse({"error": "Tipo de indicador no soportado"}, status=400)
+
+    params = _parametros_serie(request)
+    if isinstance(params, JsonResponse):
+        return params
+    desde, hasta, agrupar = params
+
+    labels, data = serie_local(pais, codigo, desde, hasta, agrupar)
+    estado_cache = "local"
+    if not _responder_local(pais, codigo, labels, desde, hasta):
+        try:
+            labels, data, estado_cache = obtener_serie(pais, codigo, lambda: fetch_indicador(indicador_cfg))
+        except Exception as exc:
+            mensaje, status = _error_indicador(exc)
+            response = JsonResponse({"error": mensaje}, status=status)
+            if isinstance(exc, (CircuitoAbierto, ConsultaEnCurso)):
+                response["Retry-After"] = str(exc.reintentar_en)
+            return response
+
+    response = JsonResponse(
         {
             "pais": pais,
             "indicador": codigo,
             "descripcion": descripcion,
+            "agrupar": agrupar,
             "labels": labels,
             "data": data,
         }
     )
+    response["X-Cache"] = estado_cache.upper()
+    return response
+
+
+def indicadores_batch_api(request):
+    """
+    Devuelve varias series en una sola respuesta: ``?series=chile:usd,chile:uf``
+    (por defecto todas las configuradas), con los mismos ``desde``/``hasta``/
+    ``agrupar`` que ``indicador_timeseries_api``.
+
+    Las series sin datos locales se consultan a las APIs externas en paralelo
+    (``indicadores.obtener_series``): la latencia es la de la serie más lenta.
+    Un error en una serie se informa en su entrada sin hacer fallar al resto.
+    """
+    params = _parametros_serie(request)
+    if isinstance(params, JsonResponse):
+        return params
+    desde, hasta, agrupar = params
+
+    if request.GET.get("series"):
+        pedidos = []
+        for item in request.GET["series"].split(","):
+            pais, _, codigo = item.strip().lower().partition(":")
+            if pais not in INDICADORES or codigo not in INDICADORES[pais]:
+                return JsonResponse({"error": f"País o indicador no soportado: {item.strip()}"}, status=400)
+            if (pais, codigo) not in pedidos:
+                pedidos.append((pais, codigo))
+    else:
+        pedidos = [(pais, codigo) for pais, indicadores in INDICADORES.items() for codigo in indicadores]
+
+    resultados = {}
+    externas = []
+    for pais, codigo in pedidos:
+        labels, data = serie_local(pais, codigo, desde, hasta, agrupar)
+        if _responder_local(pais, codigo, labels, desde, hasta):
+            resultados[(pais, codigo)] = (labels, data, "local")
+        else:
+            externas.append((pais, codigo))
+    resultados.update(obtener_series(externas))
+
+    series = []
+    for pais, codigo in pedidos:
+        entrada = {"pais": pais, "indicador": codigo, "descripcion": INDICADORES[pais][codigo]["descripcion"]}
+        resultado = resultados[(pais, codigo)]
+        if isinstance(resultado, Exception):
+            entrada["error"] = _error_indicador(resultado)[0]
+        else:
+            labels, data, estado_cache = resultado
+            entrada.update({"agrupar": agrupar, "labels": labels, "data": data, "cache": estado_cache.upper()})
+        series.append(entrada)
+    return JsonResponse({"series": series})
 
 
 # ---------------------------------------------------------------------------
@@ -249,53 +249,62 @@ class LandingView(TemplateView):
 class LoginView(TemplateView):
     template_name = "templatesApp/auth/login.html"
 
-    # TODO: implementar autenticación real (usar Django auth o integración existente)
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        demo_password = os.getenv("DEMO_DEFAULT_PASSWORD", "1234")
-        demo_hash = hashlib.sha256(demo_password.encode("utf-8")).hexdigest()
-
-        usuarios = list(Usuario.objects.all().order_by("username"))
-        for user in usuarios:
-            if getattr(user, "password_hash", None) == demo_hash:
-                user.demo_password = demo_password
-
-        ctx["usuarios_demo"] = usuarios
-        ctx["demo_default_password"] = demo_password
+        # Panel "Credenciales de Prueba": solo si está habilitado y desde una lista corta en cache
+        ctx["mostrar_demo"] = settings.LOGIN_DEMO_USUARIOS
+        if ctx["mostrar_demo"]:
+            ctx["usuarios_demo"] = usuarios_demo()
+            ctx["demo_default_password"] = settings.LOGIN_DEMO_PASSWORD
         return ctx
 
+    def _error(self, mensaje, status=200, **kwargs):
+        ctx = self.get_context_data(**kwargs)
+        ctx["error"] = mensaje
+        return self.render_to_response(ctx, status=status)
+
     def post(self, request, *args, **kwargs):
         username = request.POST.get("username", "").strip()
         password = request.POST.get("password", "")
 
-        ctx = self.get_context_data(**kwargs)
-
         if not username or not password:
-            ctx["error"] = "Debe ingresar usuario y contraseña."
-            return self.render_to_response(ctx)
-
-        try:
-            user = Usuario.objects.get(username=username)
-        except Usuario.DoesNotExist:
-            ctx["error"] = "Usuario o contraseña inválidos."
+            return self._error("Debe ingresar usuario y contraseña.", **kwargs)
+
+        # Demasiados fallos recientes para este username o IP: se corta antes de tocar BD o calcular hashes
+        ip = ip_cliente(request)
+        espera = limite_superado(username, ip)
+        if espera:
+            logger.warning("ADMIN_ALERT login limitado para usuario '%s' desde IP %s", username, ip)
+            mensaje = f"Demasiados intentos fallidos. Intente nuevamente en {max(1, espera // 60)} minuto(s)."
+            response = self._error(mensaje, status=429, **kwargs)
+            response["Retry-After"] = str(espera)
+            return response
+
+        # Camino rápido: una búsqueda por username (índice único) y una verificación de hash;
+        # el contexto de la página solo se arma si hay que volver a mostrar el formulario.
+        user = Usuario.objects.filter(username=username).first()
+        if user is None:
+            simular_verificacion(password)
+            registrar_fallo(username, ip)
             logger.warning("ADMIN_ALERT login failed: usuario '%s' no existe", username)
-            return self.render_to_response(ctx)
+            return self._error("Usuario o contraseña inválidos.", **kwargs)
 
-        candidate_hash = hashlib.sha256(password.encode("utf-8")).hexdigest()
-        if user.password_hash != candidate_hash:
-            ctx["error"] = "Usuario o contraseña inválidos."
+        if not verificar_password(user, password):
             logger.warning("ADMIN_ALERT login failed: contraseña inválida para usuario '%s'", username)
-            return self.render_to_response(ctx)
+            if registrar_fallo(username, ip, user):
+                return self._error("La cuenta fue bloqueada por intentos fallidos; contacte a un administrador.", **kwargs)
+            return self._error("Usuario o contraseña inválidos.", **kwargs)
+
+        limpiar_intentos(user)
 
         estado = (user.estado or "").lower()
         if estado in {"bloqueado", "inactivo"}:
-            ctx["error"] = f"El usuario está {estado}; inicio de sesión bloqueado."
             logger.warning(
                 "ADMIN_ALERT intento de inicio de sesión por usuario %s con estado %s",
                 username,
                 estado,
             )
-            return self.render_to_response(ctx)
+            return self._error(f"El usuario está {estado}; inicio de sesión bloqueado.", **kwargs)
 
         # Autenticar sesión Django con backend custom
         try:
@@ -343,7 +352,7 @@ class RegistroExternoView(CreateView):
             # 1. Crear Usuario
             user = form.save(commit=False)
             password = form.cleaned_data.get("password")
-            user.password_hash = hashlib.sha256(password.encode("utf-8")).hexdigest()
+            user.password_hash = hashear_password(password)
             user.save()
             
             tipo_cuenta = form.cleaned_data.get("tipo_cuenta")
@@ -393,12 +402,13 @@ class AdminTiDashboardView(RoleRequiredMixin, TemplateView):
         ctx = super().get_context_data(**kwargs)
         ctx["total_usuarios"] = Usuario.objects.count()
         ctx["total_emisores"] = Emisor.objects.count()
-        ctx["total_calificaciones"] = CalificacionTributaria.objects.count()
+        conteo = conteo_calificaciones()
+        ctx["total_calificaciones"] = conteo["total"]
         # La BD enum admite: pendiente, terminada, rechazada. Map en_revision/corregida -> pendiente, aprobada -> terminada
-        ctx["calif_pendientes"] = CalificacionTributaria.objects.filter(estado_proceso="pendiente").count()
+        ctx["calif_pendientes"] = conteo["pendiente"]
         ctx["calif_en_revision"] = ctx["calif_pendientes"]
-        ctx["calif_aprobadas"] = CalificacionTributaria.objects.filter(estado_proceso="terminada").count()
-        ctx["calif_rechazadas"] = CalificacionTributaria.objects.filter(estado_proceso="rechazada").count()
+        ctx["calif_aprobadas"] = conteo["terminada"]
+        ctx["calif_rechazadas"] = conteo["rechazada"]
         return ctx
 
 
@@ -466,12 +476,13 @@ class AdminTiEmisorCreateView(RoleRequiredMixin, CreateView):
 class AdminTiEmisorContadoresView(RoleRequiredMixin, TemplateView):
     template_name = "templatesApp/admin/emisor_contadores.html"
     required_roles = ["ADMIN_TI"]
+    max_consultas = 6
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         emisor_id = kwargs.get("id_emisor")
         ctx["emisor"] = Emisor.objects.filter(pk=emisor_id).first()
-        ctx["asignaciones"] = EmisorContador.objects.filter(emisor_id=emisor_id)
+        ctx["asignaciones"] = EmisorContador.objects.filter(emisor_id=emisor_id).select_related("contador")
         return ctx
 
 
@@ -511,12 +522,13 @@ class AdminTiEmisorContadorDeleteView(RoleRequiredMixin, DeleteView):
 class AdminTiEmisorRepresentantesView(RoleRequiredMixin, TemplateView):
     template_name = "templatesApp/admin/emisor_representantes.html"
     required_roles = ["ADMIN_TI"]
+    max_consultas = 6
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         emisor_id = kwargs.get("id_emisor")
         ctx["emisor"] = Emisor.objects.filter(pk=emisor_id).first()
-        ctx["representantes"] = EmisorUsuario.objects.filter(emisor_id=emisor_id)
+        ctx["representantes"] = EmisorUsuario.objects.filter(emisor_id=emisor_id).select_related("usuario")
         return ctx
 
 
@@ -561,32 +573,128 @@ class ContadorDashboardView(RoleRequiredMixin, TemplateView):
         ctx = super().get_context_data(**kwargs)
         emisores_ids = []
         if self.request.user.is_authenticated:
-            emisores_ids = EmisorContador.objects.filter(
-                contador__usuario=self.request.user
-            ).values_list("emisor_id", flat=True)
+            emisores_ids = list(
+                EmisorContador.objects.filter(contador__usuario=self.request.user).values_list("emisor_id", flat=True)
+            )
         base_qs = CalificacionTributaria.objects.filter(emisor_id__in=emisores_ids) if emisores_ids else CalificacionTributaria.objects.all()
         ctx["calificaciones_pendientes"] = base_qs.filter(estado_proceso="pendiente")[:10]
         ctx["total_mis_emisores"] = len(emisores_ids)
-        ctx["mis_calif_pendientes"] = base_qs.filter(estado_proceso="pendiente").count()
+        conteo = conteo_calificaciones(emisores_ids or None)
+        ctx["mis_calif_pendientes"] = conteo["pendiente"]
         ctx["mis_calif_en_revision"] = ctx["mis_calif_pendientes"]
-        ctx["mis_calif_aprobadas"] = base_qs.filter(estado_proceso="terminada").count()
-        ctx["mis_calif_rechazadas"] = base_qs.filter(estado_proceso="rechazada").count()
+        ctx["mis_calif_aprobadas"] = conteo["terminada"]
+        ctx["mis_calif_rechazadas"] = conteo["rechazada"]
+        return ctx
+
+
+# Orden del listado: clave en la URL -> (campo para pagina_por_clave, etiqueta)
+ORDENES_CALIFICACION = {
+    "recientes": ("-id", "Más recientes"),
+    "antiguas": ("id", "Más antiguas"),
+    "anio": ("anio", "Año ascendente"),
+    "-anio": ("-anio", "Año descendente"),
+    "emisor": ("emisor__nombre", "Emisor A-Z"),
+    "-emisor": ("-emisor__nombre", "Emisor Z-A"),
+    "estado": ("estado_proceso", "Estado de proceso"),
+}
+
+
+class CalificacionListadoMixin:
+    """
+    Listado de calificaciones con filtros (``emisor``, ``anio``, ``estado_proceso``,
+    ``estado_registro``, como en la API), búsqueda ``q`` por nombre o RUT del emisor,
+    orden ``orden`` y paginación por clave (``cursor``). Las subclases restringen
+    ``calificaciones_base`` y ``emisores_filtro`` (por defecto, todas y todos).
+
+    El selector de emisor muestra a lo más ``max_emisores_filtro``; con más, el
+    resto se encuentra con la búsqueda ``q``.
+    """
+
+    por_pagina = 50
+    max_por_pagina = 200
+    max_emisores_filtro = 200
+
+    def calificaciones_base(self):
+        return CalificacionTributaria.objects.all()
+
+    def emisores_filtro(self):
+        return Emisor.objects.all()
+
+    def get_queryset(self):
+        queryset = self.calificaciones_base().select_related(*CALIFICACION_RELACIONADOS)
+        self.errores_filtro = None
+        try:
+            queryset = filtrar_calificaciones(queryset, self.request.GET)
+        except ValidationError as exc:
+            self.errores_filtro = exc.detail
+            return queryset.none()
+        texto = self.request.GET.get("q", "").strip()
+        if texto:
+            # RUT con o sin puntos
+            queryset = queryset.annotate(
+                rut_emisor=Replace("emisor__rut", Value("."), Value(""))
+            ).filter(Q(emisor__nombre__icontains=texto) | Q(rut_emisor__icontains=texto.replace(".", "")))
+        return queryset
+
+    def _por_pagina(self):
+        valor = self.request.GET.get("por_pagina", "")
+        return min(int(valor), self.max_por_pagina) if valor.isdigit() and int(valor) > 0 else self.por_pagina
+
+    def _contexto_emisores(self):
+        emisores = self.emisores_filtro().order_by("nombre").only("id", "nombre")
+        lista = list(emisores[: self.max_emisores_filtro + 1])
+        truncado = len(lista) > self.max_emisores_filtro
+        lista = lista[: self.max_emisores_filtro]
+        # El emisor filtrado se mantiene seleccionable aunque quede fuera del límite
+        elegido = self.request.GET.get("emisor", "")
+        if truncado and elegido.isdigit() and all(e.id != int(elegido) for e in lista):
+            lista += list(emisores.filter(pk=int(elegido)))
+        return {"emisores_filtro": lista, "emisores_filtro_truncado": truncado}
+
+    def get_context_data(self, **kwargs):
+        orden = self.request.GET.get("orden")
+        if orden not in ORDENES_CALIFICACION:
+            orden = "recientes"
+        pagina = pagina_por_clave(
+            self.object_list, ORDENES_CALIFICACION[orden][0], self.request.GET.get("cursor"), self._por_pagina()
+        )
+        kwargs["object_list"] = pagina["filas"]
+        ctx = super().get_context_data(**kwargs)
+        params = self.request.GET.copy()
+        params.pop("cursor", None)
+        ctx.update(
+            pagina=pagina,
+            query_filtros=params.urlencode(),
+            filtros=self.request.GET,
+            orden=orden,
+            ordenes=[(clave, etiqueta) for clave, (_, etiqueta) in ORDENES_CALIFICACION.items()],
+            **self._contexto_emisores(),
+            estados_proceso=ESTADO_PROCESO_CALIF_CHOICES,
+            estados_registro=ESTADO_REGISTRO_CHOICES,
+            errores_filtro=self.errores_filtro,
+        )
         return ctx
 
 
-class ContadorCalificacionListView(RoleRequiredMixin, ListView):
+class ContadorCalificacionListView(RoleRequiredMixin, CalificacionListadoMixin, ListView):
     template_name = "templatesApp/contador/calificaciones_list.html"
     required_roles = ["CONTADOR", "ANALISTA"]
+    max_consultas = 6
     model = CalificacionTributaria
     context_object_name = "calificaciones"
 
-    def get_queryset(self):
+    def _emisores_ids(self):
+        return EmisorContador.objects.filter(contador__usuario=self.request.user).values_list("emisor_id", flat=True)
+
+    def calificaciones_base(self):
         if not self.request.user.is_authenticated:
             return CalificacionTributaria.objects.none()
-        emisores_ids = EmisorContador.objects.filter(
-            contador__usuario=self.request.user
-        ).values_list("emisor_id", flat=True)
-        return CalificacionTributaria.objects.filter(emisor_id__in=emisores_ids)
+        return CalificacionTributaria.objects.filter(emisor_id__in=self._emisores_ids())
+
+    def emisores_filtro(self):
+        if not self.request.user.is_authenticated:
+            return Emisor.objects.none()
+        return Emisor.objects.filter(id__in=self._emisores_ids())
 
 
 class ContadorCalificacionCreateView(RoleRequiredMixin, CreateView):
@@ -643,23 +751,22 @@ class SupervisorDashboardView(RoleRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        ctx["calif_pendientes"] = CalificacionTributaria.objects.filter(estado_proceso="pendiente").count()
+        conteo = conteo_calificaciones()
+        ctx["calif_pendientes"] = conteo["pendiente"]
         ctx["calif_en_revision"] = ctx["calif_pendientes"]
-        ctx["calif_aprobadas"] = CalificacionTributaria.objects.filter(estado_proceso="terminada").count()
-        ctx["calif_rechazadas"] = CalificacionTributaria.objects.filter(estado_proceso="rechazada").count()
-        ctx["calif_total"] = CalificacionTributaria.objects.count()
+        ctx["calif_aprobadas"] = conteo["terminada"]
+        ctx["calif_rechazadas"] = conteo["rechazada"]
+        ctx["calif_total"] = conteo["total"]
         return ctx
 
 
-class SupervisorCalificacionListView(RoleRequiredMixin, ListView):
+class SupervisorCalificacionListView(RoleRequiredMixin, CalificacionListadoMixin, ListView):
     template_name = "templatesApp/supervisor/calificaciones_list.html"
     required_roles = ["SUPERVISOR"]
+    max_consultas = 6
     model = CalificacionTributaria
     context_object_name = "calificaciones"
 
-    def get_queryset(self):
-        return CalificacionTributaria.objects.all()
-
 
 class SupervisorCalificacionEstadoUpdateView(RoleRequiredMixin, UpdateView):
     template_name = "templatesApp/supervisor/calificacion_estado_form.html"
@@ -674,7 +781,7 @@ class SupervisorCalificacionEstadoUpdateView(RoleRequiredMixin, UpdateView):
         calif.fecha_modificacion = timezone.now()
         calif.save()
         form.save_m2m()
-        _registrar_historial(
+        auditoria.registrar(
             calif,
             self.request.user,
             "ESTADO_SUP",
@@ -687,6 +794,7 @@ class SupervisorCalificacionEstadoUpdateView(RoleRequiredMixin, UpdateView):
 class AccionistaDashboardView(RoleRequiredMixin, TemplateView):
     template_name = "templatesApp/accionista/dashboard.html"
     required_roles = ["ACCIONISTA"]
+    max_consultas = 6
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
@@ -697,7 +805,9 @@ class AccionistaDashboardView(RoleRequiredMixin, TemplateView):
         
         emisor_ids = EmisorUsuario.objects.filter(usuario=self.request.user).values_list("emisor_id", flat=True)
         ctx["emisores"] = Emisor.objects.filter(id__in=emisor_ids)
-        ctx["calificaciones"] = CalificacionTributaria.objects.filter(emisor_id__in=emisor_ids)[:20]
+        ctx["calificaciones"] = CalificacionTributaria.objects.filter(emisor_id__in=emisor_ids).select_related(
+            "emisor", "instrumento"
+        )[:20]
         return ctx
 
 
@@ -718,79 +828,220 @@ class InversionistaDashboardView(RoleRequiredMixin, TemplateView):
         return context
 
 
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from django.http import FileResponse
-import io
-
 class GenerarReporteCalificacionesView(RoleRequiredMixin, APIView):
+    """
+    Descarga el PDF de calificaciones vigentes de un emisor.
+    El PDF se genera una vez por versión de datos (ver ``reportes.py``) y se
+    sirve con ETag/Last-Modified; un GET condicional vigente responde 304.
+    """
+
     required_roles = ["INVERSIONISTA", "ACCIONISTA"] # Allow both
 
     def get(self, request, id_emisor):
-        emisor = Emisor.objects.get(pk=id_emisor)
-        calificaciones = CalificacionTributaria.objects.filter(emisor=emisor, estado_registro="vigente")
-
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        p.setTitle(f"Reporte Calificaciones - {emisor.nombre}")
-
-        # Header
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, 750, f"Reporte de Calificaciones Tributarias")
-        p.setFont("Helvetica", 12)
-        p.drawString(50, 730, f"Emisor: {emisor.nombre}")
-        p.drawString(50, 715, f"RUT: {emisor.rut}")
-        
-        y = 680
-        
-        if not calificaciones.exists():
-            p.setFont("Helvetica-Bold", 14)
-            p.drawString(50, y, "Sin Calificaciones")
-        else:
-            p.setFont("Helvetica-Bold", 12)
-            p.drawString(50, y, "Año")
-            p.drawString(100, y, "Instrumento")
-            p.drawString(300, y, "Monto")
-            p.drawString(400, y, "Factor")
-            p.drawString(500, y, "Rating")
-            y -= 20
-            p.line(50, y+15, 550, y+15)
-            
-            p.setFont("Helvetica", 10)
-            for cal in calificaciones:
-                instr_nombre = cal.instrumento.nombre if cal.instrumento else "N/A"
-                p.drawString(50, y, str(cal.anio))
-                p.drawString(100, y, instr_nombre[:35]) # Truncate if long
-                p.drawString(300, y, str(cal.monto))
-                p.drawString(400, y, str(cal.factor) if cal.factor else "-")
-                p.drawString(500, y, cal.rating or "-")
-                y -= 20
-                
-                if y < 50:
-                    p.showPage()
-                    y = 750
-
-        p.showPage()
-        p.save()
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename=f"reporte_{emisor.id}.pdf")
+        resultado = version_reporte(id_emisor)
+        if resultado is None:
+            raise Http404("Emisor no encontrado")
+        emisor, version, ultima = resultado
+        etag = f'"{version}"'
+
+        ultima = int(ultima.timestamp()) if ultima else None
+
+        no_modificado = get_conditional_response(request, etag=etag, last_modified=ultima)
+        if no_modificado is not None:
+            return no_modificado
+
+        ruta = obtener_reporte(emisor, version, request.user)
+        response = FileResponse(
+            abrir_reporte(ruta, emisor.pk), as_attachment=True, filename=f"reporte_{emisor.id}.pdf"
+        )
+        response["ETag"] = etag
+        if ultima is not None:
+            response["Last-Modified"] = http_date(ultima)
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+
+class GenerarReportesLoteView(RoleRequiredMixin, APIView):
+    """
+    Reportes de varios emisores en un ZIP: ``?emisores=1,2,3``.
+    Los PDF se generan en paralelo en el pool de procesos compartido
+    (``reportes.zip_lote``) y el ZIP se transmite a medida que cada uno termina.
+    """
+
+    required_roles = ["INVERSIONISTA", "ACCIONISTA", "SUPERVISOR", "ADMIN_TI"]
 
+    def get(self, request):
+        try:
+            ids = list(dict.fromkeys(int(v) for v in request.GET.get("emisores", "").split(",") if v.strip()))
+        except ValueError:
+            return JsonResponse({"error": "emisores debe ser una lista de ids separados por coma."}, status=400)
+        if not ids:
+            return JsonResponse({"error": "Indique al menos un emisor (?emisores=1,2,3)."}, status=400)
+        if len(ids) > REPORTES_LOTE_MAX:
+            return JsonResponse({"error": f"Máximo {REPORTES_LOTE_MAX} emisores por lote."}, status=400)
+        existentes = set(Emisor.objects.filter(pk__in=ids).values_list("pk", flat=True))
+        faltantes = [i for i in ids if i not in existentes]
+        if faltantes:
+            return JsonResponse({"error": "Emisores no encontrados", "emisores": faltantes}, status=404)
+
+        response = StreamingHttpResponse(zip_lote(ids, request.user), content_type="application/zip")
+        response["Content-Disposition"] = 'attachment; filename="reportes_calificaciones.zip"'
+        return response
 
 
 class EmisorCalificacionesView(RoleRequiredMixin, TemplateView):
     template_name = "templatesApp/emisor/calificaciones.html"
     required_roles = ["ACCIONISTA", "INVERSIONISTA"]
+    max_consultas = 6
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         emisor_id = kwargs.get("id_emisor")
         ctx["emisor"] = Emisor.objects.filter(pk=emisor_id).first()
-        ctx["calificaciones"] = CalificacionTributaria.objects.filter(emisor_id=emisor_id)
+        ctx["calificaciones"] = CalificacionTributaria.objects.filter(emisor_id=emisor_id).select_related(
+            *CALIFICACION_RELACIONADOS
+        )
         return ctx
 
 
 class EmisorArchivoUploadView(RoleRequiredMixin, TemplateView):
+    """
+    Subida de archivos del emisor a ``ArchivoFuente``.
+
+    Protocolo por partes (usado por el JS de la plantilla):
+      - POST accion=iniciar, nombre, tipo_mime -> {upload_id, offset}
+      - GET ?upload_id=N -> {upload_id, offset, estado} para reanudar tras un corte
+        (410 con el ``estado`` si la subida ya terminó o falló)
+      - POST accion=fragmento, upload_id, offset, total, chunk (archivo) [, sha256]
+        -> {offset, completo, sha256, carga_id, duplicado_de}; si el SHA-256 no
+        coincide, 422 con ``estado="error"`` (la subida se descarta)
+    Si el contenido ya existía se reutiliza el archivo guardado y, si el mismo usuario ya lo
+    cargó para este emisor, también su carga previa.
+    Un POST clásico con el campo ``archivo`` se guarda con el mismo mecanismo.
+    """
+
     template_name = "templatesApp/emisor/archivo_upload.html"
     required_roles = ["ACCIONISTA", "INVERSIONISTA"]
 
-    # TODO: implementar formulario de carga y permisos vinculados a emisor_usuario
+    def _puede_subir(self, emisor_id):
+        user = self.request.user
+        if not user.is_authenticated:
+            return False
+        return EmisorUsuario.objects.filter(emisor_id=emisor_id, usuario=user).exists()
+
+    def _subida_del_usuario(self, upload_id):
+        return ArchivoFuente.objects.filter(
+            pk=upload_id, subido_por=self.request.user, estado_proceso=uploads.ESTADO_SUBIENDO
+        ).first()
+
+    def _finalizar(self, fuente, emisor_id, sha256=None):
+        """
+        Cierra la subida y encola su carga. Devuelve ``(sha256, carga, previa)``; ``previa``
+        es la carga de este mismo usuario y emisor que se reutiliza por tener igual contenido.
+        """
+        digest, original = uploads.finalizar_subida(fuente, sha256_esperado=sha256)
+        carga = previa = None
+        if uploads.es_archivo_de_carga(fuente):
+            # Un archivo idéntico ya cargado por el mismo usuario para el emisor no se vuelve a procesar
+            previa = carga_previa(original, emisor_id, self.request.user) if original else None
+            carga = previa or encolar_carga(fuente, emisor_id, self.request.user)
+        logger.info(
+            "Archivo fuente %s subido para emisor %s (sha256=%s, duplicado_de=%s)",
+            fuente.pk,
+            emisor_id,
+            digest,
+            original.pk if original else None,
+        )
+        return digest, carga, previa
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["emisor"] = Emisor.objects.filter(pk=kwargs.get("id_emisor")).first()
+        ctx["chunk_size"] = settings.UPLOAD_CHUNK_SIZE
+        return ctx
+
+    def get(self, request, *args, **kwargs):
+        upload_id = request.GET.get("upload_id")
+        if upload_id is None:
+            return super().get(request, *args, **kwargs)
+        if not self._puede_subir(kwargs["id_emisor"]):
+            return JsonResponse({"error": "No tiene permisos sobre este emisor."}, status=403)
+        fuente = (
+            ArchivoFuente.objects.filter(pk=upload_id, subido_por=request.user).first()
+            if upload_id.isdigit()
+            else None
+        )
+        if fuente is None:
+            return JsonResponse({"error": "Subida no encontrada."}, status=404)
+        if fuente.estado_proceso != uploads.ESTADO_SUBIENDO:
+            return JsonResponse(
+                {"error": "La subida ya no está en curso.", "upload_id": fuente.pk, "estado": fuente.estado_proceso},
+                status=410,
+            )
+        return JsonResponse(
+            {"upload_id": fuente.pk, "offset": uploads.offset_actual(fuente), "estado": fuente.estado_proceso}
+        )
+
+    def post(self, request, *args, **kwargs):
+        emisor_id = kwargs["id_emisor"]
+        if not self._puede_subir(emisor_id):
+            return JsonResponse({"error": "No tiene permisos sobre este emisor."}, status=403)
+
+        accion = request.POST.get("accion")
+        if accion == "iniciar":
+            fuente = uploads.iniciar_subida(
+                request.POST.get("nombre"), request.POST.get("tipo_mime"), usuario=request.user
+            )
+            return JsonResponse({"upload_id": fuente.pk, "offset": 0}, status=201)
+
+        if accion == "fragmento":
+            try:
+                upload_id = int(request.POST.get("upload_id", ""))
+                offset = int(request.POST.get("offset", ""))
+                total = int(request.POST.get("total", ""))
+            except ValueError:
+                return JsonResponse({"error": "upload_id, offset y total deben ser enteros."}, status=400)
+            fuente = self._subida_del_usuario(upload_id)
+            chunk = request.FILES.get("chunk")
+            if fuente is None or chunk is None:
+                return JsonResponse({"error": "Subida no encontrada o fragmento vacío."}, status=404)
+            try:
+                offset = uploads.agregar_fragmento(fuente, offset, chunk.chunks())
+            except uploads.OffsetInvalido as exc:
+                return JsonResponse({"error": str(exc), "offset": exc.esperado}, status=409)
+            except uploads.SubidaFinalizada:
+                return JsonResponse({"error": "Subida no encontrada o ya finalizada."}, status=404)
+
+            respuesta = {"upload_id": fuente.pk, "offset": offset, "completo": offset >= total}
+            if offset >= total:
+                try:
+                    digest, carga, previa = self._finalizar(fuente, emisor_id, request.POST.get("sha256"))
+                except uploads.HashInvalido as exc:
+                    return JsonResponse(
+                        {"error": str(exc), "upload_id": fuente.pk, "estado": uploads.ESTADO_ERROR}, status=422
+                    )
+                except uploads.SubidaFinalizada:
+                    return JsonResponse({"error": "Subida no encontrada o ya finalizada."}, status=404)
+                respuesta.update(
+                    {
+                        "sha256": digest,
+                        "carga_id": carga.pk if carga else None,
+                        "duplicado_de": previa.archivo_fuente_id if previa else None,
+                    }
+                )
+            return JsonResponse(respuesta)
+
+        archivo = request.FILES.get("archivo")
+        if archivo is None:
+            messages.error(request, "Debe seleccionar un archivo.")
+            return redirect("emisor_archivo_upload", id_emisor=emisor_id)
+        fuente = uploads.iniciar_subida(archivo.name, archivo.content_type, usuario=request.user)
+        uploads.agregar_fragmento(fuente, 0, archivo.chunks())
+        _digest, carga, previa = self._finalizar(fuente, emisor_id)
+        if previa:
+            messages.success(request, f"El archivo ya había sido subido; se muestra el resultado de la carga #{carga.pk}.")
+        elif carga:
+            messages.success(request, f"Archivo recibido; la carga #{carga.pk} se procesará en segundo plano.")
+        else:
+            messages.success(request, "Archivo recibido correctamente.")
+        return redirect("emisor_archivo_upload", id_emisor=emisor_id)
@@ -44,6 +44,15 @@ AUTHENTICATION_BACKENDS = [
 
 LAST_LOGIN_FIELD = None  # evita escribir un campo last_login inexistente
 
+# La API acepta JWT (appNuam.sesiones_jwt) además de la sesión del sitio web
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'appNuam.sesiones_jwt.JWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+}
+
 # CSRF para entorno local
 CSRF_TRUSTED_ORIGINS = [
     'http://127.0.0.1:8000',
@@ -52,12 +61,14 @@ CSRF_TRUSTED_ORIGINS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'appNuam.presupuesto_consultas.PresupuestoConsultasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'appNuam.auditoria.AuditoriaMiddleware',
 ]
 
 ROOT_URLCONF = 'prjNuam.urls'
@@ -126,6 +137,47 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hash de contraseñas (ver appNuam/passwords.py): algoritmo preferido 'pbkdf2', 'scrypt' o 'argon2'
+# (este último requiere argon2-cffi) y factores de trabajo (0 = valor por defecto de Django).
+# Los hashes antiguos o con otro costo se actualizan al iniciar sesión. Medir con: manage.py medir_hashers
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', '0'))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', '0'))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv('PASSWORD_ARGON2_TIME_COST', '0'))
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'appNuam.passwords.PBKDF2PasswordHasher',
+    'scrypt': 'appNuam.passwords.ScryptPasswordHasher',
+    'argon2': 'appNuam.passwords.Argon2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    ruta for nombre, ruta in _PASSWORD_HASHERS.items() if nombre != PASSWORD_HASHER
+]
+
+# Panel "Credenciales de Prueba" de la página de login (solo para demos): se muestra si
+# LOGIN_DEMO_USUARIOS está activo, con hasta LOGIN_DEMO_MAX usuarios cacheados LOGIN_DEMO_CACHE_TTL segundos.
+LOGIN_DEMO_USUARIOS = os.getenv('LOGIN_DEMO_USUARIOS', '1' if DEBUG else '').lower() in ('1', 'true', 'yes')
+LOGIN_DEMO_PASSWORD = os.getenv('DEMO_DEFAULT_PASSWORD', '1234')
+LOGIN_DEMO_MAX = int(os.getenv('LOGIN_DEMO_MAX', '20'))
+LOGIN_DEMO_CACHE_TTL = int(os.getenv('LOGIN_DEMO_CACHE_TTL', '300'))
+
+# Límite de logins fallidos (ventana deslizante en el cache compartido) por username y por IP;
+# con LOGIN_BLOQUEO_UMBRAL fallos en LOGIN_BLOQUEO_VENTANA segundos la cuenta queda bloqueada.
+LOGIN_VENTANA = int(os.getenv('LOGIN_VENTANA', '900'))
+LOGIN_MAX_FALLOS_USUARIO = int(os.getenv('LOGIN_MAX_FALLOS_USUARIO', '5'))
+LOGIN_MAX_FALLOS_IP = int(os.getenv('LOGIN_MAX_FALLOS_IP', '20'))
+LOGIN_BLOQUEO_UMBRAL = int(os.getenv('LOGIN_BLOQUEO_UMBRAL', '10'))
+LOGIN_BLOQUEO_VENTANA = int(os.getenv('LOGIN_BLOQUEO_VENTANA', '86400'))
+# IPs o redes (CIDR) de los proxies reversos propios, separadas por coma. Solo para conexiones que
+# vienen de ellos se toma la IP del cliente desde X-Forwarded-For (límite de logins por IP).
+PROXIES_CONFIABLES = [v for v in os.getenv('PROXIES_CONFIABLES', '').split(',') if v.strip()]
+
+# Tokens JWT de la API: access corto con usuario y roles, refresh = duración de la fila en `sesiones`.
+# Las sesiones revocadas se recargan en memoria al cambiar de versión o cada JWT_REVOCADAS_TTL segundos.
+JWT_SECRET = os.getenv('JWT_SECRET', '')
+JWT_ACCESS_TTL = int(os.getenv('JWT_ACCESS_TTL', '300'))
+JWT_REFRESH_TTL = int(os.getenv('JWT_REFRESH_TTL', str(7 * 24 * 3600)))
+JWT_REVOCADAS_TTL = int(os.getenv('JWT_REVOCADAS_TTL', '60'))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/stable/topics/i18n/
@@ -149,6 +201,62 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR.parent / 'media'
 
 
+# Cache compartido (roles, indicadores, etc.). Por defecto memoria local del proceso;
+# en producción con varios workers conviene un backend compartido (p. ej. Redis o Memcached).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'nuam-default'),
+    }
+}
+
+# Series de indicadores económicos: frescas por INDICADORES_CACHE_TTL segundos y, ya vencidas,
+# se siguen sirviendo (refrescando en segundo plano) hasta INDICADORES_CACHE_STALE.
+INDICADORES_CACHE_ALIAS = 'default'
+INDICADORES_CACHE_TTL = int(os.getenv('INDICADORES_CACHE_TTL', str(6 * 3600)))
+INDICADORES_CACHE_STALE = int(os.getenv('INDICADORES_CACHE_STALE', str(7 * 24 * 3600)))
+# Hilos (y conexiones HTTP) para consultar en paralelo las APIs externas de indicadores.
+INDICADORES_FETCH_WORKERS = int(os.getenv('INDICADORES_FETCH_WORKERS', '8'))
+# Días de atraso tolerados en indicadores_valores; si el último valor es más antiguo (p. ej. dejó de
+# correr sincronizar_indicadores) los gráficos vuelven a la API externa. Ajustable por indicador.
+INDICADORES_LOCAL_VIGENCIA = int(os.getenv('INDICADORES_LOCAL_VIGENCIA', '7'))
+# Circuit breaker por proveedor externo: se abre tras CIRCUITO_UMBRAL_FALLOS fallas seguidas y
+# espera CIRCUITO_ESPERA segundos (duplicándose en cada reapertura, hasta CIRCUITO_ESPERA_MAXIMA).
+CIRCUITO_UMBRAL_FALLOS = int(os.getenv('CIRCUITO_UMBRAL_FALLOS', '5'))
+CIRCUITO_ESPERA = int(os.getenv('CIRCUITO_ESPERA', '30'))
+CIRCUITO_ESPERA_MAXIMA = int(os.getenv('CIRCUITO_ESPERA_MAXIMA', '600'))
+
+# Segundos que se reutilizan los roles de un usuario entre requests (0 = solo dentro del request).
+# Se invalidan al modificar usuario_rol, pero solo en el cache de quien hizo el cambio: por eso el
+# valor por defecto es 0 con el cache local del proceso (ver el check appNuam.W001).
+ROLES_CACHE_TTL = int(os.getenv('ROLES_CACHE_TTL', '0' if 'locmem' in CACHES['default']['BACKEND'] else '600'))
+
+# Dashboards: leer conteos desde la tabla materializada calificaciones_resumen
+# (crearla antes con appNuam/sql/calificaciones_resumen.sql).
+CALIFICACIONES_RESUMEN = os.getenv('CALIFICACIONES_RESUMEN', '').lower() in ('1', 'true', 'yes')
+
+# Cargas masivas: workers del comando procesar_cargas y espera entre consultas a la cola
+CARGAS_WORKERS = int(os.getenv('CARGAS_WORKERS', '2'))
+CARGAS_POLL_INTERVAL = float(os.getenv('CARGAS_POLL_INTERVAL', '2'))
+# Segundos sin avance tras los que una carga 'procesando' se considera de un worker caído y vuelve a la cola
+CARGAS_TIMEOUT = int(os.getenv('CARGAS_TIMEOUT', '600'))
+
+# Vistas con max_consultas: 'error' falla el request si lo exceden, 'log' solo avisa, '' desactiva
+CONSULTAS_PRESUPUESTO = os.getenv('CONSULTAS_PRESUPUESTO', 'error' if DEBUG else 'log')
+
+# Historial de acciones: 'sincrono' inserta el lote del request al terminarlo; 'cola' lo entrega a un hilo escritor
+HISTORIAL_MODO = os.getenv('HISTORIAL_MODO', 'sincrono')
+
+# Tamaño de cada fragmento en las subidas por partes (bytes)
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
+
+# Procesos del pool compartido que genera reportes PDF en lote (vista y comando; 0 = según CPUs, máximo 4)
+REPORTES_WORKERS = int(os.getenv('REPORTES_WORKERS', '0'))
+
+
+# Los tests crean también las tablas de los modelos managed=False (ver appNuam/tests.py)
+TEST_RUNNER = 'appNuam.tests.NuamTestRunner'
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/stable/ref/settings/#default-auto-field
@@ -33,6 +33,36 @@ const ctx = document.getElementById("indicadorChart").getContext("2d");
 
 let chartInstance = null;
 
+// Series precargadas con una sola llamada a /api/indicadores/ ("pais:codigo" -> payload)
+const seriesPrecargadas = {};
+let precarga = Promise.resolve();
+
+function precargarSeries() {
+    precarga = fetch("/api/indicadores/")
+        .then((response) => (response.ok ? response.json() : { series: [] }))
+        .then((payload) => {
+            payload.series.forEach((serie) => {
+                seriesPrecargadas[`${serie.pais}:${serie.indicador}`] = serie;
+            });
+        })
+        .catch((error) => console.error("Error al precargar indicadores:", error));
+}
+
+async function obtenerSerie(pais, indicador) {
+    await precarga;
+    const precargada = seriesPrecargadas[`${pais}:${indicador}`];
+    if (precargada && !precargada.error) {
+        return precargada;
+    }
+
+    const response = await fetch(`/api/indicador/${pais}/${indicador}/`);
+    if (!response.ok) {
+        const errorMsg = `Error HTTP ${response.status}`;
+        throw new Error(errorMsg);
+    }
+    return response.json();
+}
+
 function crearBoton({ texto, activo, onClick }) {
     const btn = document.createElement("button");
     btn.className = "pill-btn";
@@ -166,13 +196,7 @@ function actualizarChart(labels, data, labelText) {
 async function cargarIndicador(pais, indicador) {
     actualizarStatus("Cargando datos...");
     try {
-        const response = await fetch(`/api/indicador/${pais}/${indicador}/`);
-        if (!response.ok) {
-            const errorMsg = `Error HTTP ${response.status}`;
-            throw new Error(errorMsg);
-        }
-
-        const payload = await response.json();
+        const payload = await obtenerSerie(pais, indicador);
         if (payload.error) {
             throw new Error(payload.error);
         }
@@ -186,6 +210,7 @@ async function cargarIndicador(pais, indicador) {
 }
 
 function iniciarLanding() {
+    precargarSeries();
     renderPaisButtons();
     renderIndicadoresButtons(estado.pais);
 }